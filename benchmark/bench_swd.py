@@ -0,0 +1,235 @@
+"""Benchmarks of Swd, Stlink and StlinkCom with simulated ST-Link
+
+Measured time is time spent in python, because simulated USB transfers
+do not wait, so overhead per USB transaction is measured directly.
+
+Usage:
+    python3 benchmark/bench_swd.py [-o results.json] [-b baseline.json]
+"""
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import platform
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import swd  # noqa: E402 pylint: disable=wrong-import-position
+import swd.stlink  # noqa: E402 pylint: disable=wrong-import-position
+import swd.stlink.sim  # noqa: E402 pylint: disable=wrong-import-position
+import swd.stream  # noqa: E402 pylint: disable=wrong-import-position
+
+SRAM = swd.stlink.sim.StlinkSim.SRAM_ADDRESS
+SIZES = (4, 64, 1024, 16384)
+ALIGNMENTS = (0, 1, 2, 3)
+
+
+class Bench:
+    """Benchmark environment with simulated ST-Link"""
+
+    def __init__(self, pipeline_depth=1):
+        self.sim = swd.stlink.sim.StlinkSim()
+        self.sim.pipeline_depth = pipeline_depth
+        self.swd = swd.Swd(driver=swd.stlink.Stlink(usb=self.sim))
+        self.cortexm = swd.CortexM(self.swd)
+
+
+def _read(method, address, size):
+    def run(bench):
+        for _ in getattr(bench.swd, method)(address, size):
+            pass
+    return run
+
+
+def _read_bytes(address, size):
+    def run(bench):
+        bench.swd.read_mem_bytes(address, size)
+    return run
+
+
+def _read_to_file(address, size):
+    def run(bench):
+        with open(os.devnull, 'wb') as output:
+            swd.stream.read_to_file(bench.swd, address, size, output)
+    return run
+
+
+def _write(method, address, size):
+    data = bytes(i & 0xff for i in range(size))
+
+    def run(bench):
+        getattr(bench.swd, method)(address, data)
+    return run
+
+
+def _fill(method, address, size):
+    pattern = [0x12, 0x34, 0x56, 0x78]
+
+    def run(bench):
+        getattr(bench.swd, method)(address, pattern, size)
+    return run
+
+
+def _startup(code):
+    """Run code in new python interpreter, to measure import time"""
+    command = [sys.executable, '-c', code]
+    root = os.path.join(os.path.dirname(__file__), '..')
+
+    def run(unused_bench):
+        subprocess.run(
+            command, cwd=root, check=True, stdout=subprocess.DEVNULL)
+    return run
+
+
+def _cases():
+    """Yield tuples (name, bytes per operation, function)"""
+    for size in SIZES:
+        for align in ALIGNMENTS:
+            address = SRAM + align
+            yield f'read_mem/{size}/+{align}', size, _read(
+                'read_mem', address, size)
+            yield f'read_mem_bytes/{size}/+{align}', size, _read_bytes(
+                address, size)
+            yield f'write_mem/{size}/+{align}', size, _write(
+                'write_mem', address, size)
+            yield f'fill_mem/{size}/+{align}', size, _fill(
+                'fill_mem', address, size)
+        for width in (8, 16, 32):
+            yield f'read_mem{width}/{size}', size, _read(
+                f'read_mem{width}', SRAM, size)
+            yield f'write_mem{width}/{size}', size, _write(
+                f'write_mem{width}', SRAM, size)
+            yield f'fill_mem{width}/{size}', size, _fill(
+                f'fill_mem{width}', SRAM, size)
+    yield 'read_to_file/16384', 16384, _read_to_file(SRAM, 16384)
+    yield 'get_reg_all', 0, lambda bench: bench.cortexm.get_reg_all()
+    yield 'is_halted', 0, lambda bench: bench.cortexm.is_halted()
+    yield 'startup/python', 0, _startup('pass')
+    yield 'startup/import_swd', 0, _startup('import swd')
+    yield 'startup/pyswd_version', 0, _startup(
+        'import sys, swd._app; sys.argv[1:] = ["-V"]; swd._app.main()')
+
+
+def measure(function, bench, min_time):
+    """Run function repeatedly at least min_time seconds
+
+    Return:
+        dictionary with number of operations, time and USB transactions
+    """
+    operations = 0
+    transactions = bench.sim.transactions
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_time:
+        function(bench)
+        operations += 1
+        elapsed = time.perf_counter() - start
+    return {
+        'operations': operations,
+        'time': elapsed,
+        'transactions': bench.sim.transactions - transactions,
+    }
+
+
+def run_benchmarks(pattern='*', min_time=0.1, pipeline_depth=1):
+    """Run all benchmarks matching pattern
+
+    Return:
+        dictionary with results for each benchmark
+    """
+    results = {}
+    bench = Bench(pipeline_depth)
+    for name, size, function in _cases():
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        function(bench)  # warm up caches
+        result = measure(function, bench, min_time)
+        ops_per_sec = result['operations'] / result['time']
+        results[name] = {
+            'ops_per_sec': ops_per_sec,
+            'bytes_per_sec': ops_per_sec * size,
+            'transactions_per_op':
+                result['transactions'] / result['operations'],
+            'overhead_per_transaction_us':
+                1e6 * result['time'] / max(1, result['transactions']),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Compare results with baseline
+
+    Return:
+        list of (name, baseline ops/s, current ops/s) for slower benchmarks
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(
+                (name, base['ops_per_sec'], result['ops_per_sec']))
+    return regressions
+
+
+def _configure_argparse():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Swd stack with simulated ST-Link")
+    parser.add_argument(
+        "-o", "--output", type=str,
+        help="save results into JSON file")
+    parser.add_argument(
+        "-b", "--baseline", type=str,
+        help="compare results with baseline JSON file")
+    parser.add_argument(
+        "-t", "--tolerance", type=float, default=0.2,
+        help="allowed slowdown against baseline (default: 0.2)")
+    parser.add_argument(
+        "-k", "--filter", type=str, default='*',
+        help="run only benchmarks matching pattern (e.g. 'read_mem*')")
+    parser.add_argument(
+        "--min-time", type=float, default=0.1,
+        help="minimal time of each benchmark in seconds")
+    parser.add_argument(
+        "--pipeline", type=int, default=1,
+        help="pipeline depth of simulated USB")
+    return parser.parse_args()
+
+
+def main():
+    """benchmark startup"""
+    args = _configure_argparse()
+    results = run_benchmarks(args.filter, args.min_time, args.pipeline)
+    for name, result in results.items():
+        print(
+            f"{name:32s} {result['ops_per_sec']:12.1f} ops/s "
+            f"{result['bytes_per_sec'] / 1024:10.1f} KiB/s "
+            f"{result['transactions_per_op']:7.1f} tr/op "
+            f"{result['overhead_per_transaction_us']:7.1f} us/tr")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, output, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            baseline = json.load(baseline)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for name, base, current in regressions:
+            print(
+                f"SLOWER: {name}: {current:.1f} ops/s, "
+                f"baseline {base:.1f} ops/s", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,25 @@
 """Application
 """
 
+import os
 import sys
 import time
+import array
+import struct
 import argparse
 import itertools
 import swd
+import swd.cortexm
 import swd.stlink
+import swd.stlink.record
+import swd.stlink.stats
 import swd.stlink.usb
+import swd.stream
+import swd.image
+import swd.flash
+import swd.stub
+import swd.verify
+import swd.tracer
 import swd.__about__
 
 
@@ -33,6 +45,24 @@ list of available actions:
   set:{addr}:{data}[:{data}..]      set 32 bit register or 8 bit memory area
 
   fill8:{addr}:{size}:{pattern}     fill memory with 8 bit pattern
+  fill:{addr}:{size}:{pattern}      fill RAM with 8 bit pattern by target
+
+  read:{addr}:{size}:{file}[:{offset}]  read memory into file,
+                                        continue from offset
+  read:sram[:{size}]:{file}     read SRAM into file
+  read:flash[:{size}]:{file}    read FLASH into file
+                                (without size until first memory fault)
+
+  write:{file}              write SREC, HEX or ELF file into memory
+  write:{addr}:{file}       write binary file into memory
+  write:sram:{file}         write binary file into SRAM
+
+  flash:{file}              program SREC, HEX or ELF file into STM32 FLASH
+  flash:{addr}:{file}       program binary file into STM32 FLASH
+  flash:erase[:{addr}:{size}]   erase whole FLASH or pages under area
+  flash:update:[{addr}:]{file}  program only pages which differ from file
+
+  verify:[{addr}:]{file}    verify memory by CRC-32 computed by target
 
   reg:all                   print all core register
   reg:{reg}                 print content of core register
@@ -49,18 +79,11 @@ list of available actions:
   (reg: R0, R1, ..., R12, SP, LR, PC, PSR, MSP, PSP)
 """
 # TODO unimplemented actions:
-#   fill:{addr}:{size}:{pattern}      fill memory with 8 bit pattern
 #   fill16:{addr}:{size}:{pattern}    fill memory with 16 bit pattern
 #   fill32:{addr}:{size}:{pattern}    fill memory with 32 bit pattern
-#   read:{addr}:{size}:{file}      read memory with size into file
-#   read:sram[:{size}]:{file}      read SRAM into file
-#   read:flash[:{size}]:{file}     read FLASH into file
-#   write:{file.srec}     write SREC file into memory
-#   write:{addr}:{file}   write binary file into memory
-#   write:sram:{file}     write binary file into SRAM memory
 
 
-def _configure_argparse():
+def _configure_argparse(argv=None):
     """configure and process command line arguments"""
     parser = argparse.ArgumentParser(
         prog=swd.__about__.APP_NAME,
@@ -86,10 +109,50 @@ def _configure_argparse():
     parser.add_argument(
         "-s", "--serial", type=str, default='',
         help="select ST-Link by serial number")
+    parser.add_argument(
+        "--pipeline", type=int, metavar='N',
+        help="maximum number of USB commands in flight, consecutive\n"
+        "set32 actions are sent pipelined if it is more than 1")
+    parser.add_argument(
+        "--record", type=str, metavar='FILE',
+        help="record all USB transfers into trace file")
+    parser.add_argument(
+        "--replay", type=str, metavar='FILE',
+        help="replay USB transfers from trace file instead of ST-Link")
+    parser.add_argument(
+        "--stats", action='store_true',
+        help="print statistics of USB transfers at exit")
+    parser.add_argument(
+        "--trace", type=str, metavar='FILE',
+        help="save trace of all calls and USB transfers as Chrome trace JSON")
+    parser.add_argument(
+        "--script", type=str, metavar='FILE',
+        help="process actions from file (- for stdin) after actions\n"
+        "from command line, separated by white spaces or lines,\n"
+        "'#' starts comment")
+    parser.add_argument(
+        "--repl", action='store_true',
+        help="process actions interactively")
+    parser.add_argument(
+        "--daemon", action='store_true',
+        help="keep probe connected and process actions from clients")
+    parser.add_argument(
+        "--client", action='store_true',
+        help="process actions in running daemon")
+    parser.add_argument(
+        "--stop-daemon", action='store_true',
+        help="stop running daemon")
+    parser.add_argument(
+        "--socket", type=str, metavar='PATH',
+        help="Unix socket of daemon (default: pyswd-{uid}.sock in\n"
+        "$XDG_RUNTIME_DIR or in temporary directory)")
     parser.add_argument(
         'action', nargs='*',
         help='actions will be processed sequentially')
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.pipeline is not None and args.pipeline < 1:
+        parser.error("argument --pipeline: must be at least 1")
+    return args
 
 
 def chunks(data, chunk_size):
@@ -102,6 +165,15 @@ def chunks(data, chunk_size):
         yield chunk
 
 
+def read_script(lines):
+    """Yield actions from lines of script
+
+    Actions are separated by white spaces or lines, '#' starts comment.
+    """
+    for line in lines:
+        yield from line.split('#', 1)[0].split()
+
+
 def hex_line8(chunk):
     """Create 8 bit hex string from bytes in chunk"""
     result = ' '.join([
@@ -133,6 +205,111 @@ def ascii_line(chunk):
         for d in chunk])
 
 
+# bytes outside of printable ASCII are translated to '.'
+_ASCII_TABLE = bytes(
+    byte if 32 <= byte < 127 else ord('.') for byte in range(256))
+_LINE_SIZE = 16
+# number of bytes formatted at once
+_BLOCK_SIZE = 64 * 1024
+# bytes.hex with separator is available from python 3.8
+_HEX_SEPARATOR = sys.version_info >= (3, 8)
+# size of unit for hex_line functions
+_HEX_UNITS = {hex_line8: 1, hex_line16: 2, hex_line32: 4}
+
+
+def _hex_block(block, unit):
+    """Hex of full lines in block, units are little endian
+
+    Return:
+        string with hex of each unit separated by space, lines are
+        also separated by one space
+    """
+    if unit > 1:
+        # swap bytes in each unit, so hex of unit is its value
+        typecode = next(
+            code for code in 'HIL' if array.array(code).itemsize == unit)
+        units = array.array(typecode, block)
+        units.byteswap()
+        block = units.tobytes()
+    if _HEX_SEPARATOR:
+        return block.hex(' ', unit)
+    unit_format = '%%0%dx' % (unit * 2)
+    line_format = ' '.join([unit_format] * (_LINE_SIZE // unit))
+    line_struct = struct.Struct('>%d%s' % (
+        _LINE_SIZE // unit, {1: 'B', 2: 'H', 4: 'L'}[unit]))
+    return ' '.join(
+        line_format % line_struct.unpack_from(block, offset)
+        for offset in range(0, len(block), _LINE_SIZE))
+
+
+def format_buffer(addr, data, hex_line=hex_line8, collapse=True, end=False):
+    """Yield lines of hex and ASCII dump
+
+    Full lines are formatted in large blocks by bytes.hex, only last
+    partial line is formatted by hex_line. With collapse, lines same as
+    previous line are replaced by one '*' line. Address of each
+    collapsed line aligned to 4KiB is yielded as integer, so progress
+    can be shown.
+
+    Arguments:
+        addr: address of first byte
+        data: bytes-like object or iterable of bytes
+        hex_line: function which format hex part of line
+        collapse: collapse same lines
+        end: always yield line with end address, otherwise it is
+            yielded only after collapsed lines
+
+    Return:
+        iterable of lines (with new line) and integer addresses
+    """
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    unit = _HEX_UNITS.get(hex_line)
+    size = len(data)
+    full_size = size - size % _LINE_SIZE if unit else 0
+    prev_line = None
+    same_line = False
+    for block_start in range(0, full_size, _BLOCK_SIZE):
+        block = data[block_start:min(full_size, block_start + _BLOCK_SIZE)]
+        hex_text = _hex_block(block, unit)
+        ascii_text = block.translate(_ASCII_TABLE).decode('ascii')
+        stride = _LINE_SIZE * 2 + _LINE_SIZE // unit
+        for offset in range(0, len(block), _LINE_SIZE):
+            line = block[offset:offset + _LINE_SIZE]
+            if collapse and line == prev_line:
+                if not same_line:
+                    yield '*\n'
+                    same_line = True
+                elif addr % 0x1000 == 0:
+                    yield addr
+            else:
+                hex_offset = offset // _LINE_SIZE * stride
+                yield '%08x  %s  %s\n' % (
+                    addr,
+                    hex_text[hex_offset:hex_offset + stride - 1],
+                    ascii_text[offset:offset + _LINE_SIZE])
+                prev_line = line
+                same_line = False
+            addr += _LINE_SIZE
+    for offset in range(full_size, size, _LINE_SIZE):
+        line = data[offset:offset + _LINE_SIZE]
+        if collapse and line == prev_line:
+            if not same_line:
+                yield '*\n'
+                same_line = True
+            elif addr % 0x1000 == 0:
+                yield addr
+        else:
+            yield '%08x  %s  %s\n' % (
+                addr, hex_line(line),
+                line.translate(_ASCII_TABLE).decode('ascii'))
+            prev_line = line
+            same_line = False
+        addr += len(line)
+    if same_line or end:
+        yield '%08x\n' % addr
+
+
 def test_alignment(num, param_name, align):
     """Test if number is aligned"""
     if num % align:
@@ -169,6 +346,15 @@ def convert_numeric(num, max_bits=32):
 class Application:
     """Application"""
 
+    # maximum number of set32 actions sent in one pipeline
+    _PIPELINED_SET32_MAX = 256
+
+    # start addresses of memory areas for read action
+    _MEMORY_AREAS = {
+        'sram': 0x20000000,
+        'flash': 0x08000000,
+    }
+
     def __init__(self, args):
         """Application startup"""
         self._swd = None
@@ -181,8 +367,19 @@ class Application:
             self._verbose = -1
             self._debug = -1
         self._actions = args.action
+        self._script = args.script
+        self._repl = args.repl
         self._swd_frequency = args.freq
         self._serial_no = args.serial
+        self._pipeline = args.pipeline
+        self._record = args.record
+        self._replay = args.replay
+        self._stats = swd.stlink.stats.StlinkStats() if args.stats else None
+        self._trace = args.trace
+        self._daemon = args.daemon
+        self._client = args.client
+        self._stop_daemon = args.stop_daemon
+        self._socket = args.socket
 
     def print_info(self, msg, level=1, prefix="I: "):
         """Print info string"""
@@ -210,27 +407,29 @@ class Application:
         sys.stderr.write(f"{prefix}{msg}\n")
 
     def print_buffer(self, addr, data, hex_line=hex_line8):
-        """Print buffer in hex and ASCII"""
-        prev_chunk = []
-        same_chunk = False
-        for chunk in chunks(data, 16):
-            if self._verbose > 0 or prev_chunk != chunk:
-                print('%08x  %s  %s' % (
-                    addr,
-                    hex_line(chunk),
-                    ascii_line(chunk),
-                ))
-                prev_chunk = chunk
-                same_chunk = False
-            elif not same_chunk:
-                print('*')
-                same_chunk = True
-            elif sys.stdout.isatty() and addr % 0x1000 == 0:
-                sys.stderr.write('%08x\r' % addr)
-                sys.stderr.flush()
-            addr += len(chunk)
-        if same_chunk or self._verbose > 1:
-            print('%08x' % addr)
+        """Print buffer in hex and ASCII
+
+        Lines are written into stdout in large blocks.
+        """
+        progress = sys.stdout.isatty()
+        block = []
+        lines = format_buffer(
+            addr, data, hex_line,
+            collapse=self._verbose <= 0, end=self._verbose > 1)
+        for line in lines:
+            if isinstance(line, int):
+                if progress:
+                    sys.stdout.write(''.join(block))
+                    sys.stdout.flush()
+                    block = []
+                    sys.stderr.write('%08x\r' % line)
+                    sys.stderr.flush()
+                continue
+            block.append(line)
+            if len(block) >= 4096:
+                sys.stdout.write(''.join(block))
+                block = []
+        sys.stdout.write(''.join(block))
 
     def action_dump32(self, params):
         """Dump memory 32 bit"""
@@ -247,7 +446,7 @@ class Application:
         elif len(params) == 2:
             size = convert_numeric(params[1])
             test_alignment(size, "Size", 4)
-            data = self._swd.read_mem(addr, size)
+            data = self._swd.read_mem_bytes(addr, size)
             self.print_buffer(addr, data, hex_line32)
         else:
             raise PyswdException("too many parameters")
@@ -264,7 +463,7 @@ class Application:
         elif len(params) == 2:
             size = convert_numeric(params[1])
             test_alignment(size, "Size", 2)
-            data = self._swd.read_mem(addr, size)
+            data = self._swd.read_mem_bytes(addr, size)
             self.print_buffer(addr, data, hex_line16)
         else:
             raise PyswdException("too many parameters")
@@ -279,7 +478,7 @@ class Application:
             print("%08x: %02x" % (addr, next(data)))
         elif len(params) == 2:
             size = convert_numeric(params[1])
-            data = self._swd.read_mem(addr, size)
+            data = self._swd.read_mem_bytes(addr, size)
             self.print_buffer(addr, data, hex_line8)
         else:
             raise PyswdException("too many parameters")
@@ -347,6 +546,148 @@ class Application:
         pattern = bytes([convert_numeric(i, 8) for i in params[2:]])
         self._swd.fill_mem(addr, pattern, size)
 
+    def action_fill(self, params):
+        """Fill RAM with pattern by target"""
+        if len(params) < 3:
+            raise PyswdException("require at least 3 parameters")
+        addr = convert_numeric(params[0])
+        size = convert_numeric(params[1])
+        pattern = bytes([convert_numeric(i, 8) for i in params[2:]])
+        if swd.stub.fill(self._swd, addr, pattern, size, self._cortexm):
+            self.print_verbose("Filled by target, core is halted")
+
+    def _read_params(self, params):
+        """Return (addr, size, file, offset) from parameters of read"""
+        if params and params[0] in self._MEMORY_AREAS:
+            addr = self._MEMORY_AREAS[params[0]]
+            if len(params) == 2:
+                return addr, None, params[1], 0
+            if len(params) == 3:
+                return addr, convert_numeric(params[1]), params[2], 0
+            raise PyswdException("wrong number of parameters")
+        if len(params) < 3:
+            raise PyswdException("require at least 3 parameters")
+        if len(params) > 4:
+            raise PyswdException("too many parameters")
+        offset = convert_numeric(params[3]) if len(params) == 4 else 0
+        return convert_numeric(params[0]), convert_numeric(params[1]), \
+            params[2], offset
+
+    def action_read(self, params):
+        """Read memory into file"""
+        addr, size, file_name, offset = self._read_params(params)
+        progress = None
+        if sys.stderr.isatty():
+            def progress(position):
+                sys.stderr.write('%08x\r' % (addr + position))
+                sys.stderr.flush()
+        try:
+            end = swd.stream.read_to_file(
+                self._swd, addr, size, file_name, offset, progress=progress)
+        except ValueError as err:
+            raise PyswdException(err)
+        except swd.stream.StreamError as err:
+            if size is None:
+                self.print_warning(err)
+            else:
+                self.print_warning(
+                    "%s, continue with: read:0x%08x:0x%x:%s:0x%x" % (
+                        err, addr, size, file_name, err.offset))
+            raise err.__cause__
+        self.print_info(
+            "Read %d Bytes from 0x%08x into: %s" % (
+                end - offset, addr + offset, file_name), level=2)
+
+    def _load_image(self, params):
+        """Load image from parameters {file} or {addr}:{file}"""
+        if not params:
+            raise PyswdException("no parameters")
+        if len(params) > 2:
+            raise PyswdException("too many parameters")
+        addr = None
+        if len(params) == 2:
+            addr = self._MEMORY_AREAS.get(params[0])
+            if addr is None:
+                addr = convert_numeric(params[0])
+        file_name = params[-1]
+        try:
+            segments = swd.image.load(file_name, addr)
+        except swd.image.ImageError as err:
+            raise PyswdException(f"{file_name}: {err}")
+        for segment in segments:
+            self.print_verbose(
+                "Segment %d Bytes at 0x%08x" % (
+                    len(segment.data), segment.address))
+        return segments
+
+    def action_write(self, params):
+        """Write image file into memory"""
+        segments = self._load_image(params)
+        swd.image.write_image(self._swd, segments)
+        self.print_info(
+            "Written %d Bytes in %d segments" % (
+                sum(len(segment.data) for segment in segments),
+                len(segments)), level=2)
+
+    def _flash_erase(self, flash, params):
+        """Erase whole FLASH or pages under area"""
+        if not params:
+            flash.erase_all()
+            self.print_info("FLASH erased", level=2)
+        elif len(params) == 2:
+            blocks = flash.erase(
+                convert_numeric(params[0]), convert_numeric(params[1]))
+            self.print_info(
+                "Erased %d pages or sectors" % len(blocks), level=2)
+        else:
+            raise PyswdException("wrong number of parameters")
+
+    def action_flash(self, params):
+        """Program or erase STM32 FLASH"""
+        if not params:
+            raise PyswdException("no parameters")
+        flash = swd.flash.Flash(self._swd, self._cortexm)
+        try:
+            self.print_verbose(
+                "%s, FLASH %d KB" % (flash.device.name, flash.size // 1024))
+            if params[0] == 'erase':
+                self._flash_erase(flash, params[1:])
+                return
+            if params[0] == 'update':
+                segments = self._load_image(params[1:])
+                blocks = flash.update_image(segments)
+                self.print_info(
+                    "Changed %d pages or sectors" % len(blocks), level=2)
+                return
+            segments = self._load_image(params)
+            flash.program_image(segments)
+        except swd.flash.FlashError as err:
+            raise PyswdException(err)
+        self.print_info(
+            "Programmed %d Bytes in %d segments" % (
+                sum(len(segment.data) for segment in segments),
+                len(segments)), level=2)
+
+    def action_verify(self, params):
+        """Verify memory by CRC-32 computed by target"""
+        segments = self._load_image(params)
+        try:
+            different = swd.verify.verify_image(
+                self._swd, segments, cortexm=self._cortexm)
+        except swd.verify.VerifyError as err:
+            raise PyswdException(err)
+        for segment in different:
+            self.print_info(
+                "Different %d Bytes at 0x%08x" % (
+                    len(segment.data), segment.address))
+        if different:
+            raise PyswdException(
+                "%d of %d segments differ" % (len(different), len(segments)))
+        self.print_info(
+            "Verified %d Bytes in %d segments" % (
+                sum(len(segment.data) for segment in segments),
+                len(segments)), level=2)
+
     def action_reg(self, params):
         """Read/Write core register"""
         if not params:
@@ -413,43 +754,166 @@ class Application:
             except ValueError:
                 raise PyswdException("wrong float value: %s" % params[0])
 
-    def process_actions(self):
-        """Process all actions"""
-        for action in self._actions:
-            self.print_debug("ACTION: %s" % action)
-            action_parts = action.split(":")
-            action_name = "action_" + action_parts[0]
-            if not hasattr(self, action_name):
-                raise PyswdException("action '%s' is not implemented" % action)
+    def process_action(self, action):
+        """Process one action"""
+        self.print_debug("ACTION: %s" % action)
+        action_parts = action.split(":")
+        action_name = "action_" + action_parts[0]
+        if not hasattr(self, action_name):
+            raise PyswdException("action '%s' is not implemented" % action)
+        try:
+            getattr(self, action_name)(action_parts[1:])
+        except PyswdException as err:
+            raise PyswdException("%s: %s" % (action_parts[0], err))
+
+    @staticmethod
+    def _pipelined_set32(action):
+        """Return (address, value) if action is set32 of one register"""
+        params = action.split(":")
+        if params[0] != 'set32' or len(params) != 3:
+            return None
+        try:
+            addr = convert_numeric(params[1])
+            value = convert_numeric(params[2], 32)
+        except PyswdException:
+            # error is reported by action
+            return None
+        if addr % 4:
+            return None
+        return addr, value
+
+    def _flush_set32(self, items):
+        """Set all collected registers"""
+        if items:
+            self.print_debug("ACTION: set32 of %d registers" % len(items))
+            self._swd.set_mem32_many(items)
+            items.clear()
+
+    def process_actions(self, actions=None):
+        """Process all actions
+
+        Consecutive set32 actions of one register are collected and
+        sent pipelined if pipeline depth of USB is more than 1, all other
+        actions are processed one by one.
+
+        Arguments:
+            actions: iterable of actions, default are actions from
+                command line
+        """
+        if actions is None:
+            actions = self._actions
+        items = []
+        for action in actions:
+            item = self._pipelined_set32(action)
+            if item is not None:
+                items.append(item)
+                if len(items) >= self._PIPELINED_SET32_MAX:
+                    self._flush_set32(items)
+                continue
+            self._flush_set32(items)
+            self.process_action(action)
+        self._flush_set32(items)
+
+    def _all_actions(self):
+        """Yield actions from command line and from script"""
+        yield from self._actions
+        if self._script == '-':
+            yield from read_script(sys.stdin)
+        elif self._script:
+            with open(self._script) as script:
+                yield from read_script(script)
+
+    def _run_repl(self):
+        """Process actions from interactive prompt"""
+        try:
+            # line editing and history for input
+            import readline  # noqa pylint: disable=import-outside-toplevel,unused-import
+        except ImportError:
+            pass
+        self._run_actions()
+        while True:
             try:
-                getattr(self, action_name)(action_parts[1:])
-            except PyswdException as err:
-                raise PyswdException("%s: %s" % (action_parts[0], err))
+                line = input("pyswd> ")
+            except EOFError:
+                print()
+                break
+            except KeyboardInterrupt:
+                print()
+                continue
+            actions = list(read_script([line]))
+            if not actions:
+                continue
+            if actions[0] in ('exit', 'quit'):
+                break
+            if actions[0] == 'help':
+                print(_ACTIONS_HELP_STR)
+                continue
+            if self._cortexm is None and self._guarded(self._connect):
+                continue
+            self._guarded(lambda: self.process_actions(actions))
 
-    def start(self):
-        """Application start point"""
+    def _create_usb(self):
+        """Create USB transport for recording or replay"""
+        if self._replay:
+            return swd.stlink.record.StlinkReplay(self._replay)
+        if self._record:
+            return swd.stlink.record.StlinkRecorder(
+                swd.stlink.usb.StlinkUsb(self._serial_no, debug=self._debug),
+                self._record)
+        return None
+
+    def _save_trace(self):
+        """Stop tracing and save trace file"""
+        tracer = swd.tracer.stop()
         try:
-            self._swd = swd.Swd(
+            tracer.save(self._trace)
+        except OSError as err:
+            self.print_error(f"File error: {err}.")
+        else:
+            self.print_info(
+                f"Trace with {len(tracer.events)} events saved "
+                f"into: {self._trace}", level=2)
+
+    def _connect(self):
+        """Open probe session"""
+        self._swd = swd.Swd(
+            driver=swd.stlink.Stlink(
                 swd_frequency=self._swd_frequency,
                 serial_no=self._serial_no,
-                debug=self._debug)
-            self.print_info(self._swd.get_version(), level=2)
-            idcode = self._swd.get_idcode()
-            if idcode == 0:
-                raise PyswdException(
-                    "No IDCODE, probably MCU is not connected")
-            self._cortexm = swd.CortexM(self._swd)
-            was_halted = self._cortexm.is_halted()
-            if was_halted:
-                self.print_info("Core is halted.")
-            if self._actions:
-                self.process_actions()
-                is_halted = self._cortexm.is_halted()
-                if was_halted != is_halted:
-                    if is_halted:
-                        self.print_info("Core stay halted.")
-                    else:
-                        self.print_info("Core is running.")
+                debug=self._debug,
+                usb=self._create_usb()))
+        self._swd.driver.stats = self._stats
+        if self._pipeline is not None:
+            self._swd.driver.com.usb.pipeline_depth = self._pipeline
+        self.print_info(self._swd.get_version(), level=2)
+        idcode = self._swd.get_idcode()
+        if idcode == 0:
+            raise PyswdException(
+                "No IDCODE, probably MCU is not connected")
+        self._cortexm = swd.CortexM(self._swd)
+
+    def _run_actions(self):
+        """Process actions and report change of core state"""
+        was_halted = self._cortexm.is_halted()
+        if was_halted:
+            self.print_info("Core is halted.")
+        if self._actions or self._script:
+            self.process_actions(self._all_actions())
+            is_halted = self._cortexm.is_halted()
+            if was_halted != is_halted:
+                if is_halted:
+                    self.print_info("Core stay halted.")
+                else:
+                    self.print_info("Core is running.")
+
+    def _guarded(self, function):
+        """Call function and print error if it fails
+
+        Return:
+            exit code, 0 on success
+        """
+        try:
+            function()
         except swd.stlink.usb.NoDeviceFoundException:
             self.print_error("ST-Link not connected.")
         except swd.stlink.usb.MoreDevicesException as err:
@@ -462,12 +926,114 @@ class Application:
             self.print_error(f"pyswd error: {err}.")
         except swd.stlink.StlinkException as err:
             self.print_error(f"Stlink error: {err}.")
+        except swd.cortexm.CortexMException as err:
+            self.print_error(f"CortexM error: {err}.")
         except swd.stlink.usb.StlinkUsbException as err:
             self.print_error(f"StlinkCom error: {err}.")
+            # session is lost, daemon connects again on next request
+            self._cortexm = None
+        except swd.stlink.record.ReplayError as err:
+            self.print_error(f"Replay error: {err}.")
+            self._cortexm = None
+        except OSError as err:
+            self.print_error(f"File error: {err}.")
         else:
             return 0
         return 1
 
+    def _handle_request(self, request):
+        """Process actions requested by daemon client
+
+        Return:
+            exit code
+        """
+        self._actions = request.get('actions', [])
+        self._script = None
+        self._info = request.get('info', 1)
+        self._verbose = request.get('verbose', 0)
+        self._debug = request.get('debug', 0)
+        if self._cortexm is None:
+            ret = self._guarded(self._connect)
+            if ret:
+                return ret
+        # relative paths in actions are relative to directory of client
+        cwd = os.getcwd()
+        try:
+            os.chdir(request.get('cwd', cwd))
+        except OSError as err:
+            self.print_error(f"File error: {err}.")
+            return 1
+        try:
+            return self._guarded(self._run_actions)
+        finally:
+            os.chdir(cwd)
+
+    def _socket_path(self):
+        """Path of daemon socket"""
+        return self._socket or swd._daemon.default_socket_path()
+
+    def _serve(self):
+        """Process actions from clients until stop request"""
+        # daemon is imported only when used, to keep fast startup
+        import swd._daemon  # pylint: disable=import-outside-toplevel
+        path = self._socket_path()
+        try:
+            swd._daemon.serve(
+                path, self._handle_request,
+                ready=lambda: self.print_info(
+                    f"Daemon is listening on: {path}"))
+        except swd._daemon.DaemonError as err:
+            raise PyswdException(err) from err
+        except KeyboardInterrupt:
+            pass
+        self.print_info("Daemon stopped.")
+
+    def _start_client(self):
+        """Send actions or stop request to daemon"""
+        import swd._daemon  # pylint: disable=import-outside-toplevel
+        try:
+            if self._stop_daemon:
+                message = {'stop': True}
+            else:
+                message = {
+                    'actions': list(self._all_actions()),
+                    'info': self._info,
+                    'verbose': self._verbose,
+                    'debug': self._debug,
+                    'cwd': os.getcwd(),
+                }
+            return swd._daemon.request(
+                self._socket_path(), message, sys.stdout, sys.stderr)
+        except swd._daemon.DaemonError as err:
+            self.print_error(f"Daemon error: {err}.")
+        except OSError as err:
+            self.print_error(f"File error: {err}.")
+        return 1
+
+    def start(self):
+        """Application start point"""
+        if self._client or self._stop_daemon:
+            return self._start_client()
+        if self._trace:
+            swd.tracer.start()
+        try:
+            ret = self._guarded(self._connect)
+            if not ret:
+                if self._daemon:
+                    ret = self._guarded(self._serve)
+                elif self._repl:
+                    ret = self._guarded(self._run_repl)
+                else:
+                    ret = self._guarded(self._run_actions)
+            return ret
+        finally:
+            if self._swd is not None and self._record:
+                self._swd.driver.com.usb.close()
+            if self._stats is not None:
+                sys.stderr.write(self._stats.format() + '\n')
+            if self._trace:
+                self._save_trace()
+
 
 def main():
     """application startup"""
@@ -0,0 +1,202 @@
+"""Persistent probe daemon
+
+Daemon keeps one probe session open and runs lists of actions sent by
+pyswd clients over Unix socket, so each client call skips USB
+enumeration, reading of version and connecting to target.
+
+Protocol: each message is one JSON object on one line. Client sends
+request {"actions": [..], "info": n, "verbose": n, "debug": n,
+"cwd": path} or {"stop": true}, daemon answers with messages
+{"out": text} and {"err": text} with output of actions and last
+message {"exit": code}. Relative paths in actions are resolved against
+"cwd" of client.
+"""
+
+import os
+import io
+import json
+import socket
+import tempfile
+import contextlib
+
+
+class DaemonError(Exception):
+    """Daemon or connection to daemon error"""
+
+
+def default_socket_path():
+    """Default path of daemon socket, one for each user"""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(runtime_dir, f'pyswd-{uid}.sock')
+
+
+def _check_unix_socket():
+    if not hasattr(socket, 'AF_UNIX'):
+        raise DaemonError("Unix sockets are not supported on this platform")
+
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message).encode() + b'\n')
+
+
+class _Writer(io.TextIOBase):
+    """Text stream which sends written lines to client
+
+    Errors of disconnected client are ignored, so running actions are
+    not interrupted by client.
+    """
+
+    def __init__(self, conn, key):
+        super().__init__()
+        self._conn = conn
+        self._key = key
+        self._buffer = []
+        self._connected = True
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, text):
+        self._buffer.append(text)
+        if '\n' in text:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        text = ''.join(self._buffer)
+        self._buffer = []
+        if self._connected:
+            try:
+                _send(self._conn, {self._key: text})
+            except OSError:
+                self._connected = False
+
+
+def _remove_stale_socket(path):
+    """Remove socket file left by not running daemon"""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise DaemonError(f"Daemon is already running on: {path}")
+    finally:
+        probe.close()
+
+
+def _handle(conn, handler):
+    """Handle one client connection
+
+    Return:
+        True if daemon was asked to stop
+    """
+    line = conn.makefile('rb').readline()
+    try:
+        request = json.loads(line)
+    except ValueError:
+        _send(conn, {'err': "E: Wrong request.\n"})
+        _send(conn, {'exit': 2})
+        return False
+    if request.get('stop'):
+        _send(conn, {'exit': 0})
+        return True
+    stdout, stderr = _Writer(conn, 'out'), _Writer(conn, 'err')
+    with contextlib.redirect_stdout(stdout), \
+            contextlib.redirect_stderr(stderr):
+        try:
+            code = handler(request)
+        except Exception as err:  # pylint: disable=broad-except
+            # keep daemon running for next clients
+            stderr.write(f"E: Daemon error: {err!r}.\n")
+            code = 1
+    stdout.flush()
+    stderr.flush()
+    _send(conn, {'exit': code})
+    return False
+
+
+def serve(path, handler, ready=None):
+    """Serve client requests until stop request
+
+    Requests are processed one by one, so only one client use probe
+    at time.
+
+    Arguments:
+        path: path of Unix socket
+        handler: function called with request dictionary for each
+            request, it prints output to sys.stdout and sys.stderr and
+            returns exit code
+        ready: function called when socket is listening
+
+    Raise:
+        DaemonError: if other daemon already listen on path
+    """
+    _check_unix_socket()
+    _remove_stale_socket(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+        os.chmod(path, 0o600)
+        server.listen()
+        if ready is not None:
+            ready()
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    if _handle(conn, handler):
+                        return
+                except OSError:
+                    # client disconnected
+                    pass
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def request(path, message, stdout, stderr):
+    """Send request to daemon and copy its output
+
+    Arguments:
+        path: path of Unix socket
+        message: request dictionary
+        stdout, stderr: text streams for output of actions
+
+    Return:
+        exit code returned by daemon
+
+    Raise:
+        DaemonError: if daemon is not running or closed connection
+    """
+    _check_unix_socket()
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            conn.connect(path)
+        except OSError as err:
+            raise DaemonError(
+                f"Daemon is not running on: {path} ({err})") from err
+        _send(conn, message)
+        for line in conn.makefile('rb'):
+            message = json.loads(line)
+            if 'out' in message:
+                stdout.write(message['out'])
+                stdout.flush()
+            elif 'err' in message:
+                stderr.write(message['err'])
+                stderr.flush()
+            elif 'exit' in message:
+                return message['exit']
+    finally:
+        conn.close()
+    raise DaemonError("Daemon closed connection")
@@ -0,0 +1,267 @@
+"""Agent for bulk memory operations executed by target
+
+Agent code is loaded once into reserved SRAM window and operations are
+queued on host. Code is checked before each run and loaded again if it
+was overwritten, for example by FLASH loader or other stubs. All queued
+operations are written as one table into the window and executed by
+single call of dispatcher, so only table and results are transferred
+over SWD. Core is halted while agent is running.
+
+Dispatcher calls routine from each entry of table by BLX with R0, R1, R2
+from entry and stores returned R0 into first word of entry. Routines may
+use R0 - R5 and R12, R6 and R7 belong to dispatcher.
+"""
+
+import struct as _struct
+from swd.cortexm import CortexM as _CortexM
+from swd.stub import SRAM_ADDRESS as _SRAM_ADDRESS
+from swd.stub import BX_LR as _BX_LR
+from swd.stub import copy_code as _copy_code
+from swd.stub import thumb_code as _thumb_code
+from swd.tracer import traced as _traced
+
+WINDOW_SIZE = 0x400
+
+# R0 address of table, R1 number of entries,
+# entry: address of routine, R0, R1, R2
+_DISPATCH = _thumb_code(
+    0x0006,             # movs r6, r0
+    0x000f,             # movs r7, r1
+    0x2f00,             # loop: cmp r7, #0
+    0xd008,             #       beq done
+    0x6834,             #       ldr r4, [r6, #0]
+    0x6870,             #       ldr r0, [r6, #4]
+    0x68b1,             #       ldr r1, [r6, #8]
+    0x68f2,             #       ldr r2, [r6, #12]
+    0x47a0,             #       blx r4
+    0x6030,             #       str r0, [r6, #0]
+    0x3610,             #       adds r6, #16
+    0x3f01,             #       subs r7, #1
+    0xe7f4,             #       b loop
+    0xbe00,             # done: bkpt
+)
+
+# R0 destination, R1 source, R2 size, copy forward
+_COPY = _copy_code(_BX_LR)
+
+# R0 first area, R1 second area, R2 size,
+# return: offset of first difference or size
+_COMPARE = _thumb_code(
+    0x2300,             # movs r3, #0
+    0x4293,             # loop: cmp r3, r2
+    0xd005,             #       beq done
+    0x5cc4,             #       ldrb r4, [r0, r3]
+    0x5ccd,             #       ldrb r5, [r1, r3]
+    0x42ac,             #       cmp r4, r5
+    0xd101,             #       bne done
+    0x3301,             #       adds r3, #1
+    0xe7f7,             #       b loop
+    0x0018,             # done: movs r0, r3
+    0x4770,             #       bx lr
+)
+
+# R0 address, R1 size, R2 value,
+# return: offset of first other byte or size
+_CHECK = _thumb_code(
+    0x2300,             # movs r3, #0
+    0x428b,             # loop: cmp r3, r1
+    0xd004,             #       beq done
+    0x5cc4,             #       ldrb r4, [r0, r3]
+    0x4294,             #       cmp r4, r2
+    0xd101,             #       bne done
+    0x3301,             #       adds r3, #1
+    0xe7f8,             #       b loop
+    0x0018,             # done: movs r0, r3
+    0x4770,             #       bx lr
+)
+
+# R0 address, R1 size, R2 address of pattern size followed by pattern,
+# return: remaining size from first occurrence or 0
+_FIND = _thumb_code(
+    0x6813,             # ldr r3, [r2]
+    0x3204,             # adds r2, #4
+    0x469c,             # mov r12, r3
+    0x4561,             # outer: cmp r1, r12
+    0xd30b,             #       bcc none
+    0x2500,             #       movs r5, #0
+    0x4565,             # inner: cmp r5, r12
+    0xd009,             #       beq found
+    0x5d43,             #       ldrb r3, [r0, r5]
+    0x5d54,             #       ldrb r4, [r2, r5]
+    0x42a3,             #       cmp r3, r4
+    0xd101,             #       bne next
+    0x3501,             #       adds r5, #1
+    0xe7f7,             #       b inner
+    0x3001,             # next: adds r0, #1
+    0x3901,             #       subs r1, #1
+    0xe7f1,             #       b outer
+    0x2100,             # none: movs r1, #0
+    0x0008,             # found: movs r0, r1
+    0x4770,             #       bx lr
+)
+
+_CODE = _DISPATCH + _COPY + _COMPARE + _CHECK + _FIND
+_COPY_OFFSET = len(_DISPATCH)
+_COMPARE_OFFSET = _COPY_OFFSET + len(_COPY)
+_CHECK_OFFSET = _COMPARE_OFFSET + len(_COMPARE)
+_FIND_OFFSET = _CHECK_OFFSET + len(_CHECK)
+# data are aligned after code
+_DATA_OFFSET = (len(_CODE) + 3) & ~3
+_ENTRY_SIZE = 16
+
+
+class AgentError(Exception):
+    """Agent general exception"""
+
+
+class Agent():
+    """Agent for bulk memory operations executed by target
+
+    Operations are queued by copy, compare, is_erased and find and
+    executed by run, which returns their results in same order.
+    Window must not overlap memory used by operations.
+    """
+
+    def __init__(
+            self, swd, cortexm=None, sram=_SRAM_ADDRESS, size=WINDOW_SIZE):
+        """Agent
+
+        Arguments:
+            swd: Swd instance
+            cortexm: CortexM instance, new is created if None
+            sram: address of reserved SRAM window
+            size: size of window
+        """
+        self._swd = swd
+        if cortexm is None:
+            cortexm = _CortexM(swd)
+        self._cortexm = cortexm
+        self._sram = sram
+        self._size = size
+        self._entries = []
+        self._data = bytearray()
+
+    @property
+    def pending(self):
+        """Number of queued operations"""
+        return len(self._entries)
+
+    def _queue(self, offset, args, convert, data=b''):
+        used = _DATA_OFFSET + len(self._data) + len(data)
+        used += (len(self._entries) + 1) * _ENTRY_SIZE
+        if used > self._size:
+            raise AgentError("Operations do not fit into agent window")
+        self._entries.append(((self._sram + offset) | 1, args, convert))
+        self._data += data
+
+    def load(self):
+        """Load agent code into window
+
+        Code is loaded automatically by run if it is not in window.
+        """
+        self._swd.write_mem(self._sram, _CODE)
+
+    def copy(self, destination, source, size):
+        """Queue copy of memory
+
+        Copy is forward, so overlapping source before destination is
+        repeated over destination.
+
+        Arguments:
+            destination: address of destination
+            source: address of source
+            size: number of bytes
+
+        Result:
+            None
+        """
+        self._queue(
+            _COPY_OFFSET, (destination, source, size), lambda result: None)
+
+    def compare(self, address1, address2, size):
+        """Queue compare of two memory areas
+
+        Arguments:
+            address1: address of first area
+            address2: address of second area
+            size: number of bytes
+
+        Result:
+            offset of first different byte or None if areas are same
+        """
+        self._queue(
+            _COMPARE_OFFSET, (address1, address2, size),
+            lambda result: None if result == size else result)
+
+    def is_erased(self, address, size, value=0xff):
+        """Queue check if all bytes of memory have value
+
+        Arguments:
+            address: address in memory
+            size: number of bytes
+            value: value of erased byte
+
+        Result:
+            True if all bytes have value
+        """
+        self._queue(
+            _CHECK_OFFSET, (address, size, value),
+            lambda result: result == size)
+
+    def find(self, address, size, pattern):
+        """Queue search of pattern in memory
+
+        Arguments:
+            address: address in memory
+            size: number of bytes
+            pattern: list of bytes to find
+
+        Result:
+            offset of first occurrence or None if not found
+        """
+        pattern = bytes(pattern)
+        if not pattern:
+            raise AgentError("Empty pattern")
+        data = _struct.pack('<L', len(pattern)) + pattern
+        data += bytes(-len(data) % 4)
+        pattern_address = self._sram + _DATA_OFFSET + len(self._data)
+        self._queue(
+            _FIND_OFFSET, (address, size, pattern_address),
+            lambda result: size - result if result else None, data)
+
+    @_traced('agent')
+    def run(self, timeout=10.0):
+        """Execute all queued operations
+
+        Arguments:
+            timeout: maximum time of all operations in seconds
+
+        Return:
+            list of results of queued operations
+
+        Raise:
+            AgentError: if core can not be halted
+        """
+        if not self._entries:
+            return []
+        entries, data = self._entries, self._data
+        self._entries, self._data = [], bytearray()
+        if not self._cortexm.is_halted():
+            self._cortexm.halt()
+            if not self._cortexm.is_halted():
+                raise AgentError("Core can not be halted")
+        if self._swd.read_mem_bytes(self._sram, len(_CODE)) != _CODE:
+            self.load()
+        table = self._sram + _DATA_OFFSET + len(data)
+        for routine, args, _ in entries:
+            args = tuple(args) + (0,) * (3 - len(args))
+            data += _struct.pack('<4L', routine, *args)
+        self._swd.write_mem(self._sram + _DATA_OFFSET, data)
+        self._cortexm.call(
+            self._sram, (table, len(entries)), timeout=timeout)
+        results = _struct.unpack(
+            f'<{len(entries) * 4}L',
+            self._swd.read_mem_bytes(table, len(entries) * _ENTRY_SIZE))
+        return [
+            convert(result)
+            for (_, _, convert), result in zip(entries, results[::4])]
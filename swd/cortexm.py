@@ -1,6 +1,8 @@
 """Cortex-Mx definitions
 """
-import time
+import time as _time
+from swd.tracer import sleep as _sleep
+from swd.tracer import traced as _traced
 
 
 class CortexMException(Exception):
@@ -41,18 +43,23 @@ class CortexM():
     DHCSR_DEBUGEN_BIT = 0x00000001
     DHCSR_HALT_BIT = 0x00000002
     DHCSR_STEP_BIT = 0x00000004
+    DHCSR_MASKINTS_BIT = 0x00000008
     DHCSR_STATUS_HALT_BIT = 0x00020000
     DHCSR_STATUS_REGRDY_BIT = 0x00010000
     DHCSR_DEBUGDIS = DHCSR_KEY
     DHCSR_DEBUGEN = DHCSR_KEY | DHCSR_DEBUGEN_BIT
     DHCSR_HALT = DHCSR_KEY | DHCSR_DEBUGEN_BIT | DHCSR_HALT_BIT
     DHCSR_STEP = DHCSR_KEY | DHCSR_DEBUGEN_BIT | DHCSR_STEP_BIT
+    DHCSR_HALT_MASKINTS = DHCSR_HALT | DHCSR_MASKINTS_BIT
+    DHCSR_DEBUGEN_MASKINTS = DHCSR_DEBUGEN | DHCSR_MASKINTS_BIT
 
     DCRSR_REGWnR_BIT = 0x00010000
 
     DEMCR_RUN_AFTER_RESET = 0x00000000
     DEMCR_HALT_AFTER_RESET = 0x00000001
 
+    PSR_THUMB_BIT = 0x01000000
+
     def __init__(self, swd):
         self._swd = swd
 
@@ -67,6 +74,7 @@ class CortexM():
 
         return cls.REGISTERS.index(reg)
 
+    @_traced('cortexm')
     def get_reg(self, reg):
         """Read register"""
         reg = CortexM._get_reg_index(reg)
@@ -75,9 +83,10 @@ class CortexM():
         else:
             self._swd.set_mem32(self.DCRSR_REG, reg)
             while (self._swd.get_mem32(self.DHCSR_REG) & self.DHCSR_STATUS_REGRDY_BIT) == 0:
-                time.sleep(0.05)
+                _sleep(0.05)
             return self._swd.get_mem32(self.DCRDR_REG)
 
+    @_traced('cortexm')
     def set_reg(self, reg, data):
         """Read register"""
         reg = CortexM._get_reg_index(reg)
@@ -87,8 +96,9 @@ class CortexM():
             self._swd.set_mem32(self.DCRDR_REG, data)
             self._swd.set_mem32(self.DCRSR_REG, reg | self.DCRSR_REGWnR_BIT)
             while (self._swd.get_mem32(self.DHCSR_REG) & self.DHCSR_STATUS_REGRDY_BIT) == 0:
-                time.sleep(0.05)
+                _sleep(0.05)
 
+    @_traced('cortexm')
     def get_reg_all(self):
         """Read all registers"""
         if self._swd.default_ap == 0:
@@ -98,12 +108,14 @@ class CortexM():
 
         return dict(zip(CortexM.REGISTERS, values))
 
+    @_traced('cortexm')
     def reset(self):
         """Reset"""
         self._swd.set_mem32(CortexM.DEMCR_REG, CortexM.DEMCR_RUN_AFTER_RESET)
         self._swd.set_mem32(CortexM.AIRCR_REG, CortexM.AIRCR_SYSRESETREQ)
         # self._swd.get_mem32(CortexM.AIRCR_REG)
 
+    @_traced('cortexm')
     def reset_halt(self):
         """Reset and halt"""
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_HALT)
@@ -111,27 +123,87 @@ class CortexM():
         self._swd.set_mem32(CortexM.AIRCR_REG, CortexM.AIRCR_SYSRESETREQ)
         # self._swd.get_mem32(CortexM.AIRCR_REG)
 
+    @_traced('cortexm')
     def halt(self):
         """Halt"""
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_HALT)
 
+    @_traced('cortexm')
     def step(self):
         """Step"""
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_STEP)
 
+    @_traced('cortexm')
     def run(self):
         """Enable debug"""
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_DEBUGEN)
 
+    @_traced('cortexm')
     def nodebug(self):
         """Disable debug"""
         self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_DEBUGDIS)
 
+    @_traced('cortexm')
     def is_halted(self):
         """check if core is halted"""
         return self._swd.get_mem32(
             CortexM.DHCSR_REG) & CortexM.DHCSR_STATUS_HALT_BIT > 0
 
+    @_traced('cortexm')
+    def start_call(self, address, args=(), stack=None):
+        """Start function on halted core
+
+        Function must end with BKPT instruction, which halts core.
+        Interrupts are masked until core is halted, so pending interrupts
+        can not enter handlers in erased or overwritten memory.
+
+        Arguments:
+            address: address of Thumb code
+            args: values of R0, R1, .. registers
+            stack: value of SP, if None SP is not changed
+        """
+        for index, value in enumerate(args):
+            self.set_reg(index, value)
+        if stack is not None:
+            self.set_reg('SP', stack)
+        self.set_reg('PC', address & ~1)
+        self.set_reg('PSR', self.PSR_THUMB_BIT)
+        # C_MASKINTS can be changed only while core is halted
+        self._swd.set_mem32(CortexM.DHCSR_REG, CortexM.DHCSR_HALT_MASKINTS)
+        self._swd.set_mem32(
+            CortexM.DHCSR_REG, CortexM.DHCSR_DEBUGEN_MASKINTS)
+
+    @_traced('cortexm')
+    def wait_halted(self, timeout=1.0, poll=0.001):
+        """Wait until core is halted
+
+        Arguments:
+            timeout: maximum time in seconds
+            poll: delay between checks in seconds
+
+        Interrupts masked by start_call are unmasked on halted core.
+
+        Raise:
+            CortexMException: on timeout, core is halted
+        """
+        deadline = _time.perf_counter() + timeout
+        while not self.is_halted():
+            if _time.perf_counter() > deadline:
+                self.halt()
+                raise CortexMException("Timeout while waiting for halt")
+            _sleep(poll)
+        self.halt()
+
+    def call(self, address, args=(), stack=None, timeout=1.0):
+        """Call function on halted core and wait for its BKPT
+
+        Return:
+            value of R0
+        """
+        self.start_call(address, args, stack)
+        self.wait_halted(timeout)
+        return self.get_reg('R0')
+
     # def get_num_breakpoints(self):
     #     """Return number of HW break points"""
     #     return (self._swd.get_mem32(CortexM.BPCTRL_REG) >> 4) & 0x0f
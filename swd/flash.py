@@ -0,0 +1,646 @@
+"""STM32 FLASH programming
+
+Small loader is copied into SRAM of target and data are streamed into
+two SRAM buffers: host writes next buffer while target programs the
+previous one, so USB transfers overlap with programming. Erase is done
+from host by FLASH registers.
+
+Device is detected by DBGMCU IDCODE, supported devices are in DEVICES
+table and FLASH controllers of their families in FAMILIES table.
+"""
+
+import collections as _collections
+import contextlib as _contextlib
+import struct as _struct
+import time as _time
+import zlib as _zlib
+from swd.cortexm import CortexM as _CortexM
+from swd.stlink import StlinkException as _StlinkException
+from swd.stub import crc32 as _target_crc32
+from swd.tracer import sleep as _sleep
+from swd.tracer import traced as _traced
+
+FLASH_ADDRESS = 0x08000000
+SRAM_ADDRESS = 0x20000000
+
+FlashFamily = _collections.namedtuple('FlashFamily', [
+    'name',
+    'registers',    # address of FLASH registers
+    'keyr',         # offset of key register
+    'sr',           # offset of status register
+    'cr',           # offset of control register
+    'ar',           # offset of address register, None if erase by number
+    'unit',         # programming unit in bytes: 2, 4 or 8
+    'sr_busy',      # BSY bit
+    'sr_errors',    # error bits
+    'sr_clear',     # bits cleared by writing 1 (errors and EOP)
+    'cr_pg',        # programming bit
+    'cr_erase',     # page or sector erase bit
+    'cr_mer',       # mass erase bit
+    'cr_mer2',      # mass erase bit of second bank
+    'cr_strt',      # start bit
+    'cr_lock',      # lock bit
+    'cr_psize',     # program size bits set with PG and erase bits
+    'cr_bker',      # second bank bit of page erase, None if not used
+    'bank2_number',  # added to sector number in second bank
+])
+
+# controllers with page address in AR and halfword programming
+_F1_FLASH = dict(
+    registers=0x40022000, keyr=0x04, sr=0x0c, cr=0x10, ar=0x14, unit=2,
+    sr_busy=0x00000001, sr_errors=0x00000014, sr_clear=0x00000034,
+    cr_pg=0x00000001, cr_erase=0x00000002, cr_mer=0x00000004,
+    cr_mer2=None, cr_strt=0x00000040, cr_lock=0x00000080, cr_psize=0,
+    cr_bker=None, bank2_number=0)
+
+# controllers with sectors and word programming (PSIZE x32)
+_F4_FLASH = dict(
+    registers=0x40023c00, keyr=0x04, sr=0x0c, cr=0x10, ar=None, unit=4,
+    sr_busy=0x00010000, sr_errors=0x000001f2, sr_clear=0x000001f3,
+    cr_pg=0x00000001, cr_erase=0x00000002, cr_mer=0x00000004,
+    cr_mer2=0x00008000, cr_strt=0x00010000, cr_lock=0x80000000,
+    cr_psize=0x00000200, cr_bker=None, bank2_number=16)
+
+# controllers with pages and doubleword programming
+_L4_FLASH = dict(
+    registers=0x40022000, keyr=0x08, sr=0x10, cr=0x14, ar=None, unit=8,
+    sr_busy=0x00010000, sr_errors=0x0000c3fa, sr_clear=0x0000c3fb,
+    cr_pg=0x00000001, cr_erase=0x00000002, cr_mer=0x00000004,
+    cr_mer2=0x00008000, cr_strt=0x00010000, cr_lock=0x80000000,
+    cr_psize=0, cr_bker=0x00000800, bank2_number=0)
+
+FAMILIES = {
+    'STM32F0': FlashFamily('STM32F0', **_F1_FLASH),
+    'STM32F1': FlashFamily('STM32F1', **_F1_FLASH),
+    'STM32F3': FlashFamily('STM32F3', **_F1_FLASH),
+    'STM32F2': FlashFamily('STM32F2', **_F4_FLASH),
+    'STM32F4': FlashFamily('STM32F4', **_F4_FLASH),
+    'STM32F7': FlashFamily('STM32F7', **dict(
+        _F4_FLASH, sr_errors=0x000000f2, sr_clear=0x000000f3)),
+    'STM32L4': FlashFamily('STM32L4', **_L4_FLASH),
+    'STM32G0': FlashFamily('STM32G0', **dict(_L4_FLASH, cr_bker=0x00002000)),
+    'STM32G4': FlashFamily('STM32G4', **_L4_FLASH),
+}
+
+Device = _collections.namedtuple('Device', [
+    'name',
+    'family',         # key in FAMILIES
+    'size_register',  # address of FLASH size in KB
+    'layout',         # sizes of pages or sectors, last size repeats
+    'dual_bank',      # FLASH size from which each half is one bank or None
+    'sram_size',      # smallest SRAM from SRAM_ADDRESS of devices
+])
+# dual bank devices are expected in default dual bank mode of option bytes
+
+_K = 1024
+_F4_SECTORS = (16 * _K,) * 4 + (64 * _K, 128 * _K)
+_F7_SECTORS = (32 * _K,) * 4 + (128 * _K, 256 * _K)
+
+
+def _devices(family, size_register, layout, dual_bank, names):
+    return {
+        dev_id: Device(
+            name, family, size_register, layout, dual_bank, sram_size)
+        for dev_id, (name, sram_size) in names.items()}
+
+
+DEVICES = {
+    **_devices('STM32F0', 0x1ffff7cc, (1 * _K,), None, {
+        0x440: ('STM32F030x8/F05x', 8 * _K),
+        0x444: ('STM32F03x', 4 * _K),
+        0x445: ('STM32F04x', 6 * _K),
+    }),
+    **_devices('STM32F0', 0x1ffff7cc, (2 * _K,), None, {
+        0x442: ('STM32F030xC/F09x', 32 * _K),
+        0x448: ('STM32F07x', 16 * _K),
+    }),
+    **_devices('STM32F1', 0x1ffff7e0, (1 * _K,), None, {
+        0x410: ('STM32F1 medium density', 10 * _K),
+        0x412: ('STM32F1 low density', 4 * _K),
+        0x420: ('STM32F100 value line', 4 * _K),
+    }),
+    **_devices('STM32F1', 0x1ffff7e0, (2 * _K,), None, {
+        0x414: ('STM32F1 high density', 32 * _K),
+        0x418: ('STM32F105/F107', 64 * _K),
+        0x428: ('STM32F100 value line high density', 24 * _K),
+    }),
+    **_devices('STM32F3', 0x1ffff7cc, (2 * _K,), None, {
+        0x422: ('STM32F302xB/C/F303xB/C', 24 * _K),
+        0x432: ('STM32F37x', 16 * _K),
+        0x438: ('STM32F303x6/8/F334', 12 * _K),
+        0x439: ('STM32F301/F302x6/8', 16 * _K),
+        0x446: ('STM32F302xD/E/F303xD/E', 64 * _K),
+    }),
+    **_devices('STM32F2', 0x1fff7a22, _F4_SECTORS, None, {
+        0x411: ('STM32F2', 64 * _K),
+    }),
+    **_devices('STM32F4', 0x1fff7a22, _F4_SECTORS, None, {
+        0x413: ('STM32F405/F407/F415/F417', 128 * _K),
+        0x421: ('STM32F446', 128 * _K),
+        0x423: ('STM32F401xB/C', 64 * _K),
+        0x431: ('STM32F411', 128 * _K),
+        0x433: ('STM32F401xD/E', 96 * _K),
+        0x441: ('STM32F412', 256 * _K),
+        0x458: ('STM32F410', 32 * _K),
+        0x463: ('STM32F413/F423', 320 * _K),
+    }),
+    **_devices('STM32F4', 0x1fff7a22, _F4_SECTORS, 2048 * _K, {
+        0x419: ('STM32F42x/F43x', 192 * _K),
+        0x434: ('STM32F469/F479', 320 * _K),
+    }),
+    **_devices('STM32F7', 0x1ff0f442, _F7_SECTORS, None, {
+        0x449: ('STM32F74x/F75x', 320 * _K),
+        0x451: ('STM32F76x/F77x', 512 * _K),
+    }),
+    **_devices('STM32F7', 0x1ff07a22, _F4_SECTORS, None, {
+        0x452: ('STM32F72x/F73x', 256 * _K),
+    }),
+    **_devices('STM32L4', 0x1fff75e0, (2 * _K,), None, {
+        0x435: ('STM32L43x/L44x', 64 * _K),
+        0x462: ('STM32L45x/L46x', 160 * _K),
+        0x464: ('STM32L41x/L42x', 40 * _K),
+    }),
+    **_devices('STM32L4', 0x1fff75e0, (2 * _K,), 0, {
+        0x415: ('STM32L47x/L48x', 96 * _K),
+        0x461: ('STM32L49x/L4Ax', 320 * _K),
+    }),
+    **_devices('STM32L4', 0x1fff75e0, (4 * _K,), 0, {
+        0x470: ('STM32L4Rx/L4Sx', 640 * _K),
+        0x471: ('STM32L4P5/L4Q5', 320 * _K),
+    }),
+    **_devices('STM32G0', 0x1fff75e0, (2 * _K,), None, {
+        0x456: ('STM32G05x/G06x', 18 * _K),
+        0x460: ('STM32G07x/G08x', 36 * _K),
+        0x466: ('STM32G03x/G04x', 8 * _K),
+    }),
+    **_devices('STM32G0', 0x1fff75e0, (2 * _K,), 512 * _K, {
+        0x467: ('STM32G0Bx/G0Cx', 144 * _K),
+    }),
+    **_devices('STM32G4', 0x1fff75e0, (2 * _K,), None, {
+        0x468: ('STM32G43x/G44x', 22 * _K),
+        0x479: ('STM32G49x/G4Ax', 32 * _K),
+    }),
+    **_devices('STM32G4', 0x1fff75e0, (2 * _K,), 0, {
+        0x469: ('STM32G47x/G48x', 96 * _K),
+    }),
+}
+
+# DBGMCU IDCODE of Cortex-M3/M4/M7 and of Cortex-M0/M0+ devices
+_DBGMCU_IDCODE = (0xe0042000, 0x40015800)
+
+_KEY1 = 0x45670123
+_KEY2 = 0xcdef89ab
+
+# Thumb loaders, arguments: R0 source, R1 destination, R2 size,
+# R3 address of SR, R4 BSY mask, R5 errors mask,
+# return: R0 zero or error bits, R1 address of failed unit
+_LOADERS = {
+    2: (
+        0x8806,             # loop: ldrh r6, [r0]
+        0x800e,             #       strh r6, [r1]
+        0xf3bf, 0x8f4f,     #       dsb
+        0x681e,             # wait: ldr r6, [r3]
+        0x4226,             #       tst r6, r4
+        0xd1fc,             #       bne wait
+        0x422e,             #       tst r6, r5
+        0xd105,             #       bne error
+        0x3002,             #       adds r0, #2
+        0x3102,             #       adds r1, #2
+        0x3a02,             #       subs r2, #2
+        0xd1f2,             #       bne loop
+        0x2000,             #       movs r0, #0
+        0xbe00,             #       bkpt
+        0x402e,             # error: ands r6, r5
+        0x0030,             #       movs r0, r6
+        0xbe00,             #       bkpt
+    ),
+    4: (
+        0x6806,             # loop: ldr r6, [r0]
+        0x600e,             #       str r6, [r1]
+        0xf3bf, 0x8f4f,     #       dsb
+        0x681e,             # wait: ldr r6, [r3]
+        0x4226,             #       tst r6, r4
+        0xd1fc,             #       bne wait
+        0x422e,             #       tst r6, r5
+        0xd105,             #       bne error
+        0x3004,             #       adds r0, #4
+        0x3104,             #       adds r1, #4
+        0x3a04,             #       subs r2, #4
+        0xd1f2,             #       bne loop
+        0x2000,             #       movs r0, #0
+        0xbe00,             #       bkpt
+        0x402e,             # error: ands r6, r5
+        0x0030,             #       movs r0, r6
+        0xbe00,             #       bkpt
+    ),
+    8: (
+        0x6806,             # loop: ldr r6, [r0]
+        0x600e,             #       str r6, [r1]
+        0x6846,             #       ldr r6, [r0, #4]
+        0x604e,             #       str r6, [r1, #4]
+        0xf3bf, 0x8f4f,     #       dsb
+        0x681e,             # wait: ldr r6, [r3]
+        0x4226,             #       tst r6, r4
+        0xd1fc,             #       bne wait
+        0x422e,             #       tst r6, r5
+        0xd105,             #       bne error
+        0x3008,             #       adds r0, #8
+        0x3108,             #       adds r1, #8
+        0x3a08,             #       subs r2, #8
+        0xd1f0,             #       bne loop
+        0x2000,             #       movs r0, #0
+        0xbe00,             #       bkpt
+        0x402e,             # error: ands r6, r5
+        0x0030,             #       movs r0, r6
+        0xbe00,             #       bkpt
+    ),
+}
+# space reserved for loader before buffers
+_LOADER_SIZE = 0x40
+
+Block = _collections.namedtuple('Block', ['address', 'size', 'number', 'bank'])
+
+
+class FlashError(Exception):
+    """FLASH programming error"""
+
+
+def loader_code(unit):
+    """Machine code of loader for programming unit"""
+    code = _LOADERS[unit]
+    return _struct.pack(f'<{len(code)}H', *code)
+
+
+def _bank_blocks(layout, address, size, bank):
+    blocks = []
+    offset = 0
+    while offset < size:
+        block_size = layout[min(len(blocks), len(layout) - 1)]
+        blocks.append(Block(address + offset, block_size, len(blocks), bank))
+        offset += block_size
+    return blocks
+
+
+def flash_blocks(device, size):
+    """List of pages or sectors of device
+
+    Arguments:
+        device: Device
+        size: size of FLASH in bytes
+
+    Return:
+        list of Block(address, size, number, bank), number is index
+        in bank
+    """
+    if device.dual_bank is not None and size >= device.dual_bank:
+        bank_size = size // 2
+        return _bank_blocks(
+            device.layout, FLASH_ADDRESS, bank_size, 1) + _bank_blocks(
+                device.layout, FLASH_ADDRESS + bank_size, bank_size, 2)
+    return _bank_blocks(device.layout, FLASH_ADDRESS, size, 1)
+
+
+class Flash:
+    """STM32 FLASH programming
+
+    Core must be halted while programming, it is halted by program()
+    if it is running. Content of SRAM used by loader is lost.
+
+    Arguments:
+        swd: Swd instance
+        cortexm: CortexM instance, new is created if None
+        sram: address of SRAM used for loader and buffers
+        buffer_size: size of each of two buffers, multiple of 8, if None
+            BUFFER_SIZE or less to fit into SRAM of detected device
+    """
+
+    BUFFER_SIZE = 4096
+
+    def __init__(
+            self, swd, cortexm=None, sram=SRAM_ADDRESS, buffer_size=None):
+        if buffer_size is not None and (
+                buffer_size <= 0 or buffer_size % 8):
+            raise ValueError("Buffer size must be positive multiple of 8")
+        self._swd = swd
+        self._cortexm = cortexm if cortexm is not None else _CortexM(swd)
+        self._sram = sram
+        self._buffer_size = buffer_size
+        self._dev_id = None
+        self._size = None
+        self._blocks = None
+
+    def _detect(self):
+        if self._dev_id is not None:
+            return
+        for address in _DBGMCU_IDCODE:
+            try:
+                dev_id = self._swd.get_mem32(address) & 0xfff
+            except _StlinkException:
+                continue
+            if dev_id in DEVICES:
+                break
+        else:
+            raise FlashError("Unknown or unsupported device")
+        device = DEVICES[dev_id]
+        size_kb = int.from_bytes(
+            self._swd.read_mem_bytes(device.size_register, 2), 'little')
+        self._dev_id = dev_id
+        self._size = size_kb * _K
+        self._blocks = flash_blocks(device, self._size)
+
+    @property
+    def dev_id(self):
+        """Device ID from DBGMCU IDCODE"""
+        self._detect()
+        return self._dev_id
+
+    @property
+    def buffer_size(self):
+        """Size of each of two buffers
+
+        Raise:
+            FlashError: if loader and buffers do not fit into SRAM
+        """
+        available = SRAM_ADDRESS + self.device.sram_size - self._sram
+        available = (available - _LOADER_SIZE) // 2 // 8 * 8
+        if self._buffer_size is None:
+            if available < self.family.unit:
+                raise FlashError("Not enough SRAM for loader")
+            return min(self.BUFFER_SIZE, available)
+        if self._buffer_size > available:
+            raise FlashError(
+                "Loader and buffers do not fit into SRAM of "
+                f"{self.device.name}")
+        return self._buffer_size
+
+    @property
+    def device(self):
+        """Detected Device"""
+        return DEVICES[self.dev_id]
+
+    @property
+    def family(self):
+        """FlashFamily of detected device"""
+        return FAMILIES[self.device.family]
+
+    @property
+    def size(self):
+        """Size of FLASH in bytes"""
+        self._detect()
+        return self._size
+
+    @property
+    def blocks(self):
+        """List of all pages or sectors"""
+        self._detect()
+        return self._blocks
+
+    def blocks_in(self, address, size):
+        """Pages or sectors which overlap area"""
+        self._check_area(address, size)
+        return [
+            block for block in self.blocks
+            if block.address < address + size
+            and address < block.address + block.size]
+
+    def _check_area(self, address, size):
+        if address < FLASH_ADDRESS or \
+                address + size > FLASH_ADDRESS + self.size:
+            raise FlashError(
+                f"Area 0x{address:08x} - 0x{address + size:08x} "
+                "is out of FLASH")
+
+    def _get_sr(self):
+        family = self.family
+        return self._swd.get_mem32(family.registers + family.sr)
+
+    def _set_cr(self, value):
+        family = self.family
+        self._swd.set_mem32(family.registers + family.cr, value)
+
+    def _wait_busy(self, timeout):
+        """Wait until operation is finished and check errors"""
+        family = self.family
+        deadline = _time.perf_counter() + timeout
+        while True:
+            status = self._get_sr()
+            if not status & family.sr_busy:
+                break
+            if _time.perf_counter() > deadline:
+                raise FlashError("Timeout while FLASH is busy")
+            _sleep(0.001)
+        if status & family.sr_errors:
+            raise FlashError(
+                f"FLASH error, SR: 0x{status & family.sr_errors:08x}")
+
+    @_contextlib.contextmanager
+    def _unlocked(self):
+        """Context with unlocked FLASH controller and cleared errors"""
+        family = self.family
+        cr_address = family.registers + family.cr
+        if self._swd.get_mem32(cr_address) & family.cr_lock:
+            keyr_address = family.registers + family.keyr
+            self._swd.set_mem32(keyr_address, _KEY1)
+            self._swd.set_mem32(keyr_address, _KEY2)
+            if self._swd.get_mem32(cr_address) & family.cr_lock:
+                raise FlashError("FLASH can not be unlocked")
+        self._swd.set_mem32(family.registers + family.sr, family.sr_clear)
+        try:
+            yield
+        finally:
+            self._set_cr(family.cr_lock)
+
+    @_traced('flash')
+    def erase_all(self, timeout=60.0):
+        """Erase whole FLASH (mass erase)
+
+        Arguments:
+            timeout: maximum time of erase in seconds
+        """
+        family = self.family
+        mass_erase = family.cr_psize | family.cr_mer
+        if self.blocks[-1].bank == 2:
+            mass_erase |= family.cr_mer2
+        with self._unlocked():
+            self._set_cr(mass_erase)
+            self._set_cr(mass_erase | family.cr_strt)
+            self._wait_busy(timeout)
+
+    def _erase_block(self, block, timeout):
+        family = self.family
+        if family.ar is not None:
+            self._set_cr(family.cr_erase)
+            self._swd.set_mem32(family.registers + family.ar, block.address)
+            self._set_cr(family.cr_erase | family.cr_strt)
+        else:
+            command = family.cr_psize | family.cr_erase
+            number = block.number
+            if block.bank == 2:
+                number += family.bank2_number
+                if family.cr_bker is not None:
+                    command |= family.cr_bker
+            command |= number << 3
+            self._set_cr(command)
+            self._set_cr(command | family.cr_strt)
+        self._wait_busy(timeout)
+
+    @_traced('flash')
+    def erase(self, address, size, timeout=10.0):
+        """Erase all pages or sectors which overlap area
+
+        Arguments:
+            address: address in FLASH
+            size: number of bytes
+            timeout: maximum time of erase of one page or sector
+
+        Return:
+            list of erased Block
+        """
+        blocks = self.blocks_in(address, size)
+        self._erase_blocks(blocks, timeout)
+        return blocks
+
+    def _erase_blocks(self, blocks, timeout):
+        with self._unlocked():
+            for block in blocks:
+                self._erase_block(block, timeout)
+
+    def _check_loader(self, timeout):
+        """Wait for loader and check its result"""
+        self._cortexm.wait_halted(timeout)
+        result = self._cortexm.get_reg('R0')
+        if result:
+            address = self._cortexm.get_reg('R1')
+            raise FlashError(
+                f"Programming failed at address: 0x{address:08x} "
+                f"(SR: 0x{result:08x})")
+
+    @_traced('flash')
+    def program(self, address, data, timeout=1.0):
+        """Program erased FLASH
+
+        Data are written into two SRAM buffers, while loader programs
+        one buffer, next buffer is written by host. Unaligned start and
+        end are padded by 0xff.
+
+        Arguments:
+            address: address in FLASH
+            data: bytes-like data
+            timeout: maximum time of programming of one buffer
+        """
+        family = self.family
+        unit = family.unit
+        head = address % unit
+        data = b'\xff' * head + bytes(data)
+        address -= head
+        data += b'\xff' * (-len(data) % unit)
+        self._check_area(address, len(data))
+        if not data:
+            return
+        buffer_size = self.buffer_size
+        if not self._cortexm.is_halted():
+            self._cortexm.halt()
+        self._swd.write_mem(self._sram, loader_code(unit))
+        buffers = (
+            self._sram + _LOADER_SIZE,
+            self._sram + _LOADER_SIZE + buffer_size)
+        view = memoryview(data)
+        running = False
+        with self._unlocked():
+            self._set_cr(family.cr_psize | family.cr_pg)
+            for index, offset in enumerate(
+                    range(0, len(data), buffer_size)):
+                chunk = view[offset:offset + buffer_size]
+                buffer = buffers[index % 2]
+                # written while loader programs other buffer
+                self._swd.write_mem(buffer, chunk)
+                if running:
+                    self._check_loader(timeout)
+                self._cortexm.start_call(self._sram, (
+                    buffer, address + offset, len(chunk),
+                    family.registers + family.sr,
+                    family.sr_busy, family.sr_errors))
+                running = True
+            self._check_loader(timeout)
+
+    @_traced('flash')
+    def program_image(self, segments, erase=True, timeout=10.0):
+        """Erase FLASH under segments and program them
+
+        Arguments:
+            segments: list of swd.image.Segment
+            erase: erase pages or sectors before programming
+            timeout: maximum time of erase of one page or sector
+        """
+        if erase:
+            blocks = set()
+            for segment in segments:
+                blocks.update(
+                    self.blocks_in(segment.address, len(segment.data)))
+            self._erase_blocks(sorted(blocks), timeout)
+        for segment in segments:
+            self.program(segment.address, segment.data)
+
+    def _block_content(self, block, segments):
+        """Content of block after erase and programming of segments"""
+        content = bytearray(b'\xff' * block.size)
+        for segment in segments:
+            start = max(block.address, segment.address)
+            end = min(
+                block.address + block.size,
+                segment.address + len(segment.data))
+            if start < end:
+                content[start - block.address:end - block.address] = \
+                    segment.data[start - segment.address:end - segment.address]
+        return content
+
+    def _program_blocks(self, segments, blocks):
+        """Program parts of segments in blocks, adjacent blocks at once"""
+        for segment in segments:
+            segment_end = segment.address + len(segment.data)
+            start = end = None
+            for block in blocks:
+                low = max(block.address, segment.address)
+                high = min(block.address + block.size, segment_end)
+                if low >= high:
+                    continue
+                if start is not None and low == end:
+                    end = high
+                    continue
+                if start is not None:
+                    self.program(start, segment.data[
+                        start - segment.address:end - segment.address])
+                start, end = low, high
+            if start is not None:
+                self.program(start, segment.data[
+                    start - segment.address:end - segment.address])
+
+    @_traced('flash')
+    def update_image(self, segments, timeout=10.0):
+        """Erase and program only pages or sectors which differ
+
+        CRC-32 of each page or sector under segments is computed by
+        target and compared with CRC-32 of expected content (segments
+        with erased rest of page), so FLASH is not read over SWD.
+
+        Arguments:
+            segments: list of swd.image.Segment
+            timeout: maximum time of erase or CRC of one page or sector
+
+        Return:
+            list of changed Block
+        """
+        blocks = set()
+        for segment in segments:
+            blocks.update(self.blocks_in(segment.address, len(segment.data)))
+        changed = []
+        for block in sorted(blocks):
+            crc = _target_crc32(
+                self._swd, block.address, block.size,
+                cortexm=self._cortexm, sram=self._sram, timeout=timeout)
+            if crc != _zlib.crc32(self._block_content(block, segments)):
+                changed.append(block)
+        if changed:
+            self._erase_blocks(changed, timeout)
+            self._program_blocks(segments, changed)
+        return changed
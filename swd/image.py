@@ -0,0 +1,243 @@
+"""Loading of firmware images
+
+SREC, Intel HEX, ELF and raw binary files are parsed into sorted list
+of segments. Adjacent records are merged and small gaps between them
+are filled, so each segment can be written by one write_mem call,
+instead of one call for each record.
+"""
+
+import collections as _collections
+import struct as _struct
+
+Segment = _collections.namedtuple('Segment', ['address', 'data'])
+
+# gaps up to this size between records are filled
+GAP = 256
+# value of filled gaps, same as erased FLASH
+FILL = 0xff
+
+_ELF_MAGIC = b'\x7fELF'
+_ELF_CLASS32 = 1
+_ELF_DATA_LSB = 1
+_ELF_DATA_MSB = 2
+_ELF_PT_LOAD = 1
+# e_ident, e_type, e_machine, e_version, e_entry, e_phoff, e_shoff,
+# e_flags, e_ehsize, e_phentsize, e_phnum
+_ELF32_HEADER = '16sHHLLLLLHHH'
+# p_type, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, p_flags, p_align
+_ELF32_PROGRAM_HEADER = 'LLLLLLLL'
+
+# number of address bytes of SREC data records
+_SREC_ADDRESS_SIZE = {'1': 2, '2': 3, '3': 4}
+
+
+class ImageError(Exception):
+    """Wrong or unsupported image file"""
+
+
+def _record_bytes(digits, line_number):
+    try:
+        return bytes.fromhex(digits)
+    except ValueError:
+        raise ImageError(f"Wrong hex digits on line {line_number}") from None
+
+
+def parse_srec(lines):
+    """Parse Motorola S-record lines
+
+    Arguments:
+        lines: iterable of text lines
+
+    Return:
+        list of tuples (address, data) of data records
+    """
+    records = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] != 'S' or len(line) < 4:
+            raise ImageError(f"Wrong SREC record on line {line_number}")
+        record_type = line[1]
+        record = _record_bytes(line[2:], line_number)
+        if record[0] != len(record) - 1:
+            raise ImageError(f"Wrong record length on line {line_number}")
+        if sum(record) & 0xff != 0xff:
+            raise ImageError(f"Wrong checksum on line {line_number}")
+        address_size = _SREC_ADDRESS_SIZE.get(record_type)
+        if address_size is None:
+            # header, count and start address records
+            continue
+        address = int.from_bytes(record[1:1 + address_size], 'big')
+        records.append((address, record[1 + address_size:-1]))
+    return records
+
+
+def parse_hex(lines):
+    """Parse Intel HEX lines
+
+    Arguments:
+        lines: iterable of text lines
+
+    Return:
+        list of tuples (address, data) of data records
+    """
+    records = []
+    base = 0
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] != ':':
+            raise ImageError(f"Wrong HEX record on line {line_number}")
+        record = _record_bytes(line[1:], line_number)
+        if len(record) < 5 or record[0] != len(record) - 5:
+            raise ImageError(f"Wrong record length on line {line_number}")
+        if sum(record) & 0xff:
+            raise ImageError(f"Wrong checksum on line {line_number}")
+        offset = int.from_bytes(record[1:3], 'big')
+        record_type = record[3]
+        data = record[4:-1]
+        if record_type == 0x00:
+            records.append((base + offset, data))
+        elif record_type == 0x01:
+            break
+        elif record_type == 0x02:
+            base = int.from_bytes(data, 'big') << 4
+        elif record_type == 0x04:
+            base = int.from_bytes(data, 'big') << 16
+        elif record_type not in (0x03, 0x05):
+            raise ImageError(
+                f"Unknown record type {record_type} on line {line_number}")
+    return records
+
+
+def parse_elf(data):
+    """Parse loadable segments of ELF32 file
+
+    Segments are placed at physical address (load address), so
+    initialized data are loaded into FLASH, where startup code expects
+    them.
+
+    Arguments:
+        data: content of ELF file
+
+    Return:
+        list of tuples (address, data) of segments
+    """
+    if data[:4] != _ELF_MAGIC:
+        raise ImageError("Not ELF file")
+    if data[4] != _ELF_CLASS32:
+        raise ImageError("Only 32 bit ELF files are supported")
+    if data[5] == _ELF_DATA_LSB:
+        order = '<'
+    elif data[5] == _ELF_DATA_MSB:
+        order = '>'
+    else:
+        raise ImageError("Unknown byte order of ELF file")
+    try:
+        header = _struct.unpack_from(order + _ELF32_HEADER, data)
+        phoff, phentsize, phnum = header[5], header[9], header[10]
+        records = []
+        for index in range(phnum):
+            p_type, p_offset, _, p_paddr, p_filesz = _struct.unpack_from(
+                order + _ELF32_PROGRAM_HEADER, data,
+                phoff + index * phentsize)[:5]
+            if p_type != _ELF_PT_LOAD or not p_filesz:
+                continue
+            if p_offset + p_filesz > len(data):
+                raise ImageError("Segment is out of ELF file")
+            records.append((p_paddr, data[p_offset:p_offset + p_filesz]))
+    except _struct.error as err:
+        raise ImageError(f"Truncated ELF file ({err})") from None
+    return records
+
+
+def coalesce(records, gap=GAP, fill=FILL):
+    """Merge records into sorted list of segments
+
+    Adjacent records are merged, gaps up to gap bytes are filled by
+    fill value.
+
+    Arguments:
+        records: iterable of tuples (address, data)
+        gap: maximum size of filled gap
+        fill: value of filled bytes
+
+    Return:
+        list of Segment(address, data)
+
+    Raise:
+        ImageError: if records overlap
+    """
+    segments = []
+    address = end = None
+    parts = []
+    for record_address, data in sorted(
+            records, key=lambda record: record[0]):
+        if not data:
+            continue
+        if parts and record_address < end:
+            raise ImageError(
+                f"Overlapping data at address: 0x{record_address:08x}")
+        if parts and record_address - end <= gap:
+            if record_address > end:
+                parts.append(bytes([fill]) * (record_address - end))
+        else:
+            if parts:
+                segments.append(Segment(address, b''.join(parts)))
+            address = record_address
+            parts = []
+        parts.append(data)
+        end = record_address + len(data)
+    if parts:
+        segments.append(Segment(address, b''.join(parts)))
+    return segments
+
+
+def _read_records(data):
+    """Detect format of file content and parse its records"""
+    if data[:4] == _ELF_MAGIC:
+        return parse_elf(data)
+    if data[:1] in (b'S', b':'):
+        try:
+            lines = data.decode('ascii').splitlines()
+        except UnicodeDecodeError:
+            raise ImageError("Not SREC or HEX file") from None
+        if data[:1] == b'S':
+            return parse_srec(lines)
+        return parse_hex(lines)
+    raise ImageError("Unknown format, address is required for binary file")
+
+
+def load(file_name, address=None, gap=GAP, fill=FILL):
+    """Load image file
+
+    Format of file is detected from its content.
+
+    Arguments:
+        file_name: SREC, Intel HEX, ELF or binary file
+        address: address of binary file, if set, file is always loaded
+            as binary
+        gap: maximum size of filled gap
+        fill: value of filled bytes
+
+    Return:
+        sorted list of Segment(address, data)
+    """
+    with open(file_name, 'rb') as image_file:
+        data = image_file.read()
+    if address is not None:
+        return coalesce([(address, data)])
+    return coalesce(_read_records(data), gap, fill)
+
+
+def write_image(dev, segments, **kwargs):
+    """Write segments into memory, one write_mem call for each segment
+
+    Arguments:
+        dev: Swd instance
+        segments: list of Segment
+    """
+    for segment in segments:
+        dev.write_mem(segment.address, segment.data, **kwargs)
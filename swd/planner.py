@@ -0,0 +1,106 @@
+"""Memory access planner
+
+Split memory access into minimal list of driver operations
+"""
+
+import collections as _collections
+import functools as _functools
+
+
+Access = _collections.namedtuple('Access', ['width', 'address', 'size'])
+
+
+def _chunks(width, address, size, maximum):
+    """Split one region into accesses with same width"""
+    accesses = []
+    while size:
+        chunk_size = min(size, maximum)
+        accesses.append(Access(width, address, chunk_size))
+        address += chunk_size
+        size -= chunk_size
+    return accesses
+
+
+def _count(size, maximum):
+    """Number of accesses for region"""
+    return -(-size // maximum)
+
+
+def _regions(address, size, small, large):
+    """Candidates of (head, body, tail) regions
+
+    Head and tail are accessed by small width, body by large width.
+    Body can lose its last partial chunk (or whole body) into head
+    and tail, if this reduce number of accesses.
+    """
+    (_, max_small), (width_large, max_large) = small, large
+    unit = width_large // 8
+    head = min(size, -address % unit)
+    tail = (size - head) % unit
+    body = size - head - tail
+    candidates = [(head, body, tail), (size, 0, 0)]
+    remainder = body % max_large
+    if 0 < remainder < body:
+        extra_head = min(remainder, (max_small - head) // unit * unit)
+        for moved_head in sorted({0, remainder, max(0, extra_head)}):
+            moved_tail = remainder - moved_head
+            candidates.append((
+                head + moved_head, body - remainder, tail + moved_tail))
+    return candidates
+
+
+def _cost(regions, small, large):
+    """Cost of regions: number of accesses and bytes with small width"""
+    head, body, tail = regions
+    (_, max_small), (_, max_large) = small, large
+    if not body:
+        return _count(head + tail, max_small), head + tail
+    count = _count(head, max_small) + _count(body, max_large)
+    count += _count(tail, max_small)
+    return count, head + tail
+
+
+@_functools.lru_cache(maxsize=1024)
+def plan_access(address, size, limits):
+    """Plan memory access with minimal number of operations
+
+    With two widths, head and tail of region which are not aligned for
+    wider access are accessed by 8 bit width. Narrow access is used for
+    bigger part of region only if it reduce number of operations.
+    Result is cached for same arguments.
+
+    Arguments:
+        address: address in memory
+        size: number of bytes
+        limits: tuple of (width, maximum) pairs with allowed access widths
+            and maximum number of bytes for one operation with this width,
+            one width or 8 bit and one wider width
+
+    Return:
+        tuple of Access(width, address, size)
+
+    Raise:
+        ValueError: if combination of widths is not supported
+    """
+    # maximum must be aligned to access width
+    limits = sorted(
+        (width, maximum - maximum % (width // 8))
+        for width, maximum in limits)
+    if not limits:
+        raise ValueError("No access width is allowed")
+    # unaligned head and tail of any size need 8 bit access
+    if len(limits) > 2 or (len(limits) == 2 and limits[0][0] != 8):
+        raise ValueError("Unsupported combination of access widths")
+    small, large = limits[0], limits[-1]
+    if len(limits) == 1 or not size:
+        return tuple(_chunks(large[0], address, size, large[1]))
+    best = min(
+        _regions(address, size, small, large),
+        key=lambda regions: _cost(regions, small, large))
+    head, body, tail = best
+    if not body:
+        return tuple(_chunks(small[0], address, size, small[1]))
+    accesses = _chunks(small[0], address, head, small[1])
+    accesses += _chunks(large[0], address + head, body, large[1])
+    accesses += _chunks(small[0], address + head + body, tail, small[1])
+    return tuple(accesses)
@@ -13,6 +13,14 @@ class StlinkException(StlinkError):
     """StlinkCom general error"""
 
 
+class StlinkRwException(StlinkException):
+    """Exception raised when bulk R/W operation failed"""
+    def __init__(self, message, status, fault_address):
+        super().__init__(message)
+        self.status = status
+        self.fault_address = fault_address
+
+
 class StlinkOutdatedFirmware(StlinkException):
     """StlinkCom general exception"""
     def __init__(self, current_version, minimal_version):
@@ -116,16 +124,35 @@ class Stlink:
             com = _com.StlinkCom(usb, debug=debug)
         self._com = com
         self._version = self._read_version()
+        self._maximum_8bit_data = self._negotiate_maximum_8bit_data()
         self._leave_state()
         if swd_frequency:
             self.set_swd_freq(swd_frequency)
         status = self._com.enter_debug_swd()
-        _check_status(status)
+        self._check_status(status)
+
+    @staticmethod
+    def list_probes():
+        """Return list of connected ST-Link probes
+
+        Return:
+            list of StlinkProbe(serial_no, dev_name, id_vendor, id_product)
+        """
+        return _usb.StlinkUsb.list_probes()
+
+    def _negotiate_maximum_8bit_data(self):
+        """Maximum transfer size for 8 bit data supported by this probe"""
+        if self._version.major >= 3:
+            return self._com.STLINKV3_MAXIMUM_8BIT_DATA
+        return self._com.STLINK_MAXIMUM_8BIT_DATA
 
     @property
     def maximum_8bit_data(self):
-        """Maximum transfer size for 8 bit data"""
-        return self._com.STLINK_MAXIMUM_8BIT_DATA
+        """Maximum transfer size for 8 bit data
+
+        Depends on ST-Link hardware version detected while connecting.
+        """
+        return self._maximum_8bit_data
 
     @property
     def maximum_16bit_data(self):
@@ -142,6 +169,23 @@ class Stlink:
         """Communication class"""
         return self._com
 
+    @property
+    def stats(self):
+        """StlinkStats collecting statistics of transfers or None"""
+        return getattr(self._com.usb, 'stats', None)
+
+    @stats.setter
+    def stats(self, value):
+        """Start collecting statistics into StlinkStats, None stop it"""
+        self._com.usb.stats = value
+
+    def _check_status(self, status):
+        if status != _com.StlinkCom.STATUS.JTAG_OK:
+            stats = self.stats
+            if stats is not None:
+                stats.record_status(status)
+        _check_status(status)
+
     def _read_version(self):
         ver, _, _ = self._com.get_version()
         version = {
@@ -206,7 +250,7 @@ class Stlink:
         for freq, freq_id in self._com.SWD_FREQ:
             if swd_frequency >= freq:
                 status = self._com.set_swd_freq(freq_id)
-                _check_status(status)
+                self._check_status(status)
                 break
         else:
             raise StlinkException("Selected SWD frequency is too low")
@@ -216,13 +260,13 @@ class Stlink:
             raise StlinkError("This command require ST-Link/V3")
         req_freq_khz = req_frequency // 1000
         status, current_freq_khz, frequencies_khz = self._com.get_com_freq(com)
-        _check_status(status)
+        self._check_status(status)
         if current_freq_khz == req_freq_khz:
             return
         for freq_khz in frequencies_khz:
             if req_freq_khz >= freq_khz:
                 status, set_freq_khz = self._com.set_com_freq(freq_khz, com)
-                _check_status(status)
+                self._check_status(status)
                 if freq_khz != set_freq_khz:
                     raise StlinkError("Error setting frequency.")
                 break
@@ -236,7 +280,7 @@ class Stlink:
             32 bit number
         """
         status, idcode = self._com.get_idcode()
-        _check_status(status)
+        self._check_status(status)
         return idcode
 
     def open_ap(self, ap_sel):
@@ -245,7 +289,7 @@ class Stlink:
         Arguments:
             ap_sel: AP number to open"""
         status = self._com.open_ap(ap_sel)
-        _check_status(status)
+        self._check_status(status)
 
     def close_ap(self, ap_sel):
         """Close AP (debug access point) for accesses
@@ -253,7 +297,7 @@ class Stlink:
         Arguments:
             ap_sel: AP number to open"""
         status = self._com.close_ap(ap_sel)
-        _check_status(status)
+        self._check_status(status)
 
     def get_reg(self, register):
         """Get core register
@@ -269,7 +313,7 @@ class Stlink:
             32 bit number
         """
         status, value = self._com.get_reg(register)
-        _check_status(status)
+        self._check_status(status)
         return value
 
     def get_reg_all(self):
@@ -284,7 +328,7 @@ class Stlink:
             list of 32 bit numbers
         """
         status, values = self._com.get_reg_all()
-        _check_status(status)
+        self._check_status(status)
         return values
 
     def set_reg(self, register, value):
@@ -302,7 +346,7 @@ class Stlink:
             status: command status
         """
         status = self._com.set_reg(register, value)
-        _check_status(status)
+        self._check_status(status)
 
     def get_mem32(self, address, *, ap=None, **kwargs):
         """Get 32 bit memory register with 32 bit memory access.
@@ -323,7 +367,7 @@ class Stlink:
             return int.from_bytes(self.read_mem32(address, 4, ap=ap, **kwargs), 'little')
 
         status, value = self._com.get_mem32(address)
-        _check_status(status)
+        self._check_status(status)
         return value
 
     def set_mem32(self, address, value, *, ap=None, **kwargs):
@@ -344,18 +388,66 @@ class Stlink:
             return
 
         status = self._com.set_mem32(address, value)
-        _check_status(status)
+        self._check_status(status)
+
+    def set_mem32_many(self, items, *, ap=None, **kwargs):
+        """Set more 32 bit memory registers
+
+        If USB has pipeline_depth bigger than 1, commands are sent with
+        more commands in flight, otherwise one by one by set_mem32.
+
+        Arguments:
+            items: list of tuples (address, value), address must be
+                aligned to 4 Bytes
+            ap: AP number to access
+        """
+        items = list(items)
+        for address, _ in items:
+            _check_alignment(4, address=address)
+        ap = ap or self._com.default_ap
+        if ap != 0 or getattr(self._com.usb, 'pipeline_depth', 1) <= 1:
+            for address, value in items:
+                self.set_mem32(address, value, ap=ap, **kwargs)
+            return
+        for status in self._com.set_mem32_pipeline(items):
+            self._check_status(status)
 
     def _check_last_rw_state(self):
         status, fault_address = self._com.get_last_rw_state_ex()
         if status == self._com.STATUS.JTAG_OK:
             return
+        stats = self.stats
+        if stats is not None:
+            stats.record_status(status)
         if status in self._com.STATUS.MESSAGES:
             msg = self._com.STATUS.MESSAGES[status]
             msg = f"{msg} at address: 0x{fault_address:08x}"
-            raise StlinkException(msg)
+            raise StlinkRwException(msg, status, fault_address)
         raise StlinkError("Unknown status")
 
+    def check_last_rw_state(self):
+        """Check state of last bulk R/W operations
+
+        Useful after transfers with check_last_error_status=False,
+        error state is sticky, so one check cover all previous transfers.
+
+        Raise:
+            StlinkRwException: if some transfer failed
+        """
+        self._check_last_rw_state()
+
+    def _check_read_mem(self, width, address, size):
+        if width == 8:
+            maximum = self.maximum_8bit_data
+        else:
+            if width == 16 and self._version.major <= 2 and self._version.jtag < 26:
+                raise StlinkException(self._version.str, "J26")
+            _check_alignment(width // 8, address=address, size=size)
+            maximum = self.maximum_32bit_data
+        if size > maximum:
+            raise StlinkException(
+                'Too many Bytes to read (maximum is %d Bytes)' % maximum)
+
     def read_mem8(self, address, size, check_last_error_status=True, **kwargs):
         """Read data from memory with 8 bit memory access.
 
@@ -368,10 +460,7 @@ class Stlink:
         Return:
             bytes of data
         """
-        if size > self.maximum_8bit_data:
-            raise StlinkException(
-                'Too many Bytes to read (maximum is %d Bytes)'
-                % self.maximum_8bit_data)
+        self._check_read_mem(8, address, size)
         data = self._com.read_mem8(address, size, **kwargs)
         if check_last_error_status:
             self._check_last_rw_state()
@@ -407,13 +496,7 @@ class Stlink:
         Return:
             list of read data
         """
-        if self._version.major <= 2 and self._version.jtag < 26:
-            raise StlinkException(self._version.str, "J26")
-        _check_alignment(2, address=address, size=size)
-        if size > self.maximum_32bit_data:
-            raise StlinkException(
-                'Too many Bytes to read (maximum is %d Bytes)'
-                % self.maximum_32bit_data)
+        self._check_read_mem(16, address, size)
         data = self._com.read_mem16(address, size, **kwargs)
         if check_last_error_status:
             self._check_last_rw_state()
@@ -453,11 +536,7 @@ class Stlink:
         Return:
             list of read data
         """
-        _check_alignment(4, address=address, size=size)
-        if size > self.maximum_32bit_data:
-            raise StlinkException(
-                'Too many Bytes to read (maximum is %d Bytes)'
-                % self.maximum_32bit_data)
+        self._check_read_mem(32, address, size)
         data = self._com.read_mem32(address, size, **kwargs)
         if check_last_error_status:
             self._check_last_rw_state()
@@ -481,3 +560,31 @@ class Stlink:
         self._com.write_mem32(address, data, **kwargs)
         if check_last_error_status:
             self._check_last_rw_state()
+
+    def read_mem_chunks(self, chunks, check_last_error_status=True, **kwargs):
+        """Read more chunks of memory
+
+        If USB has pipeline_depth bigger than 1, commands for chunks are
+        sent with more commands in flight and last R/W state is checked
+        only once after last chunk, otherwise each chunk is read by
+        read_mem8, read_mem16 or read_mem32.
+
+        Arguments:
+            chunks: list of tuples (width, address, size),
+                width is memory access 8, 16 or 32 bit
+            buffered: receive into reusable buffers, each chunk is valid
+                only until next iteration
+
+        Return:
+            iterable of bytes of data for each chunk
+        """
+        if getattr(self._com.usb, 'pipeline_depth', 1) <= 1:
+            for width, address, size in chunks:
+                yield getattr(self, f'read_mem{width}')(
+                    address, size, check_last_error_status, **kwargs)
+            return
+        for width, address, size in chunks:
+            self._check_read_mem(width, address, size)
+        yield from self._com.read_mem_pipeline(chunks, **kwargs)
+        if check_last_error_status:
+            self._check_last_rw_state()
@@ -4,6 +4,34 @@
 import struct as _struct
 
 
+class _Command:
+    """Precompiled ST-Link command
+
+    Command header is stored once into command buffer padded to full
+    command size, arguments are packed into same buffer by precompiled
+    struct, so each call return same buffer.
+    """
+
+    SIZE = 16
+
+    def __init__(self, header, args_format=''):
+        self._buffer = bytearray(self.SIZE)
+        self._buffer[:len(header)] = bytes(header)
+        self._offset = len(header)
+        self._struct = _struct.Struct('<' + args_format)
+        if self._offset + self._struct.size > self.SIZE:
+            raise ValueError("Command is longer than %d Bytes" % self.SIZE)
+
+    def pack(self, *args):
+        """Pack arguments into command buffer
+
+        Return:
+            command buffer, valid only until next call of pack
+        """
+        self._struct.pack_into(self._buffer, self._offset, *args)
+        return self._buffer
+
+
 class StlinkCom:
     """ST-Link class"""
 
@@ -193,6 +221,122 @@ class StlinkCom:
     )
 
     STLINK_MAXIMUM_8BIT_DATA = 64
+    STLINKV3_MAXIMUM_8BIT_DATA = 512
+
+    # precompiled decoders of responses
+    _RES_VERSION = _struct.Struct('>H4x')
+    _RES_VERSION_IDS = _struct.Struct('<xxHH')
+    _RES_VERSION_EX = _struct.Struct('<5B3xHH')
+    _RES_MODE = _struct.Struct('<Bx')
+    _RES_STATUS = _struct.Struct('<H')
+    _RES_COM_FREQ = _struct.Struct('<HxxLL10L')
+    _RES_STATUS_VALUE = _struct.Struct('<HxxL')
+    _RES_VOLTAGE = _struct.Struct('<LL')
+    _RES_IDCODE = _struct.Struct('<HxxL4x')
+    _RES_REG_ALL = _struct.Struct('<Hxx21L')
+    _RES_LAST_RW_STATE_EX = _struct.Struct('<HxxI4x')
+
+    # command name: (command header, format of command arguments)
+    _COMMANDS = {
+        'get_version': ((CMD.GET_VERSION, 0x80), ''),
+        'get_version_ex': ((CMD.GET_VERSION_EX, 0x80), ''),
+        'exit_dfu': ((CMD.DFU.COMMAND, CMD.DFU.EXIT), ''),
+        'exit_debug': ((CMD.DEBUG.COMMAND, CMD.DEBUG.EXIT), ''),
+        'exit_swim': ((CMD.SWIM.COMMAND, CMD.SWIM.EXIT), ''),
+        'get_current_mode': ((CMD.GET_CURRENT_MODE,), ''),
+        'enter_debug_swd': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.ENTER,
+                CMD.DEBUG.ENTERDEBUG.SWD,
+            ),
+            ''),
+        'set_swd_freq': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.SET_SWD_FREQ,
+            ),
+            'H'),
+        'get_com_freq': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV3.GET_COM_FREQ,
+            ),
+            'B'),
+        'set_com_freq': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV3.SET_COM_FREQ,
+            ),
+            'HL'),
+        'get_target_voltage': ((CMD.GET_TARGET_VOLTAGE,), ''),
+        'get_idcode': ((CMD.DEBUG.COMMAND, CMD.DEBUG.APIV2.READ_IDCODES), ''),
+        'get_reg': ((CMD.DEBUG.COMMAND, CMD.DEBUG.APIV2.READ_REG), 'B'),
+        'get_reg_all': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.READ_ALL_REGS,
+            ),
+            ''),
+        'set_reg': ((CMD.DEBUG.COMMAND, CMD.DEBUG.APIV2.WRITE_REG), 'BL'),
+        'open_ap': ((CMD.DEBUG.COMMAND, CMD.DEBUG.APIV2.JTAG_INIT_AP), 'B'),
+        'close_ap': ((CMD.DEBUG.COMMAND, CMD.DEBUG.APIV2.JTAG_CLOSE_AP), 'B'),
+        'get_ap_reg': ((CMD.DEBUG.COMMAND, CMD.DEBUG.APIV2.READ_AP_REG), 'HH'),
+        'set_ap_reg': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.WRITE_AP_REG,
+            ),
+            'HHL'),
+        'get_mem32': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.READ_DEBUG_REG,
+            ),
+            'L'),
+        'set_mem32': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.WRITE_DEBUG_REG,
+            ),
+            'LL'),
+        'get_last_rw_state': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.GET_LAST_RW_STATE,
+            ),
+            ''),
+        'get_last_rw_state_ex': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.GET_LAST_RW_STATE_EX,
+            ),
+            ''),
+        'read_mem8': ((CMD.DEBUG.COMMAND, CMD.DEBUG.READ_MEM_8BIT), 'LHL'),
+        'write_mem8': ((CMD.DEBUG.COMMAND, CMD.DEBUG.WRITE_MEM_8BIT), 'LHL'),
+        'read_mem16': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.READ_MEM_16BIT,
+            ),
+            'LHL'),
+        'write_mem16': (
+            (
+                CMD.DEBUG.COMMAND,
+                CMD.DEBUG.APIV2.WRITE_MEM_16BIT,
+            ),
+            'LHL'),
+        'read_mem32': ((CMD.DEBUG.COMMAND, CMD.DEBUG.READ_MEM_32BIT), 'LHL'),
+        'write_mem32': ((CMD.DEBUG.COMMAND, CMD.DEBUG.WRITE_MEM_32BIT), 'LHL'),
+    }
+
+    _READ_MEM_CMD = {
+        8: CMD.DEBUG.READ_MEM_8BIT,
+        16: CMD.DEBUG.APIV2.READ_MEM_16BIT,
+        32: CMD.DEBUG.READ_MEM_32BIT,
+    }
+    _READ_MEM_PIPELINE = _struct.Struct('<BBLHL4x')
+    _SET_MEM32_PIPELINE = _struct.Struct('<BBLL6x')
 
     def __init__(self, usb, debug=0):
         """Stlink constructor
@@ -204,6 +348,9 @@ class StlinkCom:
         self._debug = debug
         self._usb = usb
         self._default_ap = 0
+        self._commands = {
+            name: _Command(header, args_format)
+            for name, (header, args_format) in self._COMMANDS.items()}
 
     @property
     def usb(self):
@@ -231,13 +378,10 @@ class StlinkCom:
             vid: USB Vendor ID
             pid: USB Product ID
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.GET_VERSION,
-            0x80)
-        res = self._usb.xfer(cmd, rx_length=6)
-        ver, = _struct.unpack('>H4x', res)  # big endian
-        vid, pid = _struct.unpack('<xxHH', res)  # little endian
+        cmd = self._commands['get_version'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=6)
+        ver, = self._RES_VERSION.unpack(res)  # big endian
+        vid, pid = self._RES_VERSION_IDS.unpack(res)  # little endian
         return ver, vid, pid
 
     def get_version_ex(self):
@@ -252,50 +396,35 @@ class StlinkCom:
             vid: USB Vendor ID
             pid: USB Product ID
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.GET_VERSION_EX,
-            0x80)
-        res = self._usb.xfer(cmd, rx_length=12)
-        major, swim, jtag, msc, bridge, vid, pid = _struct.unpack(
-            '<5B3xHH', res)
+        cmd = self._commands['get_version_ex'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=12)
+        major, swim, jtag, msc, bridge, vid, pid = self._RES_VERSION_EX.unpack(res)
         return major, swim, jtag, msc, bridge, vid, pid
 
     def exit_dfu(self):
         """Exit DFU mode
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.DFU.COMMAND,
-            self.CMD.DFU.EXIT)
+        cmd = self._commands['exit_dfu'].pack()
         self._usb.xfer(cmd)
 
     def exit_debug(self):
         """Exit debug mode
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.EXIT)
+        cmd = self._commands['exit_debug'].pack()
         self._usb.xfer(cmd)
 
     def exit_swim(self):
         """Exit SWIM mode
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.SWIM.COMMAND,
-            self.CMD.SWIM.EXIT)
+        cmd = self._commands['exit_swim'].pack()
         self._usb.xfer(cmd)
 
     def get_current_mode(self):
         """Get current mode
         """
-        cmd = _struct.pack(
-            '<B',
-            self.CMD.GET_CURRENT_MODE)
-        res = self._usb.xfer(cmd, rx_length=2)
-        mode, = _struct.unpack('<Bx', res)
+        cmd = self._commands['get_current_mode'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        mode, = self._RES_MODE.unpack(res)
         return mode
 
     def enter_debug_swd(self):
@@ -304,13 +433,9 @@ class StlinkCom:
         Returns:
             status: command status
         """
-        cmd = _struct.pack(
-            '<BBB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.ENTER,
-            self.CMD.DEBUG.ENTERDEBUG.SWD)
-        res = self._usb.xfer(cmd, rx_length=2)
-        status, = _struct.unpack('<H', res)
+        cmd = self._commands['enter_debug_swd'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        status, = self._RES_STATUS.unpack(res)
         return status
 
     def set_swd_freq(self, freq_id):
@@ -322,13 +447,9 @@ class StlinkCom:
         Returns:
             status: command status
         """
-        cmd = _struct.pack(
-            '<BBH',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.SET_SWD_FREQ,
-            freq_id)
-        res = self._usb.xfer(cmd, rx_length=2)
-        status, = _struct.unpack('<H', res)
+        cmd = self._commands['set_swd_freq'].pack(freq_id)
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        status, = self._RES_STATUS.unpack(res)
         return status
 
     def get_com_freq(self, com):
@@ -342,14 +463,9 @@ class StlinkCom:
             current_freq: current communication frequency in kHz
             frequencies: possible frequencies in kHz
         """
-        cmd = _struct.pack(
-            '<BBB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV3.GET_COM_FREQ,
-            com)
-        res = self._usb.xfer(cmd, rx_length=52)
-        status, current_freq, count, *frequencies = _struct.unpack(
-            '<HxxLL10L', res)
+        cmd = self._commands['get_com_freq'].pack(com)
+        res = self._usb.xfer_into(cmd, rx_length=52)
+        status, current_freq, count, *frequencies = self._RES_COM_FREQ.unpack(res)
         return status, current_freq, frequencies[:count]
 
     def set_com_freq(self, freq_khz, com):
@@ -363,14 +479,9 @@ class StlinkCom:
             status: command status
             set_freq_khz: set frequency in kHz
         """
-        cmd = _struct.pack(
-            '<BBHL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV3.SET_COM_FREQ,
-            com,
-            freq_khz)
-        res = self._usb.xfer(cmd, rx_length=8)
-        status, set_freq_khz = _struct.unpack('<HxxL', res)
+        cmd = self._commands['set_com_freq'].pack(com, freq_khz)
+        res = self._usb.xfer_into(cmd, rx_length=8)
+        status, set_freq_khz = self._RES_STATUS_VALUE.unpack(res)
         return status, set_freq_khz
 
     def get_target_voltage(self):
@@ -379,11 +490,9 @@ class StlinkCom:
         Return:
             measured voltage
         """
-        cmd = _struct.pack(
-            '<B',
-            self.CMD.GET_TARGET_VOLTAGE)
-        res = self._usb.xfer(cmd, rx_length=8)
-        an0, an1 = _struct.unpack('<LL', res)
+        cmd = self._commands['get_target_voltage'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=8)
+        an0, an1 = self._RES_VOLTAGE.unpack(res)
         return round(2 * an1 * 1.2 / an0, 2) if an0 != 0 else None
 
     def get_idcode(self):
@@ -393,12 +502,9 @@ class StlinkCom:
             status: command status
             32 bit number
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.READ_IDCODES)
-        res = self._usb.xfer(cmd, rx_length=12)
-        status, idcode = _struct.unpack('<HxxL4x', res)
+        cmd = self._commands['get_idcode'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=12)
+        status, idcode = self._RES_IDCODE.unpack(res)
         return status, idcode
 
     def get_reg(self, register):
@@ -415,13 +521,9 @@ class StlinkCom:
             status: command status
             32 bit number
         """
-        cmd = _struct.pack(
-            '<BBB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.READ_REG,
-            register)
-        res = self._usb.xfer(cmd, rx_length=8)
-        status, value = _struct.unpack('<HxxL', res)
+        cmd = self._commands['get_reg'].pack(register)
+        res = self._usb.xfer_into(cmd, rx_length=8)
+        status, value = self._RES_STATUS_VALUE.unpack(res)
         return status, value
 
     def get_reg_all(self):
@@ -435,12 +537,9 @@ class StlinkCom:
             status: command status
             list of 32 bit numbers
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.READ_ALL_REGS)
-        res = self._usb.xfer(cmd, rx_length=88)
-        status, *values = _struct.unpack('<Hxx21L', res)
+        cmd = self._commands['get_reg_all'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=88)
+        status, *values = self._RES_REG_ALL.unpack(res)
         return status, values
 
     def set_reg(self, register, value):
@@ -457,14 +556,9 @@ class StlinkCom:
         Return:
             status: command status
         """
-        cmd = _struct.pack(
-            '<BBBL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.WRITE_REG,
-            register,
-            value)
-        res = self._usb.xfer(cmd, rx_length=2)
-        status, = _struct.unpack('<H', res)
+        cmd = self._commands['set_reg'].pack(register, value)
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        status, = self._RES_STATUS.unpack(res)
         return status
 
     def open_ap(self, ap_sel):
@@ -476,13 +570,9 @@ class StlinkCom:
         Return:
             status: command status"""
 
-        cmd = _struct.pack(
-            '<BBB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.JTAG_INIT_AP,
-            ap_sel)
-        res = self._usb.xfer(cmd, rx_length=2)
-        status, = _struct.unpack('<H', res)
+        cmd = self._commands['open_ap'].pack(ap_sel)
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        status, = self._RES_STATUS.unpack(res)
         return status
 
     def close_ap(self, ap_sel):
@@ -494,13 +584,9 @@ class StlinkCom:
         Return:
             status: command status"""
 
-        cmd = _struct.pack(
-            '<BBB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.JTAG_CLOSE_AP,
-            ap_sel)
-        res = self._usb.xfer(cmd, rx_length=2)
-        status, = _struct.unpack('<H', res)
+        cmd = self._commands['close_ap'].pack(ap_sel)
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        status, = self._RES_STATUS.unpack(res)
         return status
 
     def get_ap_reg(self, ap_sel, register):
@@ -514,14 +600,9 @@ class StlinkCom:
             status: command status
             32 bit number
         """
-        cmd = _struct.pack(
-            '<BBHH',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.READ_AP_REG,
-            ap_sel,
-            register)
-        res = self._usb.xfer(cmd, rx_length=8)
-        status, value = _struct.unpack('<HxxL', res)
+        cmd = self._commands['get_ap_reg'].pack(ap_sel, register)
+        res = self._usb.xfer_into(cmd, rx_length=8)
+        status, value = self._RES_STATUS_VALUE.unpack(res)
         return status, value
 
     def set_ap_reg(self, ap_sel, register, value):
@@ -535,15 +616,9 @@ class StlinkCom:
         Return:
             status: command status
         """
-        cmd = _struct.pack(
-            '<BBHHL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.WRITE_AP_REG,
-            ap_sel,
-            register,
-            value)
-        res = self._usb.xfer(cmd, rx_length=2)
-        status, = _struct.unpack('<H', res)
+        cmd = self._commands['set_ap_reg'].pack(ap_sel, register, value)
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        status, = self._RES_STATUS.unpack(res)
         return status
 
     def get_mem32(self, address):
@@ -559,13 +634,9 @@ class StlinkCom:
             status: command status
             return 32 bit number
         """
-        cmd = _struct.pack(
-            '<BBL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.READ_DEBUG_REG,
-            address)
-        res = self._usb.xfer(cmd, rx_length=8)
-        status, value = _struct.unpack('<HxxL', res)
+        cmd = self._commands['get_mem32'].pack(address)
+        res = self._usb.xfer_into(cmd, rx_length=8)
+        status, value = self._RES_STATUS_VALUE.unpack(res)
         return status, value
 
     def set_mem32(self, address, value):
@@ -581,14 +652,9 @@ class StlinkCom:
         Return:
             status: command status
         """
-        cmd = _struct.pack(
-            '<BBLL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.WRITE_DEBUG_REG,
-            address,
-            value)
-        res = self._usb.xfer(cmd, rx_length=2)
-        status, = _struct.unpack('<H', res)
+        cmd = self._commands['set_mem32'].pack(address, value)
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        status, = self._RES_STATUS.unpack(res)
         return status
 
     def get_last_rw_state(self):
@@ -597,12 +663,9 @@ class StlinkCom:
         Returns:
             RW status from STATUS
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.GET_LAST_RW_STATE)
-        res = self._usb.xfer(cmd, rx_length=2)
-        status, = _struct.unpack('<H', res)
+        cmd = self._commands['get_last_rw_state'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=2)
+        status, = self._RES_STATUS.unpack(res)
         return status
 
     def get_last_rw_state_ex(self):
@@ -612,41 +675,38 @@ class StlinkCom:
             status: last RW from STATUS
             fault_address: fault address
         """
-        cmd = _struct.pack(
-            '<BB',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.GET_LAST_RW_STATE_EX)
-        res = self._usb.xfer(cmd, rx_length=12)
-        status, fault_address = _struct.unpack('<HxxI4x', res)
+        cmd = self._commands['get_last_rw_state_ex'].pack()
+        res = self._usb.xfer_into(cmd, rx_length=12)
+        status, fault_address = self._RES_LAST_RW_STATE_EX.unpack(res)
         return status, fault_address
 
-    def read_mem8(self, address, size, *, ap=None, csw=None):
+    def read_mem8(self, address, size, *, ap=None, csw=None, buffered=False):
         """Read data from memory with 8 bit memory access.
 
-        Maximum number of bytes for read can be 64.
+        Maximum number of bytes for read can be 64 (512 for ST-Link/V3).
 
         Arguments:
             address: address in memory
             size: number of bytes to read from memory
             ap: AP number to access
             csw: CSWR value for the access
+            buffered: receive into reusable buffer, returned data are
+                valid only until next read of bulk data
 
         Return:
             bytes of data
         """
-        cmd = _struct.pack(
-            '<BBLHL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.READ_MEM_8BIT,
-            address,
-            size,
-            self._encode_ap_csw(ap, csw))
+        cmd = self._commands['read_mem8'].pack(
+            address, size, self._encode_ap_csw(ap, csw))
+        if buffered:
+            return self._usb.xfer_into(cmd, rx_length=size, bulk=True)
         return self._usb.xfer(cmd, rx_length=size)
 
     def write_mem8(self, address, data, *, ap=None, csw=None):
         """Write data into memory with 8 bit memory access.
 
-        Maximum number of bytes for one write can be 64.
+        Maximum number of bytes for one write can be 64
+        (512 for ST-Link/V3).
 
         Arguments:
             address: address in memory
@@ -654,16 +714,11 @@ class StlinkCom:
             ap: AP number to access
             csw: CSWR value for the access
         """
-        cmd = _struct.pack(
-            '<BBLHL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.WRITE_MEM_8BIT,
-            address,
-            len(data),
-            self._encode_ap_csw(ap, csw))
+        cmd = self._commands['write_mem8'].pack(
+            address, len(data), self._encode_ap_csw(ap, csw))
         self._usb.xfer(cmd, data=data)
 
-    def read_mem16(self, address, size, *, ap=None, csw=None):
+    def read_mem16(self, address, size, *, ap=None, csw=None, buffered=False):
         """Read data from memory with 16 bit memory access.
 
         Maximum number of bytes for one read can be 1024.
@@ -674,17 +729,16 @@ class StlinkCom:
             size: number of bytes to read from memory
             ap: AP number to access
             csw: CSWR value for the access
+            buffered: receive into reusable buffer, returned data are
+                valid only until next read of bulk data
 
         Return:
             list of read data
         """
-        cmd = _struct.pack(
-            '<BBLHL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.READ_MEM_16BIT,
-            address,
-            size,
-            self._encode_ap_csw(ap, csw))
+        cmd = self._commands['read_mem16'].pack(
+            address, size, self._encode_ap_csw(ap, csw))
+        if buffered:
+            return self._usb.xfer_into(cmd, rx_length=size, bulk=True)
         return self._usb.xfer(cmd, rx_length=size)
 
     def write_mem16(self, address, data, *, ap=None, csw=None):
@@ -699,16 +753,11 @@ class StlinkCom:
             ap: AP number to access
             csw: CSWR value for the access
         """
-        cmd = _struct.pack(
-            '<BBLHL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.APIV2.WRITE_MEM_16BIT,
-            address,
-            len(data),
-            self._encode_ap_csw(ap, csw))
+        cmd = self._commands['write_mem16'].pack(
+            address, len(data), self._encode_ap_csw(ap, csw))
         self._usb.xfer(cmd, data=data)
 
-    def read_mem32(self, address, size, *, ap=None, csw=None):
+    def read_mem32(self, address, size, *, ap=None, csw=None, buffered=False):
         """Read data from memory with 32 bit memory access.
 
         Maximum number of bytes for one read can be 1024.
@@ -719,17 +768,16 @@ class StlinkCom:
             size: number of bytes to read from memory
             ap: AP number to access
             csw: CSWR value for the access
+            buffered: receive into reusable buffer, returned data are
+                valid only until next read of bulk data
 
         Return:
             list of read data
         """
-        cmd = _struct.pack(
-            '<BBLHL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.READ_MEM_32BIT,
-            address,
-            size,
-            self._encode_ap_csw(ap, csw))
+        cmd = self._commands['read_mem32'].pack(
+            address, size, self._encode_ap_csw(ap, csw))
+        if buffered:
+            return self._usb.xfer_into(cmd, rx_length=size, bulk=True)
         return self._usb.xfer(cmd, rx_length=size)
 
     def write_mem32(self, address, data, *, ap=None, csw=None):
@@ -744,15 +792,65 @@ class StlinkCom:
             ap: AP number to access
             csw: CSWR value for the access
         """
-        cmd = _struct.pack(
-            '<BBLHL',
-            self.CMD.DEBUG.COMMAND,
-            self.CMD.DEBUG.WRITE_MEM_32BIT,
-            address,
-            len(data),
-            self._encode_ap_csw(ap, csw))
+        cmd = self._commands['write_mem32'].pack(
+            address, len(data), self._encode_ap_csw(ap, csw))
         self._usb.xfer(cmd, data=data)
 
+    def read_mem_pipeline(self, chunks, *, ap=None, csw=None, buffered=False):
+        """Read more chunks of memory with more commands in flight
+
+        Commands are transferred by USB xfer_pipeline.
+
+        Arguments:
+            chunks: list of tuples (width, address, size),
+                width is memory access 8, 16 or 32 bit
+            ap: AP number to access
+            csw: CSWR value for the access
+            buffered: receive into reusable buffers, each chunk is valid
+                only until next iteration
+
+        Return:
+            iterable of read data for each chunk
+        """
+        ap_csw = self._encode_ap_csw(ap, csw)
+        transfers = [
+            (
+                self._READ_MEM_PIPELINE.pack(
+                    self.CMD.DEBUG.COMMAND,
+                    self._READ_MEM_CMD[width],
+                    address,
+                    size,
+                    ap_csw),
+                None,
+                size,
+            ) for width, address, size in chunks]
+        return self._usb.xfer_pipeline(transfers, buffered=buffered)
+
+    def set_mem32_pipeline(self, items):
+        """Set more 32 bit memory registers with more commands in flight
+
+        Commands are transferred by USB xfer_pipeline.
+
+        Arguments:
+            items: list of tuples (address, value)
+
+        Return:
+            iterable of command status for each item
+        """
+        transfers = [
+            (
+                self._SET_MEM32_PIPELINE.pack(
+                    self.CMD.DEBUG.COMMAND,
+                    self.CMD.DEBUG.APIV2.WRITE_DEBUG_REG,
+                    address,
+                    value),
+                None,
+                2,
+            ) for address, value in items]
+        for res in self._usb.xfer_pipeline(transfers):
+            status, = self._RES_STATUS.unpack(res)
+            yield status
+
     def _encode_ap_csw(self, ap, csw):
         """ Encode AP and CSW word for READ_MEM_x and WRITE_MEM_x commands """
         ap = (ap or self._default_ap) & 0xFF
@@ -0,0 +1,285 @@
+"""Record and replay of ST-Link USB transfers
+
+Recorder wraps USB transport (StlinkUsb or StlinkSim) and save each
+transfer into trace file, replay serve recorded responses back, so
+recorded session can run again without hardware:
+
+    usb = StlinkRecorder(swd.stlink.usb.StlinkUsb(), 'session.trace')
+    ...
+    usb = StlinkReplay('session.trace')
+    dev = swd.Swd(driver=swd.stlink.Stlink(usb=usb))
+
+Trace file format (little endian):
+    header: b'SWDTRACE', version (B), maximum transfer size (L),
+        length of device name (B), device name
+    records: command (16s), data length (H), response length (H),
+        duration in seconds (f), data, response
+"""
+
+import collections as _collections
+import struct as _struct
+import time as _time
+import swd.tracer as _tracer
+import swd.stlink.stats as _stats
+import swd.stlink.usb as _usb
+
+TraceRecord = _collections.namedtuple(
+    'TraceRecord', ['command', 'data', 'response', 'duration'])
+
+
+class ReplayError(_usb.StlinkUsbError):
+    """Replayed transfer is different from recorded"""
+
+
+_MAGIC = b'SWDTRACE'
+_VERSION = 1
+_HEADER = _struct.Struct('<8sBLB')
+_RECORD = _struct.Struct('<16sHHf')
+_COMMAND_SIZE = 16
+
+
+def _command_bytes(command):
+    """Command padded to full size as it is sent over USB"""
+    return bytes(command).ljust(_COMMAND_SIZE, b'\x00')
+
+
+def _open(file, mode):
+    """Open file, if it is not already file object"""
+    if hasattr(file, 'read' if 'r' in mode else 'write'):
+        return file, False
+    return open(file, mode), True
+
+
+def read_trace(file):
+    """Read trace file
+
+    Arguments:
+        file: file name or binary file object
+
+    Return:
+        tuple (dev_name, maximum transfer size, list of TraceRecord)
+    """
+    trace, close = _open(file, 'rb')
+    try:
+        header = trace.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ReplayError("Trace file is too short")
+        magic, version, maximum_size, name_length = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION:
+            raise ReplayError("Unsupported trace file")
+        dev_name = trace.read(name_length).decode('ascii')
+        records = []
+        while True:
+            record = trace.read(_RECORD.size)
+            if not record:
+                break
+            if len(record) != _RECORD.size:
+                raise ReplayError("Trace file is truncated")
+            command, data_length, response_length, duration = \
+                _RECORD.unpack(record)
+            data = trace.read(data_length)
+            response = trace.read(response_length)
+            if len(data) + len(response) != data_length + response_length:
+                raise ReplayError("Trace file is truncated")
+            records.append(TraceRecord(command, data, response, duration))
+    finally:
+        if close:
+            trace.close()
+    return dev_name, maximum_size, records
+
+
+class StlinkRecorder:
+    """USB transport wrapper which record all transfers into trace file
+
+    Arguments:
+        usb: USB transport (StlinkUsb, StlinkSim, ..)
+        file: file name or binary file object
+    """
+
+    def __init__(self, usb, file):
+        self._usb = usb
+        self._trace, self._close = _open(file, 'wb')
+        dev_name = usb.dev_name.encode('ascii')
+        self._trace.write(_HEADER.pack(
+            _MAGIC, _VERSION, usb.STLINK_MAXIMUM_TRANSFER_SIZE,
+            len(dev_name)))
+        self._trace.write(dev_name)
+
+    @property
+    def usb(self):
+        """Wrapped USB transport"""
+        return self._usb
+
+    @property
+    def dev_name(self):
+        """Device name of wrapped USB transport"""
+        return self._usb.dev_name
+
+    @property
+    def STLINK_MAXIMUM_TRANSFER_SIZE(self):  # pylint: disable=invalid-name
+        """Maximum transfer size of wrapped USB transport"""
+        return self._usb.STLINK_MAXIMUM_TRANSFER_SIZE
+
+    @property
+    def pipeline_depth(self):
+        """Pipeline depth of wrapped USB transport"""
+        return getattr(self._usb, 'pipeline_depth', 1)
+
+    @pipeline_depth.setter
+    def pipeline_depth(self, value):
+        self._usb.pipeline_depth = value
+
+    @property
+    def stats(self):
+        """StlinkStats of wrapped USB transport"""
+        return getattr(self._usb, 'stats', None)
+
+    @stats.setter
+    def stats(self, value):
+        self._usb.stats = value
+
+    def _record(self, command, data, response, duration):
+        data = bytes(data or b'')
+        response = bytes(response or b'')
+        self._trace.write(_RECORD.pack(
+            _command_bytes(command), len(data), len(response), duration))
+        self._trace.write(data)
+        self._trace.write(response)
+
+    def xfer(self, command, data=None, rx_length=0, timeout=200):
+        """Transfer command and record it, same as StlinkUsb.xfer"""
+        start = _time.perf_counter()
+        response = self._usb.xfer(command, data, rx_length, timeout)
+        self._record(
+            command, data, response, _time.perf_counter() - start)
+        return response
+
+    def xfer_into(
+            self, command, rx_length, data=None, timeout=200, bulk=False):
+        """Transfer command and record it, same as StlinkUsb.xfer_into"""
+        start = _time.perf_counter()
+        response = self._usb.xfer_into(
+            command, rx_length, data, timeout, bulk)
+        self._record(
+            command, data, response, _time.perf_counter() - start)
+        return response
+
+    def xfer_pipeline(self, transfers, timeout=200, buffered=False):
+        """Transfer commands and record them, same as StlinkUsb.xfer_pipeline
+
+        Duration of each transfer is time between received responses.
+        """
+        transfers = list(transfers)
+        start = _time.perf_counter()
+        responses = self._usb.xfer_pipeline(
+            transfers, timeout=timeout, buffered=buffered)
+        for (command, data, _), response in zip(transfers, responses):
+            now = _time.perf_counter()
+            self._record(command, data, response, now - start)
+            start = now
+            yield response
+
+    def close(self):
+        """Close trace file"""
+        if self._close:
+            self._trace.close()
+        else:
+            self._trace.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StlinkReplay:
+    """USB transport which replay transfers from trace file
+
+    Arguments:
+        file: file name or binary file object
+        strict: check if commands and data are same as recorded
+        realtime: sleep recorded duration of each transfer
+    """
+
+    def __init__(self, file, strict=True, realtime=False):
+        self._dev_name, self.STLINK_MAXIMUM_TRANSFER_SIZE, self._records = \
+            read_trace(file)
+        self._strict = strict
+        self._realtime = realtime
+        self._index = 0
+        self.pipeline_depth = 1
+        # StlinkStats collecting statistics of transfers or None
+        self.stats = None
+
+    @property
+    def dev_name(self):
+        """Recorded device name"""
+        return self._dev_name
+
+    @property
+    def records(self):
+        """List of all TraceRecord"""
+        return self._records
+
+    @property
+    def remaining(self):
+        """Number of not replayed transfers"""
+        return len(self._records) - self._index
+
+    @property
+    def recorded_time(self):
+        """Sum of recorded durations of already replayed transfers"""
+        return sum(
+            record.duration for record in self._records[:self._index])
+
+    def _replay(self, command, data, rx_length):
+        start = _time.perf_counter()
+        if self._index >= len(self._records):
+            raise ReplayError("No more recorded transfers")
+        record = self._records[self._index]
+        if self._strict:
+            if _command_bytes(command) != record.command:
+                raise ReplayError(
+                    f"Transfer {self._index}: command "
+                    f"{_command_bytes(command).hex()} was recorded as "
+                    f"{record.command.hex()}")
+            if bytes(data or b'') != record.data:
+                raise ReplayError(
+                    f"Transfer {self._index}: data are different")
+            if rx_length != len(record.response):
+                raise ReplayError(
+                    f"Transfer {self._index}: expected {rx_length} Bytes, "
+                    f"recorded {len(record.response)} Bytes")
+        self._index += 1
+        if self._realtime:
+            _time.sleep(record.duration)
+        if self.stats is not None:
+            # recorded duration is used as latency
+            self.stats.record(
+                command, data, record.response, record.duration)
+        tracer = _tracer.current
+        if tracer is not None:
+            _stats.trace_transfer(
+                tracer, command, data, record.response, start)
+        return record.response
+
+    def xfer(self, command, data=None, rx_length=0, timeout=200):
+        """Replay transfer, same as StlinkUsb.xfer"""
+        response = self._replay(command, data, rx_length)
+        return response if rx_length else None
+
+    def xfer_into(
+            self, command, rx_length, data=None, timeout=200, bulk=False):
+        """Replay transfer, same as StlinkUsb.xfer_into"""
+        return memoryview(self._replay(command, data, rx_length))
+
+    def xfer_pipeline(self, transfers, timeout=200, buffered=False):
+        """Replay transfers, same as StlinkUsb.xfer_pipeline"""
+        for command, data, rx_length in transfers:
+            response = self._replay(command, data, rx_length)
+            yield response if rx_length else None
+
+    def rewind(self):
+        """Start replay from first transfer"""
+        self._index = 0
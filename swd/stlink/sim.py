@@ -0,0 +1,483 @@
+"""Simulated ST-Link
+
+In-process replacement of StlinkUsb, which understand ST-Link commands
+and simulate target with memory and Cortex-M core debug registers.
+It is used for tests and benchmarks without hardware:
+
+    usb = swd.stlink.sim.StlinkSim()
+    dev = swd.Swd(driver=swd.stlink.Stlink(usb=usb))
+"""
+
+import struct as _struct
+import time as _time
+import swd.tracer as _tracer
+import swd.stlink.com as _com
+import swd.stlink.stats as _stats
+
+_CMD = _com.StlinkCom.CMD
+_STATUS = _com.StlinkCom.STATUS
+
+
+class SimRegion:
+    """Memory region of simulated target"""
+
+    def __init__(self, address, size, name=None, writable=True, data=None):
+        self.address = address
+        self.size = size
+        self.name = name
+        self.writable = writable
+        self.data = bytearray(size)
+        if data:
+            self.data[:len(data)] = data
+
+    def contains(self, address, size):
+        """Check if whole area is inside region"""
+        end = self.address + self.size
+        return self.address <= address and address + size <= end
+
+
+class StlinkSim:
+    """Simulated ST-Link with target
+
+    Arguments:
+        dev_name: simulated hardware 'V2', 'V2-1' or 'V3'
+        jtag: JTAG firmware version
+        idcode: IDCODE of simulated target
+        regions: list of SimRegion, default is 64KB FLASH and 20KB SRAM
+        transaction_time: simulated time of one USB transaction in seconds
+        byte_time: simulated time of transfer of one data byte in seconds
+        realtime: really sleep simulated time
+    """
+
+    STLINK_MAXIMUM_TRANSFER_SIZE = 6144
+
+    FLASH_ADDRESS = 0x08000000
+    SRAM_ADDRESS = 0x20000000
+
+    # first address of debug registers (System Control Space, DWT, FPB)
+    _PPB_ADDRESS = 0xe0000000
+    _REGISTERS_COUNT = 21
+    _DHCSR_STATUS_MASK = 0x0000ffff
+
+    _USB_IDS = {
+        'V2': (0x0483, 0x3748),
+        'V2-1': (0x0483, 0x374b),
+        'V3': (0x0483, 0x374f),
+    }
+
+    def __init__(
+            self,
+            dev_name='V2',
+            jtag=35,
+            idcode=0x1ba01477,
+            regions=None,
+            transaction_time=0.001,
+            byte_time=1e-6,
+            realtime=False):
+        if dev_name not in self._USB_IDS:
+            raise ValueError(f"Unknown ST-Link: {dev_name}")
+        self._dev_name = dev_name
+        self._jtag = jtag
+        self.idcode = idcode
+        if regions is None:
+            regions = [
+                SimRegion(self.FLASH_ADDRESS, 64 * 1024, 'FLASH', False),
+                SimRegion(self.SRAM_ADDRESS, 20 * 1024, 'SRAM'),
+            ]
+        self.regions = list(regions)
+        self.transaction_time = transaction_time
+        self.byte_time = byte_time
+        self.realtime = realtime
+        self.voltage = 3.3
+        self.pipeline_depth = 1
+        # called when halted core is resumed: on_run(sim)
+        self.on_run = None
+        # StlinkStats collecting statistics of transfers or None
+        self.stats = None
+        self.elapsed = 0.0
+        self.transactions = 0
+        self.mode = _CMD.MODE.MASS
+        self.swd_freq_id = 0
+        self.com_freq_khz = 24000
+        self.halted = False
+        self.registers = [0] * self._REGISTERS_COUNT
+        self.debug_registers = {}
+        self.ap_registers = {}
+        self._faults = []
+        self._rw_status = _STATUS.JTAG_OK
+        self._rw_fault_address = 0
+        self._handlers = self._build_handlers()
+
+    @property
+    def dev_name(self):
+        """Simulated device name"""
+        return self._dev_name
+
+    def add_region(self, region):
+        """Add memory region into memory map"""
+        self.regions.append(region)
+
+    def find_region(self, address, size=1):
+        """Return region which contains whole area or None"""
+        for region in self.regions:
+            if region.contains(address, size):
+                return region
+        return None
+
+    def inject_fault(self, status, address=None, opcode=None, count=1):
+        """Inject error status
+
+        Next matching command will fail with status, memory access
+        commands set status of last R/W state.
+
+        Arguments:
+            status: status from StlinkCom.STATUS
+            address: fail only access to area which contains this address
+            opcode: fail only this command (second byte of DEBUG commands)
+            count: number of commands which will fail
+        """
+        self._faults.append([status, address, opcode, count])
+
+    def _take_fault(self, opcode, address=None, size=4):
+        for fault in self._faults:
+            status, fault_address, fault_opcode, _ = fault
+            if fault_opcode is not None and fault_opcode != opcode:
+                continue
+            if fault_address is not None:
+                if address is None:
+                    continue
+                if not address <= fault_address < address + size:
+                    continue
+            fault[3] -= 1
+            if not fault[3]:
+                self._faults.remove(fault)
+            return status, address if fault_address is None else fault_address
+        return None
+
+    def _charge(self, size, transactions=1):
+        delay = transactions * self.transaction_time + size * self.byte_time
+        self.transactions += transactions
+        self.elapsed += delay
+        if self.realtime:
+            _time.sleep(delay)
+
+    # memory
+
+    def _read_debug_register(self, address):
+        if address == 0xe000edf0:  # DHCSR
+            value = self.debug_registers.get(address, 0)
+            value &= self._DHCSR_STATUS_MASK
+            value |= 0x00010000  # S_REGRDY
+            if self.halted:
+                value |= 0x00020000  # S_HALT
+            return value
+        return self.debug_registers.get(address, 0)
+
+    def _write_debug_register(self, address, value):
+        if address == 0xe000edf0:  # DHCSR
+            if value & 0xffff0000 != 0xa05f0000:
+                return
+            self.debug_registers[address] = value & self._DHCSR_STATUS_MASK
+            if value & 0x3 == 0x3:  # C_DEBUGEN | C_HALT
+                self.halted = True
+            elif value & 0x4:  # C_STEP, instructions are not simulated
+                pass
+            elif self.halted and not value & 0x2:
+                self.halted = False
+                if self.on_run is not None:
+                    self.on_run(self)
+        elif address == 0xe000edf4:  # DCRSR
+            register = value & 0x7f
+            if register >= self._REGISTERS_COUNT:
+                return
+            if value & 0x00010000:  # REGWnR
+                self.registers[register] = self.debug_registers.get(
+                    0xe000edf8, 0)
+            else:
+                self.debug_registers[0xe000edf8] = self.registers[register]
+        elif address == 0xe000ed0c:  # AIRCR
+            if value & 0xffff0004 == 0x05fa0004:  # SYSRESETREQ
+                self.reset()
+        else:
+            self.debug_registers[address] = value
+
+    def reset(self):
+        """Reset simulated core, halt if DEMCR.VC_CORERESET is set"""
+        self.registers = [0] * self._REGISTERS_COUNT
+        vectors = self.find_region(self.FLASH_ADDRESS, 8)
+        if vectors is not None:
+            stack, reset = _struct.unpack_from(
+                '<LL', vectors.data, self.FLASH_ADDRESS - vectors.address)
+            self.registers[13] = stack
+            self.registers[15] = reset & 0xfffffffe
+            self.registers[16] = 0x01000000
+        self.halted = bool(self.debug_registers.get(0xe000edfc, 0) & 1)
+
+    def read_memory(self, address, size):
+        """Read memory of simulated target
+
+        Return:
+            tuple (data, fault address or None)
+        """
+        region = self.find_region(address, size)
+        if region is not None:
+            offset = address - region.address
+            return bytes(region.data[offset:offset + size]), None
+        if address >= self._PPB_ADDRESS and not address % 4 and not size % 4:
+            return b''.join(
+                self._read_debug_register(addr).to_bytes(4, 'little')
+                for addr in range(address, address + size, 4)), None
+        fault_address = address
+        while self.find_region(fault_address) is not None:
+            fault_address += 1
+        return bytes(size), fault_address
+
+    def write_memory(self, address, data):
+        """Write memory of simulated target
+
+        Return:
+            fault address or None
+        """
+        size = len(data)
+        region = self.find_region(address, size)
+        if region is not None and region.writable:
+            offset = address - region.address
+            region.data[offset:offset + size] = data
+            return None
+        if region is None and address >= self._PPB_ADDRESS \
+                and not address % 4 and not size % 4:
+            for offset in range(0, size, 4):
+                self._write_debug_register(
+                    address + offset,
+                    int.from_bytes(data[offset:offset + 4], 'little'))
+            return None
+        return address
+
+    def _set_rw_state(self, status, fault_address):
+        # state is sticky until it is read
+        if self._rw_status == _STATUS.JTAG_OK:
+            self._rw_status = status
+            self._rw_fault_address = fault_address
+
+    # commands
+
+    def _build_handlers(self):
+        debug = _CMD.DEBUG
+        return {
+            debug.EXIT: self._cmd_exit_debug,
+            debug.APIV2.ENTER: self._cmd_enter,
+            debug.APIV2.READ_IDCODES: self._cmd_read_idcodes,
+            debug.APIV2.READ_REG: self._cmd_read_reg,
+            debug.APIV2.WRITE_REG: self._cmd_write_reg,
+            debug.APIV2.READ_ALL_REGS: self._cmd_read_all_regs,
+            debug.APIV2.READ_DEBUG_REG: self._cmd_read_debug_reg,
+            debug.APIV2.WRITE_DEBUG_REG: self._cmd_write_debug_reg,
+            debug.APIV2.GET_LAST_RW_STATE: self._cmd_last_rw_state,
+            debug.APIV2.GET_LAST_RW_STATE_EX: self._cmd_last_rw_state_ex,
+            debug.APIV2.SET_SWD_FREQ: self._cmd_set_swd_freq,
+            debug.APIV2.READ_AP_REG: self._cmd_read_ap_reg,
+            debug.APIV2.WRITE_AP_REG: self._cmd_write_ap_reg,
+            debug.APIV2.JTAG_INIT_AP: self._cmd_status,
+            debug.APIV2.JTAG_CLOSE_AP: self._cmd_status,
+            debug.APIV3.GET_COM_FREQ: self._cmd_get_com_freq,
+            debug.APIV3.SET_COM_FREQ: self._cmd_set_com_freq,
+            debug.READ_MEM_8BIT: self._cmd_read_mem,
+            debug.APIV2.READ_MEM_16BIT: self._cmd_read_mem,
+            debug.READ_MEM_32BIT: self._cmd_read_mem,
+            debug.WRITE_MEM_8BIT: self._cmd_write_mem,
+            debug.APIV2.WRITE_MEM_16BIT: self._cmd_write_mem,
+            debug.WRITE_MEM_32BIT: self._cmd_write_mem,
+        }
+
+    def _version(self):
+        major = 3 if self._dev_name == 'V3' else 2
+        ver = (major << 12) | (self._jtag << 6)
+        if major == 2:
+            ver |= 7  # SWIM or mass storage version
+        return major, ver
+
+    def _command(self, command, data):
+        opcode = command[0]
+        if opcode == _CMD.GET_VERSION:
+            vid, pid = self._USB_IDS[self._dev_name]
+            _, ver = self._version()
+            return _struct.pack('>H', ver) + _struct.pack('<HH', vid, pid)
+        if opcode == _CMD.GET_VERSION_EX:
+            vid, pid = self._USB_IDS[self._dev_name]
+            major, _ = self._version()
+            return _struct.pack(
+                '<5B3xHH', major, 0, self._jtag, 0, 0, vid, pid)
+        if opcode == _CMD.GET_CURRENT_MODE:
+            return _struct.pack('<Bx', self.mode)
+        if opcode == _CMD.GET_TARGET_VOLTAGE:
+            return _struct.pack('<LL', 1000, int(self.voltage * 1000 / 2.4))
+        if opcode in (_CMD.DFU.COMMAND, _CMD.SWIM.COMMAND):
+            self.mode = _CMD.MODE.MASS
+            return b''
+        if opcode != _CMD.DEBUG.COMMAND:
+            return _struct.pack('<H', _STATUS.JTAG_UNKNOWN_CMD)
+        handler = self._handlers.get(command[1])
+        if handler is None:
+            return _struct.pack('<H', _STATUS.JTAG_UNKNOWN_CMD)
+        return handler(command[1], command, data)
+
+    def _cmd_status(self, opcode, command, data):
+        fault = self._take_fault(opcode)
+        return _struct.pack('<H', fault[0] if fault else _STATUS.JTAG_OK)
+
+    def _cmd_exit_debug(self, opcode, command, data):
+        self.mode = _CMD.MODE.MASS
+        return b''
+
+    def _cmd_enter(self, opcode, command, data):
+        self.mode = _CMD.MODE.DEBUG
+        return self._cmd_status(opcode, command, data)
+
+    def _cmd_read_idcodes(self, opcode, command, data):
+        fault = self._take_fault(opcode)
+        if fault:
+            return _struct.pack('<HxxL4x', fault[0], 0)
+        return _struct.pack('<HxxL4x', _STATUS.JTAG_OK, self.idcode)
+
+    def _cmd_read_reg(self, opcode, command, data):
+        register = command[2]
+        fault = self._take_fault(opcode)
+        if fault or register >= self._REGISTERS_COUNT:
+            status = fault[0] if fault else _STATUS.JTAG_CMD_ERROR
+            return _struct.pack('<HxxL', status, 0)
+        return _struct.pack(
+            '<HxxL', _STATUS.JTAG_OK, self.registers[register])
+
+    def _cmd_write_reg(self, opcode, command, data):
+        register, value = _struct.unpack_from('<BL', command, 2)
+        fault = self._take_fault(opcode)
+        if fault or register >= self._REGISTERS_COUNT:
+            status = fault[0] if fault else _STATUS.JTAG_CMD_ERROR
+            return _struct.pack('<H', status)
+        self.registers[register] = value
+        return _struct.pack('<H', _STATUS.JTAG_OK)
+
+    def _cmd_read_all_regs(self, opcode, command, data):
+        fault = self._take_fault(opcode)
+        if fault:
+            return _struct.pack('<H', fault[0]) + bytes(86)
+        return _struct.pack('<Hxx21L', _STATUS.JTAG_OK, *self.registers)
+
+    def _cmd_read_debug_reg(self, opcode, command, data):
+        address, = _struct.unpack_from('<L', command, 2)
+        fault = self._take_fault(opcode, address)
+        if fault:
+            return _struct.pack('<HxxL', fault[0], 0)
+        value, fault_address = self.read_memory(address, 4)
+        if fault_address is not None:
+            return _struct.pack('<HxxL', _STATUS.SWD_AP_FAULT, 0)
+        return _struct.pack(
+            '<HxxL', _STATUS.JTAG_OK, int.from_bytes(value, 'little'))
+
+    def _cmd_write_debug_reg(self, opcode, command, data):
+        address, value = _struct.unpack_from('<LL', command, 2)
+        fault = self._take_fault(opcode, address)
+        if fault:
+            return _struct.pack('<H', fault[0])
+        if self.write_memory(address, value.to_bytes(4, 'little')) is not None:
+            return _struct.pack('<H', _STATUS.SWD_AP_FAULT)
+        return _struct.pack('<H', _STATUS.JTAG_OK)
+
+    def _cmd_last_rw_state(self, opcode, command, data):
+        status = self._rw_status
+        self._rw_status = _STATUS.JTAG_OK
+        return _struct.pack('<H', status)
+
+    def _cmd_last_rw_state_ex(self, opcode, command, data):
+        status, fault_address = self._rw_status, self._rw_fault_address
+        self._rw_status = _STATUS.JTAG_OK
+        self._rw_fault_address = 0
+        return _struct.pack('<HxxI4x', status, fault_address)
+
+    def _cmd_set_swd_freq(self, opcode, command, data):
+        self.swd_freq_id, = _struct.unpack_from('<H', command, 2)
+        return self._cmd_status(opcode, command, data)
+
+    def _cmd_get_com_freq(self, opcode, command, data):
+        frequencies = [24000, 8000, 3300, 1000, 200, 50, 5]
+        return _struct.pack(
+            '<HxxLL10L', _STATUS.JTAG_OK, self.com_freq_khz,
+            len(frequencies), *frequencies, *[0] * (10 - len(frequencies)))
+
+    def _cmd_set_com_freq(self, opcode, command, data):
+        _, self.com_freq_khz = _struct.unpack_from('<HL', command, 2)
+        return _struct.pack('<HxxL', _STATUS.JTAG_OK, self.com_freq_khz)
+
+    def _cmd_read_ap_reg(self, opcode, command, data):
+        ap_sel, register = _struct.unpack_from('<HH', command, 2)
+        value = self.ap_registers.get((ap_sel, register), 0)
+        return _struct.pack('<HxxL', _STATUS.JTAG_OK, value)
+
+    def _cmd_write_ap_reg(self, opcode, command, data):
+        ap_sel, register, value = _struct.unpack_from('<HHL', command, 2)
+        self.ap_registers[(ap_sel, register)] = value
+        return _struct.pack('<H', _STATUS.JTAG_OK)
+
+    def _cmd_read_mem(self, opcode, command, data):
+        address, size = _struct.unpack_from('<LH', command, 2)
+        fault = self._take_fault(opcode, address, size)
+        if fault:
+            self._set_rw_state(*fault)
+            return bytes(size)
+        value, fault_address = self.read_memory(address, size)
+        if fault_address is not None:
+            self._set_rw_state(_STATUS.SWD_AP_FAULT, fault_address)
+        return value
+
+    def _cmd_write_mem(self, opcode, command, data):
+        address, size = _struct.unpack_from('<LH', command, 2)
+        data = bytes(data or b'')[:size]
+        fault = self._take_fault(opcode, address, size)
+        if fault:
+            self._set_rw_state(*fault)
+            return b''
+        fault_address = self.write_memory(address, data)
+        if fault_address is not None:
+            self._set_rw_state(_STATUS.SWD_AP_FAULT, fault_address)
+        return b''
+
+    # StlinkUsb interface
+
+    def _transfer(self, command, data, rx_length, transactions=1):
+        start = self.elapsed
+        trace_start = _time.perf_counter()
+        response = self._command(bytes(command), data)
+        self._charge(len(data or b'') + rx_length, transactions)
+        if len(response) < rx_length:
+            response += bytes(rx_length - len(response))
+        response = response[:rx_length]
+        if self.stats is not None:
+            # simulated time is used as latency
+            self.stats.record(
+                command, data, response, self.elapsed - start)
+        tracer = _tracer.current
+        if tracer is not None:
+            _stats.trace_transfer(
+                tracer, command, data, response, trace_start)
+        return response
+
+    def xfer(self, command, data=None, rx_length=0, timeout=200):
+        """Transfer command, same as StlinkUsb.xfer"""
+        response = self._transfer(command, data, rx_length)
+        return response if rx_length else None
+
+    def xfer_into(
+            self, command, rx_length, data=None, timeout=200, bulk=False):
+        """Transfer command, same as StlinkUsb.xfer_into"""
+        return memoryview(self._transfer(command, data, rx_length))
+
+    def xfer_pipeline(self, transfers, timeout=200, buffered=False):
+        """Transfer more commands, same as StlinkUsb.xfer_pipeline
+
+        Simulated time of USB transaction is charged once for each
+        pipeline_depth commands.
+        """
+        for index, (command, data, rx_length) in enumerate(transfers):
+            transactions = 0 if index % self.pipeline_depth else 1
+            response = self._transfer(command, data, rx_length, transactions)
+            yield response if rx_length else None
@@ -0,0 +1,228 @@
+"""ST-Link transport statistics
+
+Counters of USB transfers for each command, transferred bytes, latency
+histograms and error statuses. Statistics are collected only when
+instance of StlinkStats is assigned to transport:
+
+    stats = swd.stlink.stats.StlinkStats()
+    dev.driver.stats = stats
+    ...
+    print(stats.format())
+"""
+
+import bisect as _bisect
+import struct as _struct
+import time as _time
+import swd.stlink.com as _com
+
+_CMD = _com.StlinkCom.CMD
+
+
+def _constants(cls):
+    return {
+        value: name for name, value in vars(cls).items()
+        if isinstance(value, int) and not name.startswith('_')}
+
+
+def _command_names():
+    """Names of commands indexed by first two bytes of command"""
+    names = {}
+    for value, name in _constants(_CMD).items():
+        names[(value, None)] = name
+    for group in (_CMD.DFU, _CMD.SWIM):
+        prefix = group.__name__
+        for value, name in _constants(group).items():
+            if name != 'COMMAND':
+                names[(group.COMMAND, value)] = f"{prefix}.{name}"
+    for group, prefix in (
+            (_CMD.DEBUG, 'DEBUG'),
+            (_CMD.DEBUG.APIV2, 'DEBUG.APIV2'),
+            (_CMD.DEBUG.APIV3, 'DEBUG.APIV3')):
+        for value, name in _constants(group).items():
+            if name != 'COMMAND':
+                names[(_CMD.DEBUG.COMMAND, value)] = f"{prefix}.{name}"
+    return names
+
+
+_COMMAND_NAMES = _command_names()
+_STATUS_NAMES = _constants(_com.StlinkCom.STATUS)
+_PREFIXED = (_CMD.DFU.COMMAND, _CMD.SWIM.COMMAND, _CMD.DEBUG.COMMAND)
+_MEMORY_COMMANDS = {
+    (_CMD.DEBUG.COMMAND, opcode) for opcode in (
+        _CMD.DEBUG.READ_MEM_8BIT, _CMD.DEBUG.WRITE_MEM_8BIT,
+        _CMD.DEBUG.READ_MEM_32BIT, _CMD.DEBUG.WRITE_MEM_32BIT,
+        _CMD.DEBUG.APIV2.READ_MEM_16BIT, _CMD.DEBUG.APIV2.WRITE_MEM_16BIT)}
+# commands which return status in first byte of response
+_STATUS_COMMANDS = {
+    (_CMD.DEBUG.COMMAND, value)
+    for group in (_CMD.DEBUG.APIV2, _CMD.DEBUG.APIV3)
+    for value, name in _constants(group).items() if name != 'COMMAND'}
+
+
+def _command_key(command):
+    if command[0] in _PREFIXED and len(command) > 1:
+        return command[0], command[1]
+    return command[0], None
+
+
+def _command_name(key):
+    name = _COMMAND_NAMES.get(key)
+    if name is None:
+        name = _COMMAND_NAMES.get((key[0], None))
+    if name is None:
+        name = '0x' + ''.join(
+            f'{part:02x}' for part in key if part is not None)
+    return name
+
+
+def _status_name(status):
+    return _STATUS_NAMES.get(status, f'0x{status:02x}')
+
+
+def describe_transfer(command, data=None, response=None):
+    """Describe transfer for tracing
+
+    Arguments:
+        command: sent command
+        data: sent data or None
+        response: received data or None
+
+    Return:
+        tuple (command name, dictionary with transferred bytes and with
+            address and size of memory access or returned status)
+    """
+    key = _command_key(command)
+    args = {
+        'out': len(command) + (len(data) if data else 0),
+        'in': len(response) if response else 0}
+    if key in _MEMORY_COMMANDS:
+        address, size = _struct.unpack_from('<LH', command, 2)
+        args['address'] = f'0x{address:08x}'
+        args['size'] = size
+    elif key in _STATUS_COMMANDS and response:
+        args['status'] = _status_name(response[0])
+    return _command_name(key), args
+
+
+def trace_transfer(tracer, command, data, response, start):
+    """Add span of transfer which started at start into tracer"""
+    name, args = describe_transfer(command, data, response)
+    tracer.complete(
+        name, 'usb', start, _time.perf_counter() - start, args)
+
+
+class StlinkStats:
+    """Statistics of ST-Link transfers"""
+
+    # upper limits of latency histogram buckets in seconds
+    BUCKETS = (
+        100e-6, 200e-6, 500e-6,
+        1e-3, 2e-3, 5e-3,
+        10e-3, 20e-3, 50e-3,
+        100e-3)
+
+    def __init__(self):
+        self._commands = {}
+        self._statuses = {}
+
+    def reset(self):
+        """Clear all counters"""
+        self._commands = {}
+        self._statuses = {}
+
+    def record(self, command, data, response, duration):
+        """Record one transfer
+
+        Arguments:
+            command: sent command
+            data: sent data or None
+            response: received data or None
+            duration: time of transfer in seconds
+        """
+        key = _command_key(command)
+        counters = self._commands.get(key)
+        if counters is None:
+            counters = [0, 0, 0, 0.0, duration, duration, [0] * (
+                len(self.BUCKETS) + 1)]
+            self._commands[key] = counters
+        counters[0] += 1
+        counters[1] += len(command) + (len(data) if data else 0)
+        counters[2] += len(response) if response else 0
+        counters[3] += duration
+        if duration < counters[4]:
+            counters[4] = duration
+        if duration > counters[5]:
+            counters[5] = duration
+        counters[6][_bisect.bisect_left(self.BUCKETS, duration)] += 1
+
+    def record_status(self, status):
+        """Count error status"""
+        self._statuses[status] = self._statuses.get(status, 0) + 1
+
+    def _bucket_names(self):
+        names = []
+        for limit in self.BUCKETS:
+            if limit < 1e-3:
+                names.append(f'<={limit * 1e6:.0f}us')
+            else:
+                names.append(f'<={limit * 1e3:.0f}ms')
+        names.append(f'>{self.BUCKETS[-1] * 1e3:.0f}ms')
+        return names
+
+    def snapshot(self):
+        """Return copy of current statistics
+
+        Return:
+            dictionary with:
+                commands: for each command name dictionary with count,
+                    bytes_out, bytes_in, time, min, max and histogram
+                statuses: number of error statuses for each status name
+                total: count, bytes_out, bytes_in and time of all commands
+        """
+        bucket_names = self._bucket_names()
+        commands = {}
+        total = {'count': 0, 'bytes_out': 0, 'bytes_in': 0, 'time': 0.0}
+        for key, counters in self._commands.items():
+            count, bytes_out, bytes_in, time, minimum, maximum, histogram = \
+                counters
+            commands[_command_name(key)] = {
+                'count': count,
+                'bytes_out': bytes_out,
+                'bytes_in': bytes_in,
+                'time': time,
+                'min': minimum,
+                'max': maximum,
+                'histogram': dict(zip(bucket_names, histogram)),
+            }
+            total['count'] += count
+            total['bytes_out'] += bytes_out
+            total['bytes_in'] += bytes_in
+            total['time'] += time
+        statuses = {
+            _status_name(status): count
+            for status, count in self._statuses.items()}
+        return {'commands': commands, 'statuses': statuses, 'total': total}
+
+    def format(self):
+        """Return statistics as human readable table"""
+        snapshot = self.snapshot()
+        lines = [
+            f"{'command':32s} {'count':>8s} {'out':>10s} {'in':>10s} "
+            f"{'total ms':>10s} {'avg us':>8s} {'max us':>8s}"]
+        commands = sorted(
+            snapshot['commands'].items(),
+            key=lambda item: item[1]['time'], reverse=True)
+        for name, command in commands + [('TOTAL', None)]:
+            if command is None:
+                command = snapshot['total']
+                command['max'] = max(
+                    [cmd['max'] for _, cmd in commands], default=0)
+            avg = command['time'] / command['count'] if command['count'] else 0
+            lines.append(
+                f"{name:32s} {command['count']:8d} "
+                f"{command['bytes_out']:10d} {command['bytes_in']:10d} "
+                f"{command['time'] * 1e3:10.1f} {avg * 1e6:8.1f} "
+                f"{command['max'] * 1e6:8.1f}")
+        for name, count in sorted(snapshot['statuses'].items()):
+            lines.append(f"status {name}: {count}")
+        return '\n'.join(lines)
@@ -2,8 +2,22 @@
 """
 
 import sys as _sys
-import logging as _logging
-import usb as _usb
+import array as _array
+import collections as _collections
+import threading as _threading
+import time as _time
+import swd.tracer as _tracer
+import swd.stlink.stats as _stats
+
+
+def _pyusb():
+    """Return pyusb module, imported on first use
+
+    Import of pyusb and its backends is slow, so it is postponed until
+    USB device is really needed.
+    """
+    import usb.core  # pylint: disable=import-outside-toplevel
+    return usb
 
 
 class StlinkUsbError(Exception):
@@ -31,6 +45,10 @@ class MoreDevicesException(StlinkUsbException):
         return self._serial_numbers
 
 
+StlinkProbe = _collections.namedtuple(
+    'StlinkProbe', ['serial_no', 'dev_name', 'id_vendor', 'id_product'])
+
+
 class StlinkUsbBase:
     """ST link comm base class"""
     ID_VENDOR = None
@@ -38,28 +56,31 @@ class StlinkUsbBase:
     PIPE_OUT = None
     PIPE_IN = None
     DEV_NAME = None
+    _RX_BUFFERS_MAX = 8
+
+    _SERIAL_NO_UNKNOWN = object()
 
     def __init__(self, dev):
         self._dev = dev
+        self._rx_buffers = {}
+        self._serial_no = self._SERIAL_NO_UNKNOWN
 
     @classmethod
     def find_all(cls):
         """return all devices with this idVendor and idProduct"""
         devices = []
         try:
-            usb_devices = _usb.core.find(
+            usb_devices = _pyusb().core.find(
                 idVendor=cls.ID_VENDOR,
                 idProduct=cls.ID_PRODUCT,
                 find_all=True)
             for device in usb_devices:
                 devices.append(cls(device))
-        except _usb.core.NoBackendError as err:
+        except _pyusb().core.NoBackendError as err:
             raise StlinkUsbException("USB Error: %s" % err) from err
         return devices
 
-    @property
-    def serial_no(self):
-        """Return device serial number"""
+    def _read_serial_no(self):
         try:
             serial_no = self._dev.serial_number
         except ValueError:
@@ -71,19 +92,34 @@ class StlinkUsbBase:
         except NotImplementedError:
             return None
 
+    @property
+    def serial_no(self):
+        """Return device serial number
+
+        String descriptor is read from device only on first access.
+        """
+        if self._serial_no is self._SERIAL_NO_UNKNOWN:
+            self._serial_no = self._read_serial_no()
+        return self._serial_no
+
     def compare_serial_no(self, serial_no):
         """Compare device serial no with selected serial number"""
-        if self.serial_no.startswith(serial_no):
-            return True
-        if self.serial_no.endswith(serial_no):
-            return True
-        return False
+        serial = self.serial_no
+        if not serial:
+            return False
+        return serial.startswith(serial_no) or serial.endswith(serial_no)
+
+    @property
+    def probe(self):
+        """Return StlinkProbe with description of this device"""
+        return StlinkProbe(
+            self.serial_no, self.DEV_NAME, self.ID_VENDOR, self.ID_PRODUCT)
 
     def write(self, data, timeout=200):
         """Write data to USB pipe"""
         try:
             count = self._dev.write(self.PIPE_OUT, data, timeout)
-        except _usb.USBError as err:
+        except _pyusb().USBError as err:
             self._dev = None
             raise StlinkUsbException("USB Error: %s" % err)
         if count != len(data):
@@ -91,12 +127,37 @@ class StlinkUsbBase:
 
     def read(self, size, timeout=200):
         """Read data from USB pipe"""
+        return self.read_into(size, timeout).tobytes()
+
+    def read_into(self, size, timeout=200, bulk=False):
+        """Read data from USB pipe into reusable buffer
+
+        Buffer is allocated once for each size and is reused by next read
+        with same size. Bulk data and command replies have separate
+        buffers, so reply to status command does not overwrite bulk data
+        of same size.
+
+        Arguments:
+            size: number of bytes to read
+            timeout: maximum waiting time in ms
+            bulk: read bulk data, not command reply
+
+        Return:
+            memoryview of received data, valid until next read
+        """
+        key = (bulk, size)
+        buffer = self._rx_buffers.get(key)
+        if buffer is None:
+            if len(self._rx_buffers) >= self._RX_BUFFERS_MAX:
+                self._rx_buffers.clear()
+            buffer = _array.array('B', bytes(size))
+            self._rx_buffers[key] = buffer
         try:
-            data = self._dev.read(self.PIPE_IN, size, timeout).tobytes()
-        except _usb.USBError as err:
+            count = self._dev.read(self.PIPE_IN, buffer, timeout)
+        except _pyusb().USBError as err:
             self._dev = None
             raise StlinkUsbException("USB Error: %s" % err)
-        return data
+        return memoryview(buffer)[:count]
 
     def __del__(self):
         if self._dev is not None:
@@ -170,6 +231,8 @@ class StlinkUsb:
     """ST-Link communication class"""
     STLINK_MAXIMUM_TRANSFER_SIZE = 6144
     _STLINK_CMD_SIZE = 16
+    # StlinkStats collecting statistics of transfers or None
+    stats = None
     _COM_CLASSES = [
         StlinkUsbV2,
         StlinkUsbV21M,
@@ -182,21 +245,34 @@ class StlinkUsb:
 
     @classmethod
     def _find_all_devices(cls):
-        devices = []
-        for com_cls in cls._COM_CLASSES:
-            devices.extend(com_cls.find_all())
-        return devices
+        """Find all ST-Link devices with single USB bus scan"""
+        com_classes = {
+            (com_cls.ID_VENDOR, com_cls.ID_PRODUCT): com_cls
+            for com_cls in cls._COM_CLASSES}
+
+        def match(device):
+            return (device.idVendor, device.idProduct) in com_classes
+
+        try:
+            usb_devices = _pyusb().core.find(find_all=True, custom_match=match)
+            return [
+                com_classes[(device.idVendor, device.idProduct)](device)
+                for device in usb_devices]
+        except _pyusb().core.NoBackendError as err:
+            raise StlinkUsbException("USB Error: %s" % err) from err
 
     @staticmethod
     def _filter_devices(devices, serial_no):
-        filtered_devices = []
-        for dev in devices:
-            serial = dev.serial_no
-            if serial and (serial.startswith(serial_no) or serial.endswith(serial_no)):
-                filtered_devices.append(dev)
-            else:
-                del dev
-        return filtered_devices
+        return [dev for dev in devices if dev.compare_serial_no(serial_no)]
+
+    @classmethod
+    def list_probes(cls):
+        """Return list of all connected ST-Link probes
+
+        Return:
+            list of StlinkProbe(serial_no, dev_name, id_vendor, id_product)
+        """
+        return [dev.probe for dev in cls._find_all_devices()]
 
     def print_debug(self, msg, level=0):
         """Print info string"""
@@ -212,9 +288,10 @@ class StlinkUsb:
                 _sys.stderr.write(
                     f"{msg}: {' '.join([f'{i:02x}' for i in data])}\n")
 
-    def __init__(self, serial_no='', debug=0):
+    def __init__(self, serial_no='', debug=0, pipeline_depth=1):
         self._dev = None
         self._debug = debug
+        self._pipeline_depth = pipeline_depth
         devices = StlinkUsb._find_all_devices()
         if serial_no:
             devices = StlinkUsb._filter_devices(devices, serial_no)
@@ -229,12 +306,74 @@ class StlinkUsb:
         """property with device name"""
         return self._dev.DEV_NAME
 
+    @property
+    def pipeline_depth(self):
+        """Maximum number of commands in flight in xfer_pipeline"""
+        return self._pipeline_depth
+
+    @pipeline_depth.setter
+    def pipeline_depth(self, value):
+        """Set maximum number of commands in flight, 1 disable pipelining"""
+        if value < 1:
+            raise ValueError(f"Pipeline depth must be at least 1: {value}")
+        self._pipeline_depth = value
+
+    def _pad_command(self, command):
+        if not isinstance(command, bytes):
+            raise StlinkUsbError("command is not type of bytes")
+        if len(command) > self._STLINK_CMD_SIZE:
+            raise StlinkUsbError(
+                "Error too many Bytes in command (maximum is %d Bytes)"
+                % self._STLINK_CMD_SIZE)
+        # pad to _STLINK_CMD_SIZE
+        return command + b'\x00' * (self._STLINK_CMD_SIZE - len(command))
+
+    def _send(self, command, data, timeout):
+        if len(command) != self._STLINK_CMD_SIZE:
+            command = self._pad_command(command)
+        if self._debug >= 3:
+            self.print_debug_data("command", command, level=3)
+            self.print_debug_data("USB:WR", command, level=4)
+        self._dev.write(command, timeout)
+        if data:
+            if not isinstance(data, (bytes, bytearray, memoryview)):
+                raise StlinkUsbError("data are not bytes-like object")
+            self.print_debug_data("USB:WR", data, level=4)
+            self._dev.write(data, timeout)
+
+    def _receive(self, rx_length, timeout, buffered=False, bulk=False):
+        # minimum read length is 2 bytes
+        if buffered:
+            data = self._dev.read_into(max(2, rx_length), timeout, bulk)
+        else:
+            data = self._dev.read(max(2, rx_length), timeout)
+        self.print_debug_data("USB:RD", data, level=4)
+        if len(data) != rx_length:
+            data = data[:rx_length]
+        return data
+
+    def _observe(self, command, data, response, start):
+        """Record finished transfer into statistics and trace
+
+        Return:
+            end time of transfer
+        """
+        end = _time.perf_counter()
+        if self.stats is not None:
+            self.stats.record(command, data, response, end - start)
+        tracer = _tracer.current
+        if tracer is not None:
+            _stats.trace_transfer(tracer, command, data, response, start)
+        return end
+
     def xfer(self, command, data=None, rx_length=0, timeout=200):
         """Transfer command between ST-Link
 
         Arguments:
-            command: is an list of bytes with command (max 16 bytes)
-            data: data will be sent after command
+            command: is an list of bytes with command (max 16 bytes),
+                already padded 16 bytes command can be also bytearray
+            data: data will be sent after command (bytes, bytearray or
+                memoryview, is sent without copying)
             rx_length: number of expected data to receive after command
                 and data transfer
             timeout: maximum waiting time for received data in ms
@@ -245,27 +384,132 @@ class StlinkUsb:
         Raises:
             StlinkUsbException
         """
-        if not isinstance(command, bytes):
-            raise StlinkUsbError("command is not type of bytes")
-        self.print_debug_data("command", command, level=3)
-        if len(command) > self._STLINK_CMD_SIZE:
-            raise StlinkUsbError(
-                "Error too many Bytes in command (maximum is %d Bytes)"
-                % self._STLINK_CMD_SIZE)
-        # pad to _STLINK_CMD_SIZE
-        command += b'\x00' * (self._STLINK_CMD_SIZE - len(command))
-        self.print_debug_data("USB:WR", command, level=4)
-        self._dev.write(command, timeout)
-        if data:
-            if not isinstance(data, bytes):
-                raise StlinkUsbError("data are not type of bytes")
-            self.print_debug_data("USB:WR", data, level=4)
-            self._dev.write(data, timeout)
-        if rx_length:
-            # minimum read length is 2 bytes
-            data = self._dev.read(max(2, rx_length))
-            self.print_debug_data("USB:RD", data, level=4)
-            if len(data) != rx_length:
-                data = data[:rx_length]
-            return data
-        return None
+        if self.stats is None and _tracer.current is None:
+            self._send(command, data, timeout)
+            return self._receive(rx_length, timeout) if rx_length else None
+        start = _time.perf_counter()
+        self._send(command, data, timeout)
+        response = self._receive(rx_length, timeout) if rx_length else None
+        self._observe(command, data, response, start)
+        return response
+
+    def xfer_into(
+            self, command, rx_length, data=None, timeout=200, bulk=False):
+        """Transfer command between ST-Link, receive into reusable buffer
+
+        Same as xfer, but received data are not copied into new object.
+
+        Arguments:
+            command: is an list of bytes with command (max 16 bytes)
+            rx_length: number of expected data to receive after command
+                and data transfer
+            data: data will be sent after command
+            timeout: maximum waiting time for received data in ms
+            bulk: received data are bulk data, not command reply, which
+                stay valid while replies to other commands are received
+
+        Return:
+            memoryview of received data, valid until next transfer
+
+        Raises:
+            StlinkUsbException
+        """
+        if self.stats is None and _tracer.current is None:
+            self._send(command, data, timeout)
+            return self._receive(rx_length, timeout, True, bulk)
+        start = _time.perf_counter()
+        self._send(command, data, timeout)
+        response = self._receive(rx_length, timeout, True, bulk)
+        self._observe(command, data, response, start)
+        return response
+
+    def xfer_pipeline(self, transfers, timeout=200, buffered=False):
+        """Transfer more commands with more commands in flight
+
+        Commands are sent by separate thread, which keep at most
+        pipeline_depth commands without received response, responses are
+        received in order of commands. With pipeline_depth 1 commands are
+        transferred one by one by xfer.
+
+        Arguments:
+            transfers: iterable of tuples (command, data, rx_length)
+                with same meaning as arguments of xfer
+            timeout: maximum waiting time for received data in ms
+            buffered: receive data into reusable buffers, each received
+                memoryview is valid only until next iteration
+
+        Return:
+            iterable of received data for each transfer
+
+        Raises:
+            StlinkUsbException
+        """
+        transfers = list(transfers)
+        observed = self.stats is not None or _tracer.current is not None
+        if self._pipeline_depth <= 1:
+            for command, data, rx_length in transfers:
+                if observed:
+                    start = _time.perf_counter()
+                self._send(command, data, timeout)
+                response = self._receive(
+                    rx_length, timeout, buffered, True) if rx_length else None
+                if observed:
+                    self._observe(command, data, response, start)
+                yield response
+            return
+        slots = _threading.Semaphore(self._pipeline_depth)
+        stop = _threading.Event()
+        sent = [0]
+        errors = []
+
+        def send_all():
+            try:
+                for command, data, _ in transfers:
+                    slots.acquire()
+                    if stop.is_set():
+                        return
+                    self._send(command, data, timeout)
+                    sent[0] += 1
+            except (StlinkUsbError, StlinkUsbException) as err:
+                errors.append(err)
+
+        thread = _threading.Thread(target=send_all, daemon=True)
+        thread.start()
+        received = 0
+        failed = False
+        start = _time.perf_counter()
+        try:
+            for command, sent_data, rx_length in transfers:
+                data = None
+                if rx_length:
+                    try:
+                        data = self._receive(
+                            rx_length, timeout, buffered, True)
+                    except StlinkUsbException as err:
+                        if errors:
+                            raise errors[0] from err
+                        raise
+                received += 1
+                slots.release()
+                if observed:
+                    # latency of pipelined command is time between responses
+                    start = self._observe(command, sent_data, data, start)
+                yield data
+        except GeneratorExit:
+            # closed before all responses was received
+            stop.set()
+            raise
+        except BaseException:
+            failed = True
+            stop.set()
+            raise
+        finally:
+            slots.release()
+            thread.join()
+            if stop.is_set() and not failed and not errors:
+                # drop responses for commands which was already sent
+                for _, _, rx_length in transfers[received:sent[0]]:
+                    if rx_length:
+                        self._receive(rx_length, timeout)
+        if errors:
+            raise errors[0]
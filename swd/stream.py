@@ -0,0 +1,178 @@
+"""Streaming of memory into file
+
+Memory is read by chunks into ring of reusable buffers, while writer
+thread writes already read buffers into file, so reading from probe and
+writing to disk overlap and memory usage does not depend on size of
+dump.
+"""
+
+import os as _os
+import queue as _queue
+import threading as _threading
+from swd.stlink import StlinkRwException as _StlinkRwException
+
+# size of one read chunk, multiple of 4 so chunks stay aligned
+CHUNK_SIZE = 64 * 1024
+# number of buffers in ring
+BUFFERS = 4
+
+
+class StreamError(Exception):
+    """Reading into file was interrupted
+
+    All data before offset are written into file, so reading can be
+    resumed from offset. Original error is in __cause__.
+    """
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+class _Writer(_threading.Thread):
+    """Thread which write filled buffers into file"""
+
+    def __init__(self, file, free):
+        super().__init__(name='pyswd-writer', daemon=True)
+        self._file = file
+        self._free = free
+        self.full = _queue.Queue()
+        self.written = 0
+        self.error = None
+
+    def run(self):
+        while True:
+            item = self.full.get()
+            if item is None:
+                break
+            buffer, size = item
+            if self.error is None:
+                try:
+                    self._file.write(memoryview(buffer)[:size])
+                    self.written += size
+                except OSError as err:
+                    self.error = err
+            # buffer is returned also after error, so reader is not blocked
+            self._free.put(buffer)
+        if self.error is None:
+            try:
+                self._file.flush()
+            except OSError as err:
+                self.error = err
+
+
+def _read_chunk(dev, address, view):
+    """Read one chunk with one check of R/W state"""
+    with dev.deferred_check():
+        dev.read_mem_into(address, view)
+
+
+def _read_head(dev, address, view, err):
+    """Read part of chunk before fault address
+
+    Return:
+        number of read bytes
+    """
+    fault_address = getattr(err, 'fault_address', None)
+    if fault_address is None:
+        return 0
+    size = (fault_address - address) & ~3
+    if not 0 < size < len(view):
+        return 0
+    _read_chunk(dev, address, view[:size])
+    return size
+
+
+def _stream(dev, address, size, file, offset, chunk_size, buffers, progress):
+    free = _queue.Queue()
+    for _ in range(buffers):
+        free.put(bytearray(chunk_size))
+    writer = _Writer(file, free)
+    writer.start()
+    position = offset
+    # without size, memory is read until first fault or end of address space
+    end = (1 << 32) - address if size is None else size
+    error = None
+    try:
+        while position < end:
+            buffer = free.get()
+            if writer.error is not None:
+                break
+            chunk_address = address + position
+            length = min(
+                chunk_size - chunk_address % chunk_size, end - position)
+            view = memoryview(buffer)[:length]
+            try:
+                _read_chunk(dev, chunk_address, view)
+            except _StlinkRwException as err:
+                if size is not None:
+                    raise
+                length = _read_head(dev, chunk_address, view, err)
+                if length:
+                    writer.full.put((buffer, length))
+                    position += length
+                break
+            writer.full.put((buffer, length))
+            position += length
+            if progress is not None:
+                progress(position)
+    except Exception as err:  # pylint: disable=broad-except
+        error = err
+    finally:
+        writer.full.put(None)
+        writer.join()
+    written = offset + writer.written
+    if error is None:
+        error = writer.error
+    if error is not None:
+        raise StreamError(
+            f"Reading interrupted at offset: 0x{written:08x} ({error})",
+            written) from error
+    return written
+
+
+def read_to_file(
+        dev, address, size, file, offset=0,
+        chunk_size=CHUNK_SIZE, buffers=BUFFERS, progress=None):
+    """Read memory into file
+
+    Memory is read by chunks with one R/W state check for each chunk,
+    chunks are written into file by writer thread.
+
+    Arguments:
+        dev: Swd instance
+        address: address in memory
+        size: number of bytes to read, None to read until first
+            memory fault
+        file: file name or binary file object, data from offset are
+            written at current position of file object
+        offset: start reading from this offset, used to resume
+            interrupted reading, file with name is truncated to offset
+        chunk_size: size of one chunk, multiple of 4
+        buffers: number of chunk buffers
+        progress: function called with offset after each chunk
+
+    Return:
+        offset of end of data, number of bytes in file
+
+    Raise:
+        StreamError: if reading or writing failed, with offset of
+            already written data
+    """
+    if chunk_size <= 0 or chunk_size % 4:
+        raise ValueError("Chunk size must be positive multiple of 4")
+    if size is not None and not 0 <= offset <= size:
+        raise ValueError("Offset is out of range")
+    if hasattr(file, 'write'):
+        return _stream(
+            dev, address, size, file, offset, chunk_size, buffers, progress)
+    if offset:
+        if _os.path.getsize(file) < offset:
+            raise ValueError(f"File is shorter than offset: {file}")
+        mode = 'r+b'
+    else:
+        mode = 'wb'
+    with open(file, mode) as output:
+        output.seek(offset)
+        output.truncate()
+        return _stream(
+            dev, address, size, output, offset, chunk_size, buffers, progress)
@@ -0,0 +1,213 @@
+"""Functions executed by target
+
+Small Thumb functions are copied into SRAM of target and called by
+CortexM.call, so target processes its own memory and only result is
+transferred over SWD. Content of used SRAM is lost and core is halted.
+"""
+
+import math as _math
+import struct as _struct
+from swd.cortexm import CortexM as _CortexM
+from swd.cortexm import CortexMException as _CortexMException
+from swd.tracer import traced as _traced
+
+SRAM_ADDRESS = 0x20000000
+
+
+BKPT = 0xbe00
+BX_LR = 0x4770
+
+
+def thumb_code(*halfwords):
+    """Thumb code from 16 bit instructions"""
+    return _struct.pack(f'<{len(halfwords)}H', *halfwords)
+
+
+def _crc32_table():
+    """Table of reflected CRC-32 for 4 bits"""
+    table = []
+    for index in range(16):
+        crc = index
+        for _ in range(4):
+            crc = (crc >> 1) ^ (0xedb88320 if crc & 1 else 0)
+        table.append(crc)
+    return _struct.pack('<16L', *table)
+
+
+# R0 address, R1 size, R2 inverted initial CRC, R3 address of table,
+# return: R0 inverted CRC
+_CRC32_CODE = thumb_code(
+    0x2900,             # cmp r1, #0
+    0xd010,             # beq done
+    0x7804,             # loop: ldrb r4, [r0]
+    0x4062,             #       eors r2, r4
+    0x250f,             #       movs r5, #15
+    0x4015,             #       ands r5, r2
+    0x00ad,             #       lsls r5, r5, #2
+    0x595d,             #       ldr r5, [r3, r5]
+    0x0912,             #       lsrs r2, r2, #4
+    0x406a,             #       eors r2, r5
+    0x250f,             #       movs r5, #15
+    0x4015,             #       ands r5, r2
+    0x00ad,             #       lsls r5, r5, #2
+    0x595d,             #       ldr r5, [r3, r5]
+    0x0912,             #       lsrs r2, r2, #4
+    0x406a,             #       eors r2, r5
+    0x3001,             #       adds r0, #1
+    0x3901,             #       subs r1, #1
+    0xd1ee,             #       bne loop
+    0x0010,             # done: movs r0, r2
+    0xbe00,             #       bkpt
+    0xbf00,             #       nop, table is aligned
+) + _crc32_table()
+_CRC32_TABLE_OFFSET = 0x2c
+
+
+def copy_code(end=BKPT):
+    """Forward copy of memory
+
+    R0 destination, R1 source, R2 size, copy by words and then by bytes,
+    so overlapping copy repeats data between source and destination.
+
+    Arguments:
+        end: last instruction, BKPT for call or BX_LR for subroutine
+
+    Return:
+        Thumb code
+    """
+    return thumb_code(
+        0x2a04,             # cmp r2, #4
+        0xd306,             # bcc bytes
+        0x680b,             # words: ldr r3, [r1]
+        0x6003,             #       str r3, [r0]
+        0x3104,             #       adds r1, #4
+        0x3004,             #       adds r0, #4
+        0x3a04,             #       subs r2, #4
+        0x2a04,             #       cmp r2, #4
+        0xd2f8,             #       bcs words
+        0x2a00,             # bytes: cmp r2, #0
+        0xd005,             #       beq done
+        0x780b,             # loop: ldrb r3, [r1]
+        0x7003,             #       strb r3, [r0]
+        0x3101,             #       adds r1, #1
+        0x3001,             #       adds r0, #1
+        0x3a01,             #       subs r2, #1
+        0xd1f9,             #       bne loop
+        end,                # done:
+    )
+
+
+_COPY_CODE = copy_code()
+
+# smaller areas are filled faster by host
+FILL_MIN_SIZE = 1024
+
+
+def run(dev, code, args=(), cortexm=None, sram=SRAM_ADDRESS, timeout=10.0):
+    """Copy function into SRAM and call it
+
+    Arguments:
+        dev: Swd instance
+        code: Thumb code of function, which ends with BKPT
+        args: values of R0, R1, ..
+        cortexm: CortexM instance, new is created if None
+        sram: address where code is copied
+        timeout: maximum time of function in seconds
+
+    Return:
+        value of R0
+    """
+    if cortexm is None:
+        cortexm = _CortexM(dev)
+    if not cortexm.is_halted():
+        cortexm.halt()
+    dev.write_mem(sram, code)
+    return cortexm.call(sram, args, timeout=timeout)
+
+
+@_traced('stub')
+def crc32(dev, address, size, crc=0, **kwargs):
+    """CRC-32 of target memory computed by target
+
+    Result is same as zlib.crc32 of memory content.
+
+    Arguments:
+        dev: Swd instance
+        address: address in memory
+        size: number of bytes
+        crc: starting value, to continue previous CRC
+        kwargs: cortexm, sram and timeout for run()
+
+    Return:
+        CRC-32
+    """
+    sram = kwargs.get('sram', SRAM_ADDRESS)
+    result = run(dev, _CRC32_CODE, (
+        address, size, crc ^ 0xffffffff, sram + _CRC32_TABLE_OFFSET),
+        **kwargs)
+    return result ^ 0xffffffff
+
+
+def _repeat(pattern, offset, size):
+    """Bytes of pattern repeated from offset"""
+    offset %= len(pattern)
+    count = (offset + size) // len(pattern) + 1
+    return (pattern * count)[offset:offset + size]
+
+
+@_traced('stub')
+def fill(
+        dev, address, pattern, size, cortexm=None, sram=None,
+        timeout=1.0):
+    """Fill memory with pattern by target
+
+    Host writes only first period of pattern, target copies it forward
+    over rest of area. Without sram code is placed at end of filled area
+    and overwritten by pattern after. Small areas, or if core can not be
+    halted or code does not finish in timeout (e.g. area is not
+    executable), are filled by Swd.fill_mem.
+
+    Arguments:
+        dev: Swd instance
+        address: address in memory
+        pattern: list of bytes to fill
+        size: number of bytes to fill
+        cortexm: CortexM instance, new is created if None
+        sram: address of code, must not overlap filled area
+        timeout: maximum time of fill in seconds
+
+    Return:
+        True if memory was filled by target
+    """
+    pattern = bytes(pattern)
+    if cortexm is None:
+        cortexm = _CortexM(dev)
+    period = len(pattern) * 4 // _math.gcd(len(pattern), 4)
+    head = -address % 4 + period
+    end = address + size
+    code = sram
+    if code is None:
+        code = (end - len(_COPY_CODE)) & ~3
+    if size < FILL_MIN_SIZE or code - address < head:
+        dev.fill_mem(address, pattern, size)
+        return False
+    if not cortexm.is_halted():
+        cortexm.halt()
+        if not cortexm.is_halted():
+            dev.fill_mem(address, pattern, size)
+            return False
+    dev.write_mem(address, _repeat(pattern, 0, head))
+    copy_end = end if sram is not None else code
+    try:
+        run(dev, _COPY_CODE, (
+            address + head, address + head - period,
+            copy_end - address - head),
+            cortexm=cortexm, sram=code, timeout=timeout)
+    except _CortexMException:
+        # core faulted in memory without execution, it is halted now
+        dev.fill_mem(address, pattern, size)
+        return False
+    if copy_end < end:
+        dev.write_mem(
+            copy_end, _repeat(pattern, copy_end - address, end - copy_end))
+    return True
@@ -1,8 +1,31 @@
 """SWD protocol
 """
 
-import itertools as _itertools
+import collections as _collections
+import contextlib as _contextlib
+from swd.planner import plan_access as _plan_access
+from swd.tracer import traced as _traced
 from swd.stlink import Stlink as _Stlink
+from swd.stlink import StlinkRwException as _StlinkRwException
+
+
+_Transfer = _collections.namedtuple(
+    '_Transfer', ['write', 'width', 'address', 'size', 'kwargs'])
+
+
+def _as_buffer(data):
+    """Return data as memoryview of bytes
+
+    Arguments:
+        data: data to write
+
+    Return:
+        memoryview if data supports buffer protocol, otherwise None
+    """
+    try:
+        return memoryview(data).cast('B')
+    except TypeError:
+        return None
 
 
 class Swd():
@@ -17,7 +40,24 @@ class Swd():
                 serial_no=serial_no,
                 debug=debug)
         self._drv = driver
+        # list of transfers while deferred checking is active
+        self._deferred = None
+
+    @staticmethod
+    def list_probes():
+        """List connected debug probes
+
+        Return:
+            list of probes, each with serial_no and dev_name
+        """
+        return _Stlink.list_probes()
+
+    @property
+    def driver(self):
+        """SWD driver instance"""
+        return self._drv
 
+    @_traced('swd')
     def get_version(self):
         """Get SWD driver version
 
@@ -26,6 +66,7 @@ class Swd():
         """
         return self._drv.get_version()
 
+    @_traced('swd')
     def get_target_voltage(self):
         """Get target voltage from debugger
 
@@ -34,6 +75,7 @@ class Swd():
         """
         return self._drv.get_target_voltage()
 
+    @_traced('swd')
     def get_idcode(self):
         """Get core ID from MCU
 
@@ -52,6 +94,7 @@ class Swd():
         """ Set default AP number for accesses """
         self._drv.com.default_ap = value
 
+    @_traced('swd')
     def open_ap(self, ap_sel):
         """Open AP (debug access point) for accesses
 
@@ -59,6 +102,7 @@ class Swd():
             ap_sel: AP number to open"""
         self._drv.open_ap(ap_sel)
 
+    @_traced('swd')
     def close_ap(self, ap_sel):
         """Close AP (debug access point) for accesses
 
@@ -66,6 +110,7 @@ class Swd():
             ap_sel: AP number to open"""
         self._drv.close_ap(ap_sel)
 
+    @_traced('swd')
     def get_reg(self, register):
         """Get core register
 
@@ -81,6 +126,7 @@ class Swd():
         """
         return self._drv.get_reg(register)
 
+    @_traced('swd')
     def get_reg_all(self):
         """Get all core registers
 
@@ -93,6 +139,7 @@ class Swd():
         """
         return self._drv.get_reg_all()
 
+    @_traced('swd')
     def set_reg(self, register, data):
         """Set core register
 
@@ -106,6 +153,7 @@ class Swd():
         """
         self._drv.set_reg(register, data)
 
+    @_traced('swd')
     def get_mem32(self, address, **kwargs):
         """Get 32 bit memory register with 32 bit memory access.
 
@@ -119,6 +167,7 @@ class Swd():
         """
         return self._drv.get_mem32(address, **kwargs)
 
+    @_traced('swd')
     def set_mem32(self, address, data, **kwargs):
         """Set 32 bit memory register with 32 bit memory access.
 
@@ -130,22 +179,226 @@ class Swd():
         """
         self._drv.set_mem32(address, data, **kwargs)
 
-    def _get_chunk_size_to_align_size(self, address, size):
-        if size > self._drv.maximum_8bit_data:
-            return min(size, self._drv.maximum_8bit_data - (address % 4))
-        return size
+    @_traced('swd')
+    def set_mem32_many(self, items, **kwargs):
+        """Set more 32 bit memory registers with 32 bit memory access.
+
+        If driver supports it, commands are pipelined.
+
+        Arguments:
+            items: iterable of tuples (address, value), address must be
+                aligned to 4 Bytes
+        """
+        set_mem32_many = getattr(self._drv, 'set_mem32_many', None)
+        if set_mem32_many is None:
+            for address, value in items:
+                self._drv.set_mem32(address, value, **kwargs)
+            return
+        set_mem32_many(items, **kwargs)
+
+    @_traced('chunk')
+    def _drv_read(self, width, address, size, **kwargs):
+        """Read one chunk from memory using driver"""
+        if self._deferred is not None:
+            self._deferred.append(
+                _Transfer(False, width, address, size, dict(kwargs)))
+            kwargs['check_last_error_status'] = False
+        return getattr(self._drv, f'read_mem{width}')(address, size, **kwargs)
+
+    def _drv_read_chunks(self, chunks, buffered=False, **kwargs):
+        """Read more chunks from memory using driver
+
+        If driver support it, chunks are read by one driver call,
+        so driver can pipeline transfers.
+
+        Arguments:
+            chunks: list of tuples (width, address, size)
+            buffered: driver can return chunk in reusable buffer,
+                which is valid only until next chunk
+
+        Return:
+            iterable of chunks as returned by driver
+        """
+        read_mem_chunks = getattr(self._drv, 'read_mem_chunks', None)
+        if read_mem_chunks is None:
+            for width, address, size in chunks:
+                yield self._drv_read(width, address, size, **kwargs)
+            return
+        if self._deferred is not None:
+            self._deferred.extend(
+                _Transfer(False, width, address, size, dict(kwargs))
+                for width, address, size in chunks)
+            kwargs['check_last_error_status'] = False
+        yield from read_mem_chunks(chunks, buffered=buffered, **kwargs)
+
+    @_traced('chunk')
+    def _drv_write(self, width, address, data, **kwargs):
+        """Write one chunk into memory using driver"""
+        if self._deferred is not None:
+            self._deferred.append(
+                _Transfer(True, width, address, len(data), dict(kwargs)))
+            kwargs['check_last_error_status'] = False
+        getattr(self._drv, f'write_mem{width}')(address, data, **kwargs)
+
+    @_contextlib.contextmanager
+    def deferred_check(self):
+        """Context for bulk transfers with deferred error checking
+
+        All memory reads and writes inside this context are executed
+        without checking of last R/W state after each chunk. State is
+        checked only once when leaving the context. If this final check
+        fails, faulting chunk is located and reported in exception.
+        Read data are valid only after leaving context without exception.
+
+        Raise:
+            StlinkRwException: if some transfer failed
+
+        Example:
+            with dev.deferred_check():
+                data = dev.read_mem_bytes(0x20000000, 0x10000)
+        """
+        if self._deferred is not None:
+            # already in deferred context
+            yield
+            return
+        self._deferred = []
+        try:
+            yield
+            transfers = self._deferred
+        finally:
+            self._deferred = None
+        if transfers:
+            self._check_deferred(transfers)
+
+    def _check_deferred(self, transfers):
+        try:
+            self._drv.check_last_rw_state()
+        except _StlinkRwException as err:
+            transfer = self._find_faulting_transfer(
+                transfers, err.fault_address)
+            if transfer is None:
+                raise
+            access = 'write' if transfer.write else 'read'
+            raise _StlinkRwException(
+                f"{err} ({access} of {transfer.size} Bytes "
+                f"at address: 0x{transfer.address:08x} "
+                f"with {transfer.width} bit access)",
+                err.status, err.fault_address) from err
+
+    def _find_faulting_transfer(self, transfers, fault_address):
+        for transfer in transfers:
+            if transfer.address <= fault_address < transfer.address + transfer.size:
+                return transfer
+        if any(transfer.write for transfer in transfers):
+            # writes can not be repeated safely
+            return None
+        # bisect by repeating reads with one check for each half
+        low, high = 0, len(transfers)
+        confirmed = False
+        while high - low > 1:
+            middle = (low + high) // 2
+            confirmed = self._repeat_reads_fault(transfers[low:middle])
+            if confirmed:
+                high = middle
+            else:
+                low = middle
+        # fault may not be reproduced, then no transfer is blamed
+        if not confirmed and not self._repeat_reads_fault(
+                transfers[low:high]):
+            return None
+        return transfers[low]
+
+    def _repeat_reads_fault(self, transfers):
+        """Repeat reads and return True if they fault"""
+        for transfer in transfers:
+            getattr(self._drv, f'read_mem{transfer.width}')(
+                transfer.address, transfer.size,
+                **dict(transfer.kwargs, check_last_error_status=False))
+        try:
+            self._drv.check_last_rw_state()
+        except _StlinkRwException:
+            return True
+        return False
+
+    def _limits(self, widths):
+        """Driver limits for selected access widths"""
+        maximum = {
+            8: self._drv.maximum_8bit_data,
+            16: self._drv.maximum_16bit_data,
+            32: self._drv.maximum_32bit_data,
+        }
+        return tuple((width, maximum[width]) for width in widths)
+
+    def plan_mem(self, address, size, widths=(8, 32)):
+        """Plan memory access
+
+        Return list of operations used by read_mem, write_mem and fill_mem,
+        unaligned head and tail is accessed by 8 bit width, the rest
+        with wider width and number of operations is minimal.
+
+        Arguments:
+            address: address in memory
+            size: number of bytes
+            widths: one access width (8, 16 or 32) or 8 and wider width
+
+        Return:
+            tuple of Access(width, address, size)
+
+        Raise:
+            ValueError: if combination of widths is not supported
+        """
+        return _plan_access(address, size, self._limits(widths))
+
+    def _read_mem_chunks(self, address, size, widths=(8, 32), **kwargs):
+        """Read memory by chunks
+
+        Chunks are planned by plan_mem
+
+        Arguments:
+            address: address in memory
+            size: number of bytes to read
+            widths: allowed memory access widths
+
+        Return:
+            iterable of chunks as returned by driver
+        """
+        chunks = self.plan_mem(address, size, widths)
+        return self._drv_read_chunks(chunks, **kwargs)
+
+    def _write_mem_plan(self, address, data, widths=(8, 32), **kwargs):
+        """Write memory by chunks planned by plan_mem
 
-    def _get_chunk_size_to_align_address(self, address, size):
-        if address % 4:
-            if size == self._drv.maximum_8bit_data:
-                return size
-            return min(size, self._drv.maximum_8bit_data - (address % 4))
-        return 0
+        Bytes-like data are sliced without copying, other iterables
+        are converted to bytes first.
+        """
+        buffer = _as_buffer(data)
+        if buffer is None:
+            buffer = memoryview(bytes(data))
+        offset = 0
+        for access in self.plan_mem(address, len(buffer), widths):
+            self._drv_write(
+                access.width, access.address,
+                buffer[offset:offset + access.size], **kwargs)
+            offset += access.size
+
+    def _fill_mem_plan(self, address, pattern, size, widths=(8, 32)):
+        """Fill memory by chunks planned by plan_mem"""
+        plan = self.plan_mem(address, size, widths)
+        longest = max((access.size for access in plan), default=0)
+        data = pattern * (longest // len(pattern) + 2)
+        index = 0
+        for access in plan:
+            self._drv_write(
+                access.width, access.address,
+                data[index:index + access.size])
+            index = (index + access.size) % len(pattern)
 
+    @_traced('swd')
     def read_mem(self, address, size, **kwargs):
         """Read bytes memory
 
-        Automatically use 8 and 32 bit access read which depends on alignment
+        Automatically use 8 and 32 bit access read which depends on alignment,
+        accesses are planned by plan_mem
 
         Arguments:
             address: address in memory
@@ -154,22 +407,47 @@ class Swd():
         Return:
             iterable of read data
         """
-        chunk_size = self._get_chunk_size_to_align_address(address, size)
-        if chunk_size:
-            yield from self._drv.read_mem8(address, chunk_size, **kwargs)
-            address += chunk_size
-            size -= chunk_size
-        while size:
-            chunk_size = size
-            if chunk_size < self._drv.maximum_8bit_data and chunk_size % 4:
-                yield from self._drv.read_mem8(address, chunk_size, **kwargs)
-            else:
-                chunk_size = min(chunk_size, self._drv.maximum_32bit_data)
-                chunk_size -= chunk_size % 4
-                yield from self._drv.read_mem32(address, chunk_size, **kwargs)
-            address += chunk_size
-            size -= chunk_size
+        for chunk in self._read_mem_chunks(address, size, **kwargs):
+            yield from chunk
+
+    @_traced('swd')
+    def read_mem_into(self, address, buffer, **kwargs):
+        """Read memory into buffer
+
+        Automatically use 8 and 32 bit access read which depends on alignment.
+        Data are copied chunk by chunk directly into buffer, so no
+        intermediate objects are created for each byte.
+
+        Arguments:
+            address: address in memory
+            buffer: writable bytes-like object (bytearray, memoryview, ..),
+                length of buffer is number of bytes to read
+        """
+        view = memoryview(buffer).cast('B')
+        offset = 0
+        for chunk in self._read_mem_chunks(
+                address, len(view), buffered=True, **kwargs):
+            view[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+
+    @_traced('swd')
+    def read_mem_bytes(self, address, size, **kwargs):
+        """Read bytes memory into new buffer
+
+        Automatically use 8 and 32 bit access read which depends on alignment
+
+        Arguments:
+            address: address in memory
+            size: number of bytes to read
 
+        Return:
+            bytearray with read data
+        """
+        data = bytearray(size)
+        self.read_mem_into(address, data, **kwargs)
+        return data
+
+    @_traced('swd')
     def write_mem(self, address, data, **kwargs):
         """Write memory
 
@@ -177,34 +455,13 @@ class Swd():
 
         Arguments:
             address: address in memory
-            data: list or iterable of bytes to write into memory
+            data: list or iterable of bytes to write into memory,
+                bytes-like objects (bytes, bytearray, mmap, ..) are written
+                without copying
         """
-        data = iter(data)
-        # first chunk to align address
-        if address % 4:
-            chunk_size_max = self._drv.maximum_8bit_data - (address % 4)
-            chunk = bytes(_itertools.islice(data, 0, chunk_size_max))
-            if not chunk:
-                return
-            self._drv.write_mem8(address, chunk, **kwargs)
-            address += len(chunk)
-        # write remained data, here is address always aligned
-        while True:
-            chunk = bytes(_itertools.islice(data, 0, self._drv.maximum_32bit_data))
-            if not chunk:
-                return
-            if len(chunk) % 4 == 0:
-                self._drv.write_mem32(address, chunk, **kwargs)
-                address += len(chunk)
-                continue
-            if len(chunk) > self._drv.maximum_8bit_data:
-                chunk_size32 = len(chunk) & 0xfffffffc
-                self._drv.write_mem32(address, chunk[:chunk_size32], **kwargs)
-                chunk = chunk[chunk_size32:]
-                address += chunk_size32
-            self._drv.write_mem8(address, chunk, **kwargs)
-            return
+        self._write_mem_plan(address, data, **kwargs)
 
+    @_traced('swd')
     def fill_mem(self, address, pattern, size):
         """Fill memory with pattern
 
@@ -215,23 +472,9 @@ class Swd():
             pattern: list of bytes to fill
             size: number of bytes to fill
         """
-        index = 0
-        data = pattern * (
-            (min(size, self._drv.maximum_32bit_data) // len(pattern)) + 1)
-        while size:
-            chunk_size = size
-            if address % 4 or (chunk_size < self._drv.maximum_8bit_data and chunk_size % 4):
-                if chunk_size > self._drv.maximum_8bit_data:
-                    chunk_size = min(chunk_size, self._drv.maximum_8bit_data - (address % 4))
-                self._drv.write_mem8(address, data[index:index + chunk_size])
-            else:
-                chunk_size = min(chunk_size, self._drv.maximum_32bit_data)
-                chunk_size -= chunk_size % 4
-                self._drv.write_mem32(address, data[index:index + chunk_size])
-            index = (index + chunk_size) % len(pattern)
-            address += chunk_size
-            size -= chunk_size
+        self._fill_mem_plan(address, pattern, size)
 
+    @_traced('swd')
     def read_mem8(self, address, size):
         """Read memory with 8 bit access
 
@@ -242,28 +485,21 @@ class Swd():
         Return:
             iterable of read data
         """
-        while size:
-            chunk_size = min(size, self._drv.maximum_8bit_data)
-            yield from self._drv.read_mem8(address, chunk_size)
-            address += chunk_size
-            size -= chunk_size
+        for chunk in self._read_mem_chunks(address, size, widths=(8,)):
+            yield from chunk
 
+    @_traced('swd')
     def write_mem8(self, address, data):
         """Write memory with 8 bit access
 
         Arguments:
             address: address in memory
-            data: list or iterable of bytes to write into memory
+            data: list or iterable of bytes to write into memory,
+                bytes-like objects are written without copying
         """
-        data = iter(data)
-        while True:
-            chunk = bytes(
-                _itertools.islice(data, 0, self._drv.maximum_8bit_data))
-            if not chunk:
-                return
-            self._drv.write_mem8(address, chunk)
-            address += len(chunk)
+        self._write_mem_plan(address, data, widths=(8,))
 
+    @_traced('swd')
     def fill_mem8(self, address, pattern, size):
         """Fill memory with pattern using 8 bit access
 
@@ -272,15 +508,9 @@ class Swd():
             pattern: list of bytes to fill
             size: number of bytes to fill
         """
-        index = 0
-        data = pattern * ((min(size, self._drv.maximum_8bit_data) // len(pattern)) + 1)
-        while size:
-            chunk_size = min(size, self._drv.maximum_8bit_data)
-            self._drv.write_mem8(address, data[index:index + chunk_size])
-            index = (index + chunk_size) % len(pattern)
-            address += chunk_size
-            size -= chunk_size
+        self._fill_mem_plan(address, pattern, size, widths=(8,))
 
+    @_traced('swd')
     def read_mem16(self, address, size):
         """Read memory with 16 bit access
 
@@ -291,28 +521,21 @@ class Swd():
         Return:
             iterable of read data
         """
-        while size:
-            chunk_size = min(size, self._drv.maximum_16bit_data)
-            yield from self._drv.read_mem16(address, chunk_size)
-            address += chunk_size
-            size -= chunk_size
+        for chunk in self._read_mem_chunks(address, size, widths=(16,)):
+            yield from chunk
 
+    @_traced('swd')
     def write_mem16(self, address, data):
         """Write memory with 16 bit access
 
         Arguments:
             address: address in memory
-            data: list or iterable of bytes to write into memory
+            data: list or iterable of bytes to write into memory,
+                bytes-like objects are written without copying
         """
-        data = iter(data)
-        while True:
-            chunk = bytes(
-                _itertools.islice(data, 0, self._drv.maximum_16bit_data))
-            if not chunk:
-                return
-            self._drv.write_mem16(address, chunk)
-            address += len(chunk)
+        self._write_mem_plan(address, data, widths=(16,))
 
+    @_traced('swd')
     def fill_mem16(self, address, pattern, size):
         """Fill memory with pattern using 16 bit access
 
@@ -321,15 +544,9 @@ class Swd():
             pattern: list of bytes to fill
             size: number of bytes to fill
         """
-        index = 0
-        data = pattern * ((min(size, self._drv.maximum_16bit_data) // len(pattern)) + 1)
-        while size:
-            chunk_size = min(size, self._drv.maximum_16bit_data)
-            self._drv.write_mem16(address, data[index:index + chunk_size])
-            index = (index + chunk_size) % len(pattern)
-            address += chunk_size
-            size -= chunk_size
+        self._fill_mem_plan(address, pattern, size, widths=(16,))
 
+    @_traced('swd')
     def read_mem32(self, address, size):
         """Read memory with 32 bit access
 
@@ -340,28 +557,21 @@ class Swd():
         Return:
             iterable of read data
         """
-        while size:
-            chunk_size = min(size, self._drv.maximum_32bit_data)
-            yield from self._drv.read_mem32(address, chunk_size)
-            address += chunk_size
-            size -= chunk_size
+        for chunk in self._read_mem_chunks(address, size, widths=(32,)):
+            yield from chunk
 
+    @_traced('swd')
     def write_mem32(self, address, data):
         """Write memory with 32 bit access
 
         Arguments:
             address: address in memory
-            data: list or iterable of bytes to write into memory
+            data: list or iterable of bytes to write into memory,
+                bytes-like objects are written without copying
         """
-        data = iter(data)
-        while True:
-            chunk = bytes(
-                _itertools.islice(data, 0, self._drv.maximum_32bit_data))
-            if not chunk:
-                return
-            self._drv.write_mem32(address, chunk)
-            address += len(chunk)
+        self._write_mem_plan(address, data, widths=(32,))
 
+    @_traced('swd')
     def fill_mem32(self, address, pattern, size):
         """Fill memory with pattern using 32 bit access
 
@@ -370,11 +580,4 @@ class Swd():
             pattern: list of bytes to fill
             size: number of bytes to fill
         """
-        index = 0
-        data = pattern * ((min(size, self._drv.maximum_32bit_data) // len(pattern)) + 1)
-        while size:
-            chunk_size = min(size, self._drv.maximum_32bit_data)
-            self._drv.write_mem32(address, data[index:index + chunk_size])
-            index = (index + chunk_size) % len(pattern)
-            address += chunk_size
-            size -= chunk_size
+        self._fill_mem_plan(address, pattern, size, widths=(32,))
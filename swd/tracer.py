@@ -0,0 +1,225 @@
+"""Tracing of probe activity
+
+Spans of high level calls (Swd, CortexM), of memory chunks and of each
+USB transfer are collected and saved as Chrome trace event JSON, which
+can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing:
+
+    swd.tracer.start()
+    dev.read_mem_bytes(0x08000000, 0x10000)
+    swd.tracer.stop().save('trace.json')
+
+While tracing is not started, traced call cost one more function call
+and check of module variable.
+"""
+
+import contextlib as _contextlib
+import functools as _functools
+import os as _os
+import threading as _threading
+import time as _time
+
+# active Tracer or None, use start() and stop() to change it
+current = None  # pylint: disable=invalid-name
+
+
+class Tracer:
+    """Collector of trace events
+
+    Timestamps are from time.perf_counter, events are stored in
+    Chrome trace event format.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._origin = _time.perf_counter()
+        self._pid = _os.getpid()
+        self._lock = _threading.Lock()
+
+    @property
+    def events(self):
+        """List of collected trace events"""
+        return self._events
+
+    def _timestamp(self, timestamp):
+        """Timestamp from perf_counter in microseconds since start"""
+        return (timestamp - self._origin) * 1e6
+
+    def _add(self, event, args):
+        event['pid'] = self._pid
+        event['tid'] = _threading.get_ident()
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+
+    def complete(self, name, category, start, duration, args=None):
+        """Add complete span
+
+        Arguments:
+            name: name of span
+            category: category of span (swd, cortexm, chunk, usb, ..)
+            start: start time from time.perf_counter
+            duration: duration in seconds
+            args: dictionary with additional values
+        """
+        self._add({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': self._timestamp(start),
+            'dur': duration * 1e6,
+        }, args)
+
+    def instant(self, name, category, args=None):
+        """Add instant event"""
+        self._add({
+            'name': name,
+            'cat': category,
+            'ph': 'i',
+            's': 't',
+            'ts': self._timestamp(_time.perf_counter()),
+        }, args)
+
+    @_contextlib.contextmanager
+    def span(self, name, category, **args):
+        """Context which add span for its body
+
+        Dictionary of args is returned from context, so more values can
+        be added while span is running. Exception is stored in args
+        as error, with its status if exception have it.
+        """
+        start = _time.perf_counter()
+        try:
+            yield args
+        except BaseException as err:
+            args['error'] = f"{type(err).__name__}: {err}"
+            status = getattr(err, 'status', None)
+            if status is not None:
+                args['status'] = status
+            raise
+        finally:
+            self.complete(
+                name, category, start, _time.perf_counter() - start, args)
+
+    def to_dict(self):
+        """Trace in Chrome trace event format"""
+        return {'traceEvents': list(self._events), 'displayTimeUnit': 'ms'}
+
+    def save(self, file):
+        """Save trace as JSON
+
+        Arguments:
+            file: file name or text file object
+        """
+        import json as _json  # pylint: disable=import-outside-toplevel
+        if hasattr(file, 'write'):
+            _json.dump(self.to_dict(), file)
+            return
+        with open(file, 'w') as trace_file:
+            _json.dump(self.to_dict(), trace_file)
+
+
+def start(tracer=None):
+    """Start tracing
+
+    Arguments:
+        tracer: Tracer instance, new is created if not set
+
+    Return:
+        active Tracer
+    """
+    global current  # pylint: disable=global-statement,invalid-name
+    current = tracer if tracer is not None else Tracer()
+    return current
+
+
+def stop():
+    """Stop tracing
+
+    Return:
+        Tracer which was active or None
+    """
+    global current  # pylint: disable=global-statement,invalid-name
+    tracer, current = current, None
+    return tracer
+
+
+def _format_arg(name, value):
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, int):
+        if name == 'address':
+            return f'0x{value:08x}'
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'{len(value)} Bytes'
+    if isinstance(value, (str, float)):
+        return value
+    return type(value).__name__
+
+
+def _call_args(func, args, kwargs):
+    """Arguments of traced call converted for trace event
+
+    Names of positional arguments are taken from code of function,
+    so inspect module is not needed.
+    """
+    code = func.__code__
+    names = code.co_varnames[:code.co_argcount]
+    values = dict(zip(names, args))
+    values.update(kwargs)
+    return {
+        name: _format_arg(name, value)
+        for name, value in values.items()
+        if name not in ('self', 'cls')}
+
+
+def _traced_iter(tracer, name, category, iterator, args):
+    """Generator which add span for whole iteration"""
+    with tracer.span(name, category, **args):
+        yield from iterator
+
+
+_CO_GENERATOR = 0x20
+
+
+def traced(category):
+    """Decorator which add span for each call while tracing is active
+
+    Span of generator function cover whole iteration.
+
+    Arguments:
+        category: category of span
+    """
+    def decorator(func):
+        name = func.__qualname__
+        if func.__code__.co_flags & _CO_GENERATOR:
+            @_functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                tracer = current
+                if tracer is None:
+                    return func(*args, **kwargs)
+                return _traced_iter(
+                    tracer, name, category, func(*args, **kwargs),
+                    _call_args(func, args, kwargs))
+        else:
+            @_functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                tracer = current
+                if tracer is None:
+                    return func(*args, **kwargs)
+                with tracer.span(
+                        name, category, **_call_args(func, args, kwargs)):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def sleep(seconds):
+    """time.sleep, which add span while tracing is active"""
+    tracer = current
+    if tracer is None:
+        _time.sleep(seconds)
+        return
+    with tracer.span('sleep', 'sleep', seconds=seconds):
+        _time.sleep(seconds)
@@ -0,0 +1,209 @@
+"""Verification of target memory
+
+CRC-32 of memory is computed by target and compared with CRC-32 of
+expected data computed by host, so only few words are transferred over
+SWD independently of size of verified memory.
+
+CRC-32 is computed by stub with table (swd.stub.crc32) or by STM32 CRC
+unit, which is configured by set_mem32 for same result as zlib.crc32.
+CRC unit is used only on families where its input and output can be
+bit reversed.
+
+Stub is placed at start of SRAM, or after verified memory if it is
+there. If stub can not be written out of verified memory, memory is
+read and CRC-32 is computed by host.
+"""
+
+import zlib as _zlib
+from swd.cortexm import CortexM as _CortexM
+from swd.flash import Flash as _Flash
+from swd.stlink import StlinkRwException as _StlinkRwException
+from swd.stub import SRAM_ADDRESS as _SRAM_ADDRESS
+from swd.stub import crc32 as _stub_crc32
+from swd.stub import run as _run
+from swd.stub import thumb_code as _thumb_code
+from swd.tracer import traced as _traced
+
+CRC_ADDRESS = 0x40023000
+_CRC_DR = CRC_ADDRESS + 0x00
+_CRC_CR = CRC_ADDRESS + 0x08
+_CRC_INIT = CRC_ADDRESS + 0x10
+# RESET, REV_IN by word, REV_OUT
+_CRC_CR_ZLIB = 0x00000001 | 0x00000060 | 0x00000080
+
+# RCC register and bit enabling clock of CRC unit for each family
+CRC_CLOCK = {
+    'STM32F0': (0x40021014, 0x00000040),
+    'STM32F3': (0x40021014, 0x00000040),
+    'STM32F7': (0x40023830, 0x00001000),
+    'STM32L4': (0x40021048, 0x00001000),
+    'STM32G0': (0x40021038, 0x00001000),
+    'STM32G4': (0x40021048, 0x00001000),
+}
+
+# R0 address, R1 size (multiple of 4), R3 address of CRC DR,
+# return: R0 value of DR
+_CRC_UNIT_CODE = _thumb_code(
+    0x2900,             # cmp r1, #0
+    0xd004,             # beq done
+    0x6804,             # loop: ldr r4, [r0]
+    0x601c,             #       str r4, [r3]
+    0x3004,             #       adds r0, #4
+    0x3904,             #       subs r1, #4
+    0xd1fa,             #       bne loop
+    0x6818,             # done: ldr r0, [r3]
+    0xbe00,             #       bkpt
+    0xbf00,             #       nop
+)
+
+# space for any of stubs
+_STUB_SIZE = 0x80
+# end of SRAM region of Cortex-M memory map
+_SRAM_END = 0x40000000
+
+
+class VerifyError(Exception):
+    """Verification is not possible"""
+
+
+def _reverse_bits(value):
+    return int(f'{value:032b}'[::-1], 2)
+
+
+def stub_address(areas):
+    """Address for stub out of all verified areas
+
+    Arguments:
+        areas: list of (address, size)
+
+    Return:
+        start of SRAM or first address after area in SRAM, where stub
+        does not overlap any area, None if there is no such address
+    """
+    candidates = [_SRAM_ADDRESS] + sorted(
+        (address + size + 3) & ~3 for address, size in areas
+        if _SRAM_ADDRESS <= address + size < _SRAM_END)
+    for candidate in candidates:
+        if candidate + _STUB_SIZE > _SRAM_END:
+            continue
+        if all(
+                candidate + _STUB_SIZE <= address
+                or address + size <= candidate
+                for address, size in areas):
+            return candidate
+    return None
+
+
+def _unit_crc32(dev, address, size, crc, family, cortexm, sram, timeout):
+    """CRC-32 of words computed by CRC unit"""
+    if family not in CRC_CLOCK:
+        raise VerifyError(f"CRC unit is not supported on {family}")
+    register, bit = CRC_CLOCK[family]
+    dev.set_mem32(register, dev.get_mem32(register) | bit)
+    # CRC unit does not reflect INIT, it is loaded by RESET bit
+    dev.set_mem32(_CRC_INIT, _reverse_bits(crc ^ 0xffffffff))
+    dev.set_mem32(_CRC_CR, _CRC_CR_ZLIB)
+    result = _run(
+        dev, _CRC_UNIT_CODE, (address, size, 0, _CRC_DR),
+        cortexm=cortexm, sram=sram, timeout=timeout)
+    return result ^ 0xffffffff
+
+
+@_traced('verify')
+def crc32(
+        dev, address, size, crc=0, hardware=False, cortexm=None,
+        sram=None, timeout=10.0):
+    """CRC-32 of target memory computed by target
+
+    Result is same as zlib.crc32 of memory content.
+
+    Arguments:
+        dev: Swd instance
+        address: address in memory
+        size: number of bytes
+        crc: starting value, to continue previous CRC
+        hardware: use STM32 CRC unit, unaligned head and tail are read
+            by host
+        cortexm: CortexM instance, new is created if None
+        sram: address of SRAM for stub, must not overlap memory, if None
+            it is selected by stub_address()
+        timeout: maximum time of computation in seconds
+
+    Return:
+        CRC-32
+
+    Raise:
+        VerifyError: if CRC unit is not supported
+    """
+    if sram is None:
+        sram = stub_address([(address, size)])
+    if sram is not None:
+        try:
+            return _target_crc32(
+                dev, address, size, crc, hardware, cortexm, sram, timeout)
+        except _StlinkRwException:
+            # SRAM after verified memory does not exist
+            pass
+    return _zlib.crc32(dev.read_mem_bytes(address, size), crc)
+
+
+def _target_crc32(dev, address, size, crc, hardware, cortexm, sram, timeout):
+    """CRC-32 computed by stub or by CRC unit"""
+    if cortexm is None:
+        cortexm = _CortexM(dev)
+    if not hardware:
+        return _stub_crc32(
+            dev, address, size, crc,
+            cortexm=cortexm, sram=sram, timeout=timeout)
+    family = _Flash(dev, cortexm).family.name
+    head = min(size, -address % 4)
+    body = (size - head) & ~3
+    tail = size - head - body
+    if head:
+        crc = _zlib.crc32(dev.read_mem_bytes(address, head), crc)
+    if body:
+        crc = _unit_crc32(
+            dev, address + head, body, crc, family, cortexm, sram, timeout)
+    if tail:
+        crc = _zlib.crc32(
+            dev.read_mem_bytes(address + head + body, tail), crc)
+    return crc
+
+
+def verify(dev, address, data, **kwargs):
+    """Compare memory with data by CRC-32 computed by target
+
+    Arguments:
+        dev: Swd instance
+        address: address in memory
+        data: expected bytes-like data
+        kwargs: arguments of crc32()
+
+    Return:
+        True if memory has same CRC-32 as data
+    """
+    return crc32(dev, address, len(data), **kwargs) == _zlib.crc32(data)
+
+
+def verify_image(dev, segments, **kwargs):
+    """Verify all segments of image
+
+    Arguments:
+        dev: Swd instance
+        segments: list of swd.image.Segment
+        kwargs: arguments of crc32()
+
+    Return:
+        list of segments which differ
+    """
+    if kwargs.get('sram') is None:
+        kwargs['sram'] = stub_address(
+            [(segment.address, len(segment.data)) for segment in segments])
+    if kwargs['sram'] is None:
+        return [
+            segment for segment in segments
+            if dev.read_mem_bytes(
+                segment.address, len(segment.data)) != segment.data]
+    return [
+        segment for segment in segments
+        if not verify(dev, segment.address, segment.data, **kwargs)]
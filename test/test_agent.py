@@ -0,0 +1,135 @@
+"""Unit tests for agent.py
+"""
+
+import struct
+import unittest
+import swd
+import swd.agent
+import swd.stlink
+import swd.stlink.sim
+import swd.stub
+from test.test_stub import run_stub
+
+
+def _copy(sim, destination, source, size):
+    step = destination - source
+    if 0 < step < size:
+        for offset in range(0, size, step):
+            chunk = min(step, size - offset)
+            data, _ = sim.read_memory(source + offset, chunk)
+            sim.write_memory(destination + offset, data)
+    else:
+        sim.write_memory(destination, sim.read_memory(source, size)[0])
+    return destination + size
+
+
+def _compare(sim, address1, address2, size):
+    data1, _ = sim.read_memory(address1, size)
+    data2, _ = sim.read_memory(address2, size)
+    for offset in range(size):
+        if data1[offset] != data2[offset]:
+            return offset
+    return size
+
+
+def _check(sim, address, size, value):
+    data, _ = sim.read_memory(address, size)
+    for offset in range(size):
+        if data[offset] != value:
+            return offset
+    return size
+
+
+def _find(sim, address, size, pattern_address):
+    length = int.from_bytes(sim.read_memory(pattern_address, 4)[0], 'little')
+    pattern, _ = sim.read_memory(pattern_address + 4, length)
+    offset = sim.read_memory(address, size)[0].find(pattern)
+    return 0 if offset < 0 else size - offset
+
+
+_ROUTINES = {
+    swd.agent._COPY_OFFSET: _copy,
+    swd.agent._COMPARE_OFFSET: _compare,
+    swd.agent._CHECK_OFFSET: _check,
+    swd.agent._FIND_OFFSET: _find,
+}
+
+
+def run_agent(sim):
+    """Emulate dispatcher of agent loaded at PC"""
+    pc = sim.registers[15]
+    code = swd.agent._CODE
+    assert sim.read_memory(pc, len(code))[0] == code
+    table, count = sim.registers[:2]
+    for index in range(count):
+        address = table + index * 16
+        entry = struct.unpack('<4L', sim.read_memory(address, 16)[0])
+        assert entry[0] & 1
+        routine = _ROUTINES[(entry[0] & ~1) - pc]
+        result = routine(sim, *entry[1:])
+        sim.write_memory(address, struct.pack('<L', result))
+    sim.agent_runs = getattr(sim, 'agent_runs', 0) + 1
+    sim.halted = True
+
+
+class TestAgent(unittest.TestCase):
+    """Tests for agent"""
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._sim.on_run = run_agent
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+        self._agent = swd.agent.Agent(self._swd)
+        self._sram = self._sim.find_region(self._sim.SRAM_ADDRESS)
+        self._sram.data[0x1000:0x1100] = bytes(range(256))
+
+    def test_operations(self):
+        """test all operations executed by one call"""
+        agent = self._agent
+        agent.copy(0x20002000, 0x20001000, 256)
+        agent.compare(0x20001000, 0x20002000, 256)
+        agent.compare(0x20001000, 0x20001001, 256)
+        agent.is_erased(0x20003000, 64, 0)
+        agent.is_erased(0x20001000, 64, 0)
+        agent.find(0x20001000, 256, [0x42, 0x43])
+        agent.find(0x20001000, 256, [0x43, 0x42])
+        self.assertEqual(agent.pending, 7)
+        self.assertEqual(
+            agent.run(), [None, None, 0, True, False, 0x42, None])
+        self.assertEqual(self._sram.data[0x2000:0x2100], bytes(range(256)))
+        self.assertEqual(self._sim.agent_runs, 1)
+        self.assertEqual(agent.pending, 0)
+
+    def test_loaded_once(self):
+        """test code is written only if it is not in window"""
+        loads = []
+        self._swd.write_mem = lambda address, data: loads.append(
+            address) or swd.Swd.write_mem(self._swd, address, data)
+        self._agent.is_erased(0x20003000, 64, 0)
+        self.assertEqual(self._agent.run(), [True])
+        self._agent.copy(0x20003000, 0x20001000, 16)
+        self.assertEqual(self._agent.run(), [None])
+        self.assertEqual(self._agent.run(), [])
+        self.assertEqual(loads.count(0x20000000), 1)
+        self.assertEqual(self._sim.agent_runs, 2)
+
+    def test_overwritten(self):
+        """test code overwritten by other stub is loaded again"""
+        self._agent.is_erased(0x20003000, 64, 0)
+        self.assertEqual(self._agent.run(), [True])
+        self._sim.on_run = run_stub
+        swd.stub.crc32(self._swd, 0x20001000, 256)
+        self._sim.on_run = run_agent
+        self._agent.is_erased(0x20003000, 64, 0)
+        self.assertEqual(self._agent.run(), [True])
+        self.assertEqual(self._sim.agent_runs, 2)
+
+    def test_window_full(self):
+        """test operations which do not fit into window"""
+        agent = swd.agent.Agent(self._swd, size=0x100)
+        with self.assertRaises(swd.agent.AgentError):
+            agent.find(0x20001000, 256, bytes(0x80))
+        with self.assertRaises(swd.agent.AgentError):
+            for _ in range(16):
+                agent.is_erased(0x20001000, 16)
+        self.assertEqual(agent.pending, 6)
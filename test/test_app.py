@@ -0,0 +1,207 @@
+"""Unit tests for _app.py
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+import swd._app
+import swd.stlink.sim
+
+
+class SimApplication(swd._app.Application):
+    """Application connected to simulated ST-Link"""
+
+    def __init__(self, args, sim):
+        super().__init__(args)
+        self._sim = sim
+        self.connects = 0
+
+    def _create_usb(self):
+        self.connects += 1
+        return self._sim
+
+
+class TestReadScript(unittest.TestCase):
+    """Tests for parsing of script"""
+
+    def test_read_script(self):
+        """test actions separated by lines and white spaces"""
+        lines = [
+            "# setup\n",
+            "set32:0x20000000:1 set32:0x20000004:2\n",
+            "\n",
+            "  dump32:0x20000000  # check\n"]
+        self.assertEqual(list(swd._app.read_script(lines)), [
+            'set32:0x20000000:1', 'set32:0x20000004:2',
+            'dump32:0x20000000'])
+
+
+class TestScript(unittest.TestCase):
+    """Tests for processing of script in one session"""
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._sim = swd.stlink.sim.StlinkSim()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _run(self, argv, script):
+        path = os.path.join(self._dir, 'script.txt')
+        with open(path, 'w') as script_file:
+            script_file.write(script)
+        args = swd._app._configure_argparse(
+            ['-q', '--script', path] + argv)
+        app = SimApplication(args, self._sim)
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            ret = app.start()
+        return ret, stdout.getvalue()
+
+    def test_pipelined_set32(self):
+        """test consecutive set32 are pipelined"""
+        script = ''.join(
+            f'set32:{0x20000000 + 4 * i:#x}:{i}\n' for i in range(100))
+        script += 'dump32:0x20000000:16\n'
+        ret, output = self._run(
+            ['--pipeline', '4', 'set32:0x20000200:0xaa'], script)
+        self.assertEqual(ret, 0)
+        self.assertEqual(self._sim.pipeline_depth, 4)
+        self.assertEqual(
+            self._sim.read_memory(0x20000000, 400)[0],
+            b''.join(i.to_bytes(4, 'little') for i in range(100)))
+        self.assertEqual(
+            self._sim.read_memory(0x20000200, 4)[0], b'\xaa\x00\x00\x00')
+        self.assertEqual(
+            output,
+            '20000000  00000000 00000001 00000002 00000003  '
+            '................\n')
+        # without pipelining 101 set32 takes at least 101 transactions
+        self.assertLess(
+            self._sim.elapsed, 101 * self._sim.transaction_time)
+
+    def test_set32_without_pipeline(self):
+        """test set32 are sent one by one without --pipeline"""
+        script = ''.join(
+            f'set32:{0x20000000 + 4 * i:#x}:{i}\n' for i in range(100))
+        ret, _ = self._run([], script)
+        self.assertEqual(ret, 0)
+        self.assertEqual(
+            self._sim.read_memory(0x20000000, 400)[0],
+            b''.join(i.to_bytes(4, 'little') for i in range(100)))
+        self.assertGreaterEqual(
+            self._sim.elapsed, 100 * self._sim.transaction_time)
+
+    def test_wrong_pipeline(self):
+        """test pipeline depth must be at least 1"""
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                swd._app._configure_argparse(['--pipeline', '0'])
+
+    def test_error(self):
+        """test error stops script"""
+        ret, _ = self._run([], 'set32:0x20000000:1\nunknown\nhalt\n')
+        self.assertEqual(ret, 1)
+        self.assertEqual(
+            self._sim.read_memory(0x20000000, 4)[0], b'\x01\x00\x00\x00')
+        self.assertFalse(self._sim.halted)
+
+
+class TestReadAction(unittest.TestCase):
+    """Tests for reading memory into file"""
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'dump.bin')
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._sram = self._sim.find_region(self._sim.SRAM_ADDRESS)
+        self._sram.data[:] = os.urandom(self._sram.size)
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _run(self, actions):
+        args = swd._app._configure_argparse(['-q'] + actions)
+        return SimApplication(args, self._sim).start()
+
+    def _file_data(self):
+        with open(self._path, 'rb') as dump:
+            return dump.read()
+
+    def test_read_sram(self):
+        """test reading of whole SRAM without size"""
+        self.assertEqual(self._run([f'read:sram:{self._path}']), 0)
+        self.assertEqual(self._file_data(), self._sram.data)
+
+    def test_read_offset(self):
+        """test continue of reading from offset"""
+        with open(self._path, 'wb') as dump:
+            dump.write(self._sram.data[:0x80] + bytes(0x10))
+        self.assertEqual(
+            self._run([f'read:0x20000000:0x100:{self._path}:0x80']), 0)
+        self.assertEqual(self._file_data(), self._sram.data[:0x100])
+
+    def test_write_sram(self):
+        """test writing of binary file into SRAM"""
+        data = os.urandom(0x200)
+        with open(self._path, 'wb') as image:
+            image.write(data)
+        self.assertEqual(self._run([f'write:sram:{self._path}']), 0)
+        self.assertEqual(self._sram.data[:0x200], data)
+
+
+class TestFormatBuffer(unittest.TestCase):
+    """Tests for hex dump formatting"""
+
+    @staticmethod
+    def _reference(addr, data, hex_line):
+        """Dump formatted line by line by hex_line and ascii_line"""
+        lines = []
+        prev_chunk = None
+        same_chunk = False
+        for chunk in swd._app.chunks(data, 16):
+            if prev_chunk != chunk:
+                lines.append('%08x  %s  %s\n' % (
+                    addr, hex_line(chunk), swd._app.ascii_line(chunk)))
+                prev_chunk = chunk
+                same_chunk = False
+            elif not same_chunk:
+                lines.append('*\n')
+                same_chunk = True
+            addr += len(chunk)
+        if same_chunk:
+            lines.append('%08x\n' % addr)
+        return ''.join(lines)
+
+    def test_lines(self):
+        """test format of full and partial lines"""
+        data = b'Hello\x00\x01\x7f' + bytes(range(0x80, 0x8a))
+        self.assertEqual(
+            ''.join(swd._app.format_buffer(
+                0x20000000, data, swd._app.hex_line32)),
+            '20000000  6c6c6548 7f01006f 83828180 87868584  '
+            'Hello...........\n'
+            '20000010  00008988                             ..\n')
+
+    def test_same_as_reference(self):
+        """test output is same as formatting line by line"""
+        data = bytes(range(256)) * 2 + bytes(100) + b'\x01' * 7
+        for hex_line in (
+                swd._app.hex_line8, swd._app.hex_line16,
+                swd._app.hex_line32):
+            for size in (0, 5, 16, 40, len(data)):
+                self.assertEqual(
+                    ''.join(swd._app.format_buffer(
+                        0x08000003, data[:size], hex_line)),
+                    self._reference(0x08000003, data[:size], hex_line))
+
+    def test_progress(self):
+        """test addresses of collapsed lines aligned to 4KiB"""
+        lines = list(swd._app.format_buffer(0x20000ff0, bytes(0x2020)))
+        self.assertEqual(lines, [
+            '20000ff0  00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00  '
+            '................\n',
+            '*\n', 0x20002000, 0x20003000, '20003010\n'])
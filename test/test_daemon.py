@@ -0,0 +1,86 @@
+"""Unit tests for _daemon.py
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import swd._app
+import swd._daemon
+import swd.stlink.sim
+from test.test_app import SimApplication
+
+
+class TestDaemon(unittest.TestCase):
+    """Tests for daemon serving actions from clients"""
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._socket = os.path.join(self._dir, 'pyswd.sock')
+        self._sim = swd.stlink.sim.StlinkSim()
+        args = swd._app._configure_argparse(
+            ['-q', '--daemon', '--socket', self._socket])
+        self._app = SimApplication(args, self._sim)
+        # serve directly, to know when socket is listening
+        ready = threading.Event()
+        self._app._serve = lambda: swd._daemon.serve(
+            self._socket, self._app._handle_request, ready=ready.set)
+        self._thread = threading.Thread(target=self._app.start)
+        self._thread.start()
+        ready.wait(5)
+
+    def tearDown(self):
+        if self._thread.is_alive():
+            self._request({'stop': True})
+        self._thread.join(5)
+        shutil.rmtree(self._dir)
+
+    def _request(self, message):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        code = swd._daemon.request(self._socket, message, stdout, stderr)
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_actions(self):
+        """test actions of more clients use one session"""
+        code, out, _ = self._request({
+            'actions': ['set32:0x20000000:0x12345678'], 'info': -1})
+        self.assertEqual((code, out), (0, ''))
+        code, out, _ = self._request({
+            'actions': ['dump32:0x20000000'], 'info': -1})
+        self.assertEqual((code, out), (0, '20000000: 12345678\n'))
+        self.assertEqual(self._app.connects, 1)
+
+    def test_error(self):
+        """test error is returned to client and daemon keep running"""
+        code, _, err = self._request({'actions': ['unknown'], 'info': -1})
+        self.assertEqual(code, 1)
+        self.assertIn("action 'unknown' is not implemented", err)
+        code, _, _ = self._request({'actions': ['halt'], 'info': -1})
+        self.assertEqual(code, 0)
+
+    def test_cwd(self):
+        """test relative path is resolved in directory of client"""
+        self._sim.find_region(0x20000000).data[:4] = b'\x01\x02\x03\x04'
+        cwd = os.getcwd()
+        code, _, _ = self._request({
+            'actions': ['read:0x20000000:4:data.bin'], 'info': -1,
+            'cwd': self._dir})
+        self.assertEqual(code, 0)
+        self.assertEqual(os.getcwd(), cwd)
+        with open(os.path.join(self._dir, 'data.bin'), 'rb') as data:
+            self.assertEqual(data.read(), b'\x01\x02\x03\x04')
+
+    def test_stop(self):
+        """test stop request"""
+        self.assertEqual(self._request({'stop': True})[0], 0)
+        self._thread.join(5)
+        self.assertFalse(os.path.exists(self._socket))
+        with self.assertRaises(swd._daemon.DaemonError):
+            self._request({'actions': []})
+
+    def test_already_running(self):
+        """test second daemon on same socket"""
+        with self.assertRaises(swd._daemon.DaemonError):
+            swd._daemon.serve(self._socket, None)
@@ -0,0 +1,343 @@
+"""Unit tests for flash.py
+"""
+
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import unittest.mock
+import swd
+import swd.cortexm
+import swd.flash
+import swd.image
+import swd.stlink
+import swd.stlink.sim
+import swd._app
+from test.test_app import SimApplication
+from test.test_stub import run_stub
+
+_FLASH = swd.flash.FLASH_ADDRESS
+_SRAM = swd.flash.SRAM_ADDRESS
+_FLASH_SIZE = 64 * 1024
+_PAGE_SIZE = 1024
+_REGISTERS = 0x40022000
+_SR = _REGISTERS + 0x0c
+_CR = _REGISTERS + 0x10
+
+
+class _F1Sim(swd.stlink.sim.StlinkSim):
+    """Simulated STM32F103 medium density with FLASH controller"""
+
+    def __init__(self):
+        system = bytearray(0x800)
+        struct.pack_into('<H', system, 0x7e0, _FLASH_SIZE // 1024)
+        super().__init__(regions=[
+            swd.stlink.sim.SimRegion(
+                _FLASH, _FLASH_SIZE, 'FLASH', False, b'\xff' * _FLASH_SIZE),
+            swd.stlink.sim.SimRegion(_SRAM, 20 * 1024, 'SRAM'),
+            swd.stlink.sim.SimRegion(
+                0x1ffff000, 0x800, 'system', False, system),
+        ])
+        self.debug_registers[0xe0042000] = 0x20036410
+        self.flash = self.find_region(_FLASH)
+        self.cr = 0x80
+        self.ar = 0
+        self.keys = []
+        self.erased = []
+        self.loader_runs = 0
+        self.on_run = self._run_loader
+
+    def read_memory(self, address, size):
+        if _REGISTERS <= address < _REGISTERS + 0x400:
+            value = {_CR: self.cr, _SR: 0}.get(address, 0)
+            return value.to_bytes(4, 'little'), None
+        return super().read_memory(address, size)
+
+    def write_memory(self, address, data):
+        if not _REGISTERS <= address < _REGISTERS + 0x400:
+            return super().write_memory(address, data)
+        value = int.from_bytes(data, 'little')
+        if address == _REGISTERS + 0x04:
+            self.keys.append(value)
+            if self.keys[-2:] == [0x45670123, 0xcdef89ab]:
+                self.cr &= ~0x80
+        elif address == _REGISTERS + 0x14:
+            self.ar = value
+        elif address == _CR and not self.cr & 0x80:
+            self.cr = value
+            if value & 0x40 and value & 0x02:
+                offset = (self.ar - _FLASH) // _PAGE_SIZE * _PAGE_SIZE
+                self.flash.data[offset:offset + _PAGE_SIZE] = \
+                    b'\xff' * _PAGE_SIZE
+                self.erased.append(self.ar)
+            elif value & 0x40 and value & 0x04:
+                self.flash.data[:] = b'\xff' * _FLASH_SIZE
+                self.erased.append('all')
+        return None
+
+    def _run_loader(self, sim):
+        """Execute loader: program halfwords and stop on BKPT"""
+        if run_stub(sim):
+            return
+        source, destination, size, status, busy, errors = self.registers[:6]
+        assert self.registers[15] == _SRAM
+        assert status == _SR and busy == 0x01 and errors == 0x14
+        assert self.cr & 0x01
+        self.loader_runs += 1
+        data, _ = self.read_memory(source, size)
+        for offset in range(0, size, 2):
+            index = destination + offset - _FLASH
+            if self.flash.data[index:index + 2] != b'\xff\xff':
+                self.registers[0] = 0x04
+                self.registers[1] = destination + offset
+                break
+            self.flash.data[index:index + 2] = data[offset:offset + 2]
+        else:
+            self.registers[0] = 0
+        self.halted = True
+
+
+class TestFlash(unittest.TestCase):
+    """Tests for FLASH programming of simulated STM32F1"""
+
+    def setUp(self):
+        self._sim = _F1Sim()
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+        self._cortexm = swd.CortexM(self._swd)
+        self._cortexm.halt()
+        self._flash = swd.flash.Flash(self._swd, self._cortexm)
+
+    def test_detect(self):
+        """test detection of device and its pages"""
+        self.assertEqual(self._flash.dev_id, 0x410)
+        self.assertEqual(self._flash.family.name, 'STM32F1')
+        self.assertEqual(self._flash.size, _FLASH_SIZE)
+        self.assertEqual(len(self._flash.blocks), 64)
+        self.assertEqual(
+            self._flash.blocks_in(0x080003ff, 2),
+            [swd.flash.Block(0x08000000, 1024, 0, 1),
+             swd.flash.Block(0x08000400, 1024, 1, 1)])
+
+    def test_program(self):
+        """test erase and programming through two buffers"""
+        self._sim.flash.data[:] = bytes(_FLASH_SIZE)
+        data = os.urandom(10000)
+        self._flash.erase(0x08000001, 10000)
+        self.assertEqual(
+            self._sim.erased, [0x08000000 + i * 1024 for i in range(10)])
+        self._flash.program(0x08000001, data)
+        self.assertEqual(self._sim.flash.data[1:10001], data)
+        self.assertEqual(self._sim.flash.data[0], 0xff)
+        self.assertEqual(self._sim.flash.data[10001], 0xff)
+        self.assertEqual(self._sim.loader_runs, 3)
+        self.assertTrue(self._sim.cr & 0x80)
+
+    def test_program_error(self):
+        """test programming of not erased FLASH"""
+        self._sim.flash.data[0x100:0x102] = b'\x00\x00'
+        with self.assertRaises(swd.flash.FlashError) as context:
+            self._flash.program(0x08000000, bytes(0x200))
+        self.assertIn('0x08000100', str(context.exception))
+        self.assertTrue(self._sim.cr & 0x80)
+
+    def test_program_image(self):
+        """test only pages under segments are erased"""
+        self._flash.program_image([
+            swd.image.Segment(0x08000000, b'\x01' * 8),
+            swd.image.Segment(0x08002000, b'\x02' * 2048)])
+        self.assertEqual(
+            self._sim.erased, [0x08000000, 0x08002000, 0x08002400])
+        self.assertEqual(self._sim.flash.data[0x2000:0x2800], b'\x02' * 2048)
+
+    def test_update_image(self):
+        """test only changed pages are erased and programmed"""
+        old = os.urandom(8192)
+        self._flash.program(0x08000000, old)
+        new = bytearray(old)
+        new[0x0500] ^= 0xff
+        new[0x0c00:0x1400] = os.urandom(0x800)
+        new[0x1ffe] ^= 0xff
+        self._sim.loader_runs = 0
+        changed = self._flash.update_image([swd.image.Segment(0x08000000, new)])
+        self.assertEqual(
+            [block.address for block in changed],
+            [0x08000400, 0x08000c00, 0x08001000, 0x08001c00])
+        self.assertEqual(self._sim.erased, [block.address for block in changed])
+        self.assertEqual(self._sim.flash.data[:8192], new)
+        self.assertEqual(self._sim.stub_runs, 8)
+        # adjacent pages are programmed by one call
+        self.assertEqual(self._sim.loader_runs, 3)
+        self.assertEqual(
+            self._flash.update_image([swd.image.Segment(0x08000000, new)]), [])
+
+    def test_erase_all(self):
+        """test mass erase"""
+        self._sim.flash.data[:] = bytes(_FLASH_SIZE)
+        self._flash.erase_all()
+        self.assertEqual(self._sim.erased, ['all'])
+        self.assertEqual(self._sim.flash.data, b'\xff' * _FLASH_SIZE)
+
+    def test_buffer_size(self):
+        """test buffers fit into SRAM of device"""
+        self.assertEqual(self._flash.buffer_size, 4096)
+        # STM32F1 low density has 4 KB of SRAM
+        self._sim.debug_registers[0xe0042000] = 0x20036412
+        flash = swd.flash.Flash(self._swd, self._cortexm)
+        self.assertEqual(flash.buffer_size, 2016)
+        flash = swd.flash.Flash(self._swd, self._cortexm, buffer_size=4096)
+        with self.assertRaises(swd.flash.FlashError):
+            flash.program(0x08000000, bytes(16))
+
+    def test_out_of_flash(self):
+        """test area out of FLASH"""
+        with self.assertRaises(swd.flash.FlashError):
+            self._flash.program(0x0800fffe, bytes(4))
+
+
+class TestFlashBlocks(unittest.TestCase):
+    """Tests for pages and sectors of devices"""
+
+    def test_f4_dual_bank(self):
+        """test sectors of 2MB STM32F42x in two banks"""
+        blocks = swd.flash.flash_blocks(
+            swd.flash.DEVICES[0x419], 2048 * 1024)
+        self.assertEqual(len(blocks), 24)
+        self.assertEqual(blocks[4], swd.flash.Block(0x08010000, 65536, 4, 1))
+        self.assertEqual(blocks[12], swd.flash.Block(0x08100000, 16384, 0, 2))
+
+    def test_f4_single_bank(self):
+        """test sectors of 1MB STM32F42x"""
+        blocks = swd.flash.flash_blocks(
+            swd.flash.DEVICES[0x419], 1024 * 1024)
+        self.assertEqual(len(blocks), 12)
+        self.assertEqual(blocks[-1], swd.flash.Block(0x080e0000, 131072, 11, 1))
+
+    def test_loader_size(self):
+        """test that loaders fit before buffers"""
+        for unit in (2, 4, 8):
+            self.assertLessEqual(
+                len(swd.flash.loader_code(unit)), swd.flash._LOADER_SIZE)
+
+
+class _RegistersSwd:
+    """Swd replacement which records writes of FLASH registers"""
+
+    def __init__(self, dev_id, size_kb):
+        self._dev_id = dev_id
+        self._size_kb = size_kb
+        self.writes = []
+
+    def get_mem32(self, address):
+        return self._dev_id if address == 0xe0042000 else 0
+
+    def read_mem_bytes(self, address, size):
+        return self._size_kb.to_bytes(size, 'little')
+
+    def set_mem32(self, address, value):
+        self.writes.append((address, value))
+
+
+class TestEraseCommands(unittest.TestCase):
+    """Tests for erase commands of sector and page controllers"""
+
+    def _erase(self, dev_id, size_kb, address):
+        dev = _RegistersSwd(dev_id, size_kb)
+        swd.flash.Flash(dev, cortexm=object()).erase(address, 1)
+        return dev.writes
+
+    def test_f4_bank2_sector(self):
+        """test sector number in second bank of STM32F42x"""
+        writes = self._erase(0x419, 2048, 0x08104000)
+        self.assertIn((0x40023c10, 0x200 | 0x02 | (17 << 3)), writes)
+        self.assertIn((0x40023c10, 0x10200 | 0x02 | (17 << 3)), writes)
+
+    def test_g4_bank2_page(self):
+        """test BKER bit for page in second bank of STM32G47x"""
+        writes = self._erase(0x469, 512, 0x08040800)
+        self.assertIn((0x40022014, 0x802 | (1 << 3)), writes)
+        self.assertEqual(writes[-1], (0x40022014, 0x80000000))
+
+
+class TestCall(unittest.TestCase):
+    """Tests for calling of functions on target"""
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._cortexm = swd.CortexM(
+            swd.Swd(driver=swd.stlink.Stlink(usb=self._sim)))
+        self._cortexm.halt()
+
+    def test_call(self):
+        """test registers of call and returned R0"""
+        def on_run(sim):
+            # interrupts are masked while function is running
+            self.assertTrue(sim.debug_registers[0xe000edf0] & 0x8)
+            sim.registers[0] = sim.registers[0] + sim.registers[1]
+            sim.halted = True
+        self._sim.on_run = on_run
+        self.assertEqual(
+            self._cortexm.call(0x20000001, (2, 3), stack=0x20001000), 5)
+        self.assertFalse(self._sim.debug_registers[0xe000edf0] & 0x8)
+        self.assertEqual(self._sim.registers[13], 0x20001000)
+        self.assertEqual(self._sim.registers[15], 0x20000000)
+        self.assertEqual(self._sim.registers[16], 0x01000000)
+
+    def test_timeout(self):
+        """test core is halted after timeout"""
+        with self.assertRaises(swd.cortexm.CortexMException):
+            self._cortexm.call(0x20000000, timeout=0.01)
+        self.assertTrue(self._sim.halted)
+
+
+class TestFlashAction(unittest.TestCase):
+    """Tests for flash action of application"""
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._sim = _F1Sim()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _run(self, actions):
+        args = swd._app._configure_argparse(['-q'] + actions)
+        return SimApplication(args, self._sim).start()
+
+    def test_flash_binary(self):
+        """test erase and programming of binary file"""
+        data = os.urandom(3000)
+        path = os.path.join(self._dir, 'image.bin')
+        with open(path, 'wb') as image:
+            image.write(data)
+        self.assertEqual(self._run([f'flash:0x08000400:{path}']), 0)
+        self.assertEqual(self._sim.flash.data[0x400:0x400 + 3000], data)
+        self.assertEqual(
+            self._sim.erased, [0x08000400, 0x08000800, 0x08000c00])
+
+    def test_update(self):
+        """test update of changed pages"""
+        path = os.path.join(self._dir, 'image.bin')
+        with open(path, 'wb') as image:
+            image.write(b'\x01' * 2048)
+        self._sim.flash.data[:2048] = b'\x01' * 1024 + b'\x02' * 1024
+        self.assertEqual(self._run([f'flash:update:0x08000000:{path}']), 0)
+        self.assertEqual(self._sim.erased, [0x08000400])
+        self.assertEqual(self._sim.flash.data[:2048], b'\x01' * 2048)
+
+    def test_loader_timeout(self):
+        """test error message when loader does not halt"""
+        self._sim.on_run = lambda sim: None
+        path = os.path.join(self._dir, 'image.bin')
+        with open(path, 'wb') as image:
+            image.write(bytes(16))
+        with unittest.mock.patch('sys.stderr', new=io.StringIO()) as err:
+            self.assertEqual(self._run([f'flash:0x08000000:{path}']), 1)
+        self.assertIn(
+            "CortexM error: Timeout while waiting for halt", err.getvalue())
+
+    def test_erase(self):
+        """test mass erase"""
+        self.assertEqual(self._run(['flash:erase']), 0)
+        self.assertEqual(self._sim.erased, ['all'])
@@ -0,0 +1,158 @@
+"""Unit tests for image.py
+"""
+
+import os
+import struct
+import shutil
+import tempfile
+import unittest
+import swd
+import swd.image
+import swd.stlink
+import swd.stlink.sim
+import swd.stlink.stats
+
+
+def _hex_record(record_type, offset, data):
+    record = bytes([len(data)]) + offset.to_bytes(2, 'big')
+    record += bytes([record_type]) + data
+    return ':%s%02X\n' % (record.hex().upper(), -sum(record) & 0xff)
+
+
+def _hex_lines(address, data, record_size=16):
+    lines = [_hex_record(0x04, 0, (address >> 16).to_bytes(2, 'big'))]
+    for offset in range(0, len(data), record_size):
+        lines.append(_hex_record(
+            0x00, (address + offset) & 0xffff,
+            data[offset:offset + record_size]))
+    lines.append(_hex_record(0x01, 0, b''))
+    return lines
+
+
+def _srec_line(record_type, address, data):
+    address_size = {'0': 2, '3': 4, '7': 4}[record_type]
+    record = bytes([address_size + len(data) + 1])
+    record += address.to_bytes(address_size, 'big') + data
+    return 'S%s%s%02X\n' % (
+        record_type, record.hex().upper(), ~sum(record) & 0xff)
+
+
+def _elf(segments):
+    """ELF32 little endian file with PT_LOAD segments (paddr, data)"""
+    phoff = 52
+    offset = phoff + 32 * len(segments)
+    headers = b''
+    contents = b''
+    for paddr, data in segments:
+        headers += struct.pack(
+            '<LLLLLLLL', 1, offset + len(contents), paddr + 0x10000000,
+            paddr, len(data), len(data), 5, 4)
+        contents += data
+    header = struct.pack(
+        '<16sHHLLLLLHHHHHH', b'\x7fELF\x01\x01\x01', 2, 40, 1, 0,
+        phoff, 0, 0, 52, 32, len(segments), 40, 0, 0)
+    return header + headers + contents
+
+
+class TestParse(unittest.TestCase):
+    """Tests for parsing of image formats"""
+
+    def test_hex(self):
+        """test Intel HEX with extended linear address"""
+        data = bytes(range(40))
+        records = swd.image.parse_hex(_hex_lines(0x08010000, data))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0], (0x08010000, data[:16]))
+        self.assertEqual(records[2], (0x08010020, data[32:]))
+
+    def test_hex_checksum(self):
+        """test wrong checksum of HEX record"""
+        line = _hex_lines(0x08000000, b'\x01\x02')[1]
+        with self.assertRaises(swd.image.ImageError):
+            swd.image.parse_hex([line[:-3] + '00\n'])
+
+    def test_srec(self):
+        """test S-records with header and start address"""
+        lines = [
+            _srec_line('0', 0, b'test'),
+            _srec_line('3', 0x20000000, b'\x01\x02\x03\x04'),
+            _srec_line('7', 0x20000000, b''),
+        ]
+        self.assertEqual(
+            swd.image.parse_srec(lines),
+            [(0x20000000, b'\x01\x02\x03\x04')])
+        with self.assertRaises(swd.image.ImageError):
+            swd.image.parse_srec([lines[1].replace('01', '11')])
+
+    def test_elf(self):
+        """test loadable segments of ELF are at physical address"""
+        records = swd.image.parse_elf(_elf([
+            (0x08000000, b'\x11' * 8), (0x08000100, b'\x22' * 4)]))
+        self.assertEqual(records, [
+            (0x08000000, b'\x11' * 8), (0x08000100, b'\x22' * 4)])
+        with self.assertRaises(swd.image.ImageError):
+            swd.image.parse_elf(_elf([(0x08000000, b'\x11')])[:60])
+
+
+class TestCoalesce(unittest.TestCase):
+    """Tests for merging of records into segments"""
+
+    def test_merge(self):
+        """test sorting, merging and filling of small gaps"""
+        segments = swd.image.coalesce([
+            (0x20000010, b'\x02' * 16),
+            (0x20000000, b'\x01' * 16),
+            (0x20000024, b'\x03' * 4),
+            (0x20001000, b'\x04' * 4),
+        ], gap=16)
+        self.assertEqual(segments, [
+            swd.image.Segment(
+                0x20000000,
+                b'\x01' * 16 + b'\x02' * 16 + b'\xff' * 4 + b'\x03' * 4),
+            swd.image.Segment(0x20001000, b'\x04' * 4),
+        ])
+
+    def test_overlap(self):
+        """test error of overlapping records"""
+        with self.assertRaises(swd.image.ImageError):
+            swd.image.coalesce([(0x100, b'\x00' * 8), (0x104, b'\x00')])
+
+
+class TestWriteImage(unittest.TestCase):
+    """Tests for writing of image files"""
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _file(self, name, content):
+        path = os.path.join(self._dir, name)
+        with open(path, 'w' if isinstance(content, str) else 'wb') as file:
+            file.write(content)
+        return path
+
+    def test_hex(self):
+        """test HEX with 16 byte records is written by few transfers"""
+        data = os.urandom(4096)
+        path = self._file('image.hex', ''.join(_hex_lines(0x20000000, data)))
+        segments = swd.image.load(path)
+        self.assertEqual(len(segments), 1)
+        stats = swd.stlink.stats.StlinkStats()
+        self._swd.driver.stats = stats
+        swd.image.write_image(self._swd, segments)
+        self.assertEqual(self._sim.read_memory(0x20000000, 4096)[0], data)
+        commands = stats.snapshot()['commands']
+        self.assertEqual(commands['DEBUG.WRITE_MEM_32BIT']['count'], 1)
+
+    def test_binary(self):
+        """test binary file needs address"""
+        path = self._file('image.bin', b'\x00\x01\x02\x03')
+        with self.assertRaises(swd.image.ImageError):
+            swd.image.load(path)
+        self.assertEqual(
+            swd.image.load(path, 0x20000100),
+            [swd.image.Segment(0x20000100, b'\x00\x01\x02\x03')])
@@ -0,0 +1,83 @@
+"""Unit tests for planner.py
+"""
+
+import unittest
+import swd.planner
+
+
+class TestPlanAccess(unittest.TestCase):
+    """Tests for plan_access()"""
+
+    _LIMITS = ((8, 64), (32, 1024))
+
+    def _plan(self, address, size, limits=_LIMITS):
+        return [
+            tuple(access)
+            for access in swd.planner.plan_access(address, size, limits)]
+
+    def test_empty(self):
+        """test nothing to access"""
+        self.assertEqual(self._plan(0x20000001, 0), [])
+
+    def test_aligned(self):
+        """test aligned access is split by maximum size"""
+        self.assertEqual(self._plan(0x20000000, 2048), [
+            (32, 0x20000000, 1024),
+            (32, 0x20000400, 1024),
+        ])
+
+    def test_unaligned_head(self):
+        """test only unaligned head is accessed by 8 bit"""
+        self.assertEqual(self._plan(0x20000001, 1027), [
+            (8, 0x20000001, 3),
+            (32, 0x20000004, 1024),
+        ])
+
+    def test_small(self):
+        """test small unaligned access is one 8 bit access"""
+        self.assertEqual(self._plan(0x20000003, 10), [
+            (8, 0x20000003, 10),
+        ])
+
+    def test_merge_tail(self):
+        """test partial chunk is merged into tail if it saves access"""
+        self.assertEqual(self._plan(0x20000000, 1087), [
+            (32, 0x20000000, 1024),
+            (8, 0x20000400, 63),
+        ])
+
+    def test_merge_head_and_tail(self):
+        """test partial chunk is split between head and tail"""
+        self.assertEqual(self._plan(0x20000001, 1150), [
+            (8, 0x20000001, 63),
+            (32, 0x20000040, 1024),
+            (8, 0x20000440, 63),
+        ])
+
+    def test_single_width(self):
+        """test one allowed width"""
+        self.assertEqual(self._plan(0x20000000, 100, ((16, 64),)), [
+            (16, 0x20000000, 64),
+            (16, 0x20000040, 36),
+        ])
+
+    def test_maximum_alignment(self):
+        """test maximum size is aligned to access width"""
+        self.assertEqual(self._plan(0x20000000, 12, ((32, 6),)), [
+            (32, 0x20000000, 4),
+            (32, 0x20000004, 4),
+            (32, 0x20000008, 4),
+        ])
+
+    def test_no_width(self):
+        """test no allowed width"""
+        with self.assertRaises(ValueError):
+            swd.planner.plan_access(0x20000000, 4, ())
+
+    def test_unsupported_widths(self):
+        """test widths without 8 bit for head and tail or with middle width"""
+        with self.assertRaises(ValueError):
+            swd.planner.plan_access(0x20000001, 7, ((16, 64), (32, 1024)))
+        with self.assertRaises(ValueError):
+            swd.planner.plan_access(
+                0x20000001, 7, ((8, 64), (16, 64), (32, 1024)))
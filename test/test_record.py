@@ -0,0 +1,61 @@
+"""Unit tests for stlink/record.py
+"""
+
+import io
+import unittest
+import swd
+import swd.stlink
+import swd.stlink.record
+import swd.stlink.sim
+
+
+class TestRecordReplay(unittest.TestCase):
+    """Tests for recording and replaying of session"""
+
+    @staticmethod
+    def _session(usb):
+        dev = swd.Swd(driver=swd.stlink.Stlink(usb=usb))
+        dev.write_mem(0x20000001, bytes(range(200)))
+        data = dev.read_mem_bytes(0x20000000, 256)
+        return dev.get_idcode(), data
+
+    def _record(self, pipeline_depth=1):
+        sim = swd.stlink.sim.StlinkSim()
+        sim.pipeline_depth = pipeline_depth
+        trace = io.BytesIO()
+        recorder = swd.stlink.record.StlinkRecorder(sim, trace)
+        result = self._session(recorder)
+        recorder.close()
+        trace.seek(0)
+        return trace, result
+
+    def test_replay(self):
+        """test replayed session returns same data"""
+        trace, result = self._record()
+        replay = swd.stlink.record.StlinkReplay(trace)
+        self.assertEqual(replay.dev_name, 'V2')
+        self.assertEqual(self._session(replay), result)
+        self.assertEqual(replay.remaining, 0)
+        self.assertGreater(replay.recorded_time, 0)
+
+    def test_replay_pipeline(self):
+        """test replay of pipelined session"""
+        trace, result = self._record(pipeline_depth=4)
+        replay = swd.stlink.record.StlinkReplay(trace)
+        replay.pipeline_depth = 4
+        self.assertEqual(self._session(replay), result)
+        self.assertEqual(replay.remaining, 0)
+
+    def test_mismatch(self):
+        """test different command is detected"""
+        trace, _ = self._record()
+        replay = swd.stlink.record.StlinkReplay(trace)
+        dev = swd.Swd(driver=swd.stlink.Stlink(usb=replay))
+        with self.assertRaises(swd.stlink.record.ReplayError):
+            dev.write_mem(0x20000002, bytes(range(200)))
+
+    def test_truncated(self):
+        """test truncated trace file"""
+        trace, _ = self._record()
+        with self.assertRaises(swd.stlink.record.ReplayError):
+            swd.stlink.record.read_trace(io.BytesIO(trace.read()[:-1]))
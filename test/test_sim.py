@@ -0,0 +1,128 @@
+"""Unit tests for stlink/sim.py
+"""
+
+import unittest
+import swd
+import swd.stlink
+import swd.stlink.sim
+
+
+class _TestSim(unittest.TestCase):
+    """Base class for testing whole stack with simulated ST-Link"""
+
+    _DEV_NAME = 'V2'
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim(dev_name=self._DEV_NAME)
+        self._stlink = swd.stlink.Stlink(usb=self._sim)
+        self._swd = swd.Swd(driver=self._stlink)
+
+
+class TestSimConnect(_TestSim):
+    """Tests for connecting to simulated ST-Link"""
+
+    def test_version(self):
+        """test version and IDCODE"""
+        self.assertEqual(self._swd.get_version().str, 'ST-Link/V2 V2J35S7')
+        self.assertEqual(self._swd.get_idcode(), 0x1ba01477)
+        self.assertEqual(self._swd.get_target_voltage(), 3.3)
+
+    def test_v3(self):
+        """test ST-Link/V3"""
+        sim = swd.stlink.sim.StlinkSim(dev_name='V3', jtag=7)
+        stlink = swd.stlink.Stlink(usb=sim, swd_frequency=1000000)
+        self.assertEqual(stlink.get_version().major, 3)
+        self.assertEqual(stlink.maximum_8bit_data, 512)
+        self.assertEqual(sim.com_freq_khz, 1000)
+
+
+class TestSimMemory(_TestSim):
+    """Tests for memory access"""
+
+    def test_read_write(self):
+        """test unaligned write and read back"""
+        data = bytes(i & 0xff for i in range(3001))
+        self._swd.write_mem(0x20000003, data)
+        self.assertEqual(self._swd.read_mem_bytes(0x20000003, 3001), data)
+        region = self._sim.find_region(0x20000000)
+        self.assertEqual(region.data[3:3004], data)
+
+    def test_mem32(self):
+        """test 32 bit register access"""
+        self._swd.set_mem32(0x20000100, 0x12345678)
+        self.assertEqual(self._swd.get_mem32(0x20000100), 0x12345678)
+        self.assertEqual(
+            list(self._swd.read_mem8(0x20000100, 4)), [0x78, 0x56, 0x34, 0x12])
+
+    def test_unmapped(self):
+        """test reading unmapped memory"""
+        with self.assertRaises(swd.stlink.StlinkRwException) as context:
+            self._swd.read_mem_bytes(0x20004ff0, 32)
+        self.assertEqual(context.exception.fault_address, 0x20005000)
+
+    def test_readonly(self):
+        """test writing into flash"""
+        with self.assertRaises(swd.stlink.StlinkRwException):
+            self._swd.write_mem32(0x08000000, bytes(4))
+
+    def test_inject_fault(self):
+        """test injected fault is reported with address"""
+        self._sim.inject_fault(
+            swd.stlink.com.StlinkCom.STATUS.SWD_AP_WAIT, address=0x20000010)
+        with self.assertRaises(swd.stlink.StlinkRwException) as context:
+            self._swd.read_mem_bytes(0x20000000, 64)
+        self.assertEqual(context.exception.fault_address, 0x20000010)
+        self.assertEqual(str(context.exception), 'AP wait at address: 0x20000010')
+        self._swd.read_mem_bytes(0x20000000, 64)
+
+    def test_pipeline(self):
+        """test pipelined reads save simulated time"""
+        self._sim.find_region(0x20000000).data[:] = bytes(
+            i & 0xff for i in range(20 * 1024))
+        elapsed = self._sim.elapsed
+        transactions = self._sim.transactions
+        data = self._swd.read_mem_bytes(0x20000000, 20 * 1024)
+        sequential = self._sim.elapsed - elapsed
+        sequential_transactions = self._sim.transactions - transactions
+        self._sim.pipeline_depth = 4
+        elapsed = self._sim.elapsed
+        transactions = self._sim.transactions
+        self.assertEqual(self._swd.read_mem_bytes(0x20000000, 20 * 1024), data)
+        self.assertLess(self._sim.elapsed - elapsed, sequential)
+        # 4 reads and status check by 2 pipelined transactions
+        self.assertEqual(self._sim.transactions - transactions, 2)
+        self.assertLess(2, sequential_transactions)
+
+
+class TestSimCore(_TestSim):
+    """Tests for simulated Cortex-M core"""
+
+    def test_halt_run(self):
+        """test halting and resuming of core"""
+        cortexm = swd.CortexM(self._swd)
+        runs = []
+        self._sim.on_run = runs.append
+        self.assertFalse(cortexm.is_halted())
+        cortexm.halt()
+        self.assertTrue(cortexm.is_halted())
+        cortexm.set_reg('R3', 0xcafe)
+        self.assertEqual(cortexm.get_reg('R3'), 0xcafe)
+        self.assertEqual(cortexm.get_reg_all()['R3'], 0xcafe)
+        cortexm.run()
+        self.assertFalse(cortexm.is_halted())
+        self.assertEqual(runs, [self._sim])
+
+    def test_dcrsr(self):
+        """test core register access by DCRSR and DCRDR"""
+        self._sim.registers[5] = 0x1234
+        self._swd.set_mem32(swd.CortexM.DCRSR_REG, 5)
+        self.assertEqual(self._swd.get_mem32(swd.CortexM.DCRDR_REG), 0x1234)
+
+    def test_reset_halt(self):
+        """test reset and halt loads vectors"""
+        flash = self._sim.find_region(0x08000000)
+        flash.data[:8] = bytes.fromhex('0050002045010008')
+        swd.CortexM(self._swd).reset_halt()
+        self.assertTrue(self._sim.halted)
+        self.assertEqual(self._sim.registers[13], 0x20005000)
+        self.assertEqual(self._sim.registers[15], 0x08000144)
@@ -0,0 +1,86 @@
+"""Unit tests for stlink/stats.py
+"""
+
+import unittest
+import swd
+import swd.stlink
+import swd.stlink.com
+import swd.stlink.sim
+import swd.stlink.stats
+
+_STATUS = swd.stlink.com.StlinkCom.STATUS
+
+
+class TestStlinkStats(unittest.TestCase):
+    """Tests for StlinkStats counters"""
+
+    def test_record(self):
+        """test counting of command, bytes and histogram"""
+        stats = swd.stlink.stats.StlinkStats()
+        stats.record(b'\xf2\x07' + bytes(14), None, bytes(64), 0.00015)
+        stats.record(b'\xf2\x07' + bytes(14), None, bytes(32), 0.003)
+        stats.record(b'\xf1' + bytes(15), None, bytes(6), 0.2)
+        snapshot = stats.snapshot()
+        read = snapshot['commands']['DEBUG.READ_MEM_32BIT']
+        self.assertEqual(read['count'], 2)
+        self.assertEqual(read['bytes_out'], 32)
+        self.assertEqual(read['bytes_in'], 96)
+        self.assertAlmostEqual(read['min'], 0.00015)
+        self.assertAlmostEqual(read['max'], 0.003)
+        self.assertEqual(read['histogram']['<=200us'], 1)
+        self.assertEqual(read['histogram']['<=5ms'], 1)
+        version = snapshot['commands']['GET_VERSION']
+        self.assertEqual(version['histogram']['>100ms'], 1)
+        self.assertEqual(snapshot['total']['count'], 3)
+        self.assertEqual(snapshot['total']['bytes_in'], 102)
+
+    def test_status_and_reset(self):
+        """test counting of statuses and reset"""
+        stats = swd.stlink.stats.StlinkStats()
+        stats.record_status(_STATUS.SWD_AP_FAULT)
+        stats.record_status(_STATUS.SWD_AP_FAULT)
+        stats.record_status(0x7f)
+        self.assertEqual(
+            stats.snapshot()['statuses'], {'SWD_AP_FAULT': 2, '0x7f': 1})
+        self.assertIn('status SWD_AP_FAULT: 2', stats.format())
+        stats.reset()
+        self.assertEqual(stats.snapshot()['commands'], {})
+        self.assertEqual(stats.snapshot()['statuses'], {})
+
+
+class TestStlinkStatsSim(unittest.TestCase):
+    """Tests for collecting statistics from simulated ST-Link"""
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+        self._stats = swd.stlink.stats.StlinkStats()
+        self._swd.driver.stats = self._stats
+        self._start = self._sim.elapsed
+
+    def test_transfers(self):
+        """test counting of memory transfers"""
+        self._swd.read_mem_bytes(0x20000000, 16)
+        self._swd.get_mem32(0x20000000)
+        commands = self._stats.snapshot()['commands']
+        self.assertEqual(commands['DEBUG.READ_MEM_32BIT']['count'], 1)
+        self.assertEqual(commands['DEBUG.READ_MEM_32BIT']['bytes_in'], 16)
+        self.assertEqual(commands['DEBUG.APIV2.READ_DEBUG_REG']['count'], 1)
+        self.assertAlmostEqual(
+            self._stats.snapshot()['total']['time'],
+            self._sim.elapsed - self._start)
+
+    def test_fault(self):
+        """test counting of error status"""
+        self._sim.inject_fault(_STATUS.SWD_AP_FAULT, address=0x20000000)
+        with self.assertRaises(swd.stlink.StlinkRwException):
+            self._swd.read_mem_bytes(0x20000000, 16)
+        self.assertEqual(
+            self._stats.snapshot()['statuses'], {'SWD_AP_FAULT': 1})
+
+    def test_disabled(self):
+        """test that nothing is collected without stats"""
+        self._swd.driver.stats = None
+        self._swd.read_mem_bytes(0x20000000, 16)
+        self.assertIsNone(self._sim.stats)
+        self.assertEqual(self._stats.snapshot()['total']['count'], 0)
@@ -1,8 +1,21 @@
 """Unit tests for stlink.py
 """
 
+import os
+import subprocess
+import sys
+import threading
 import unittest
+import swd
 import swd.stlink
+import swd.stlink.com
+import swd.stlink.sim
+import swd.stlink.usb
+
+
+def _cmd(data):
+    """Command padded to 16 bytes"""
+    return bytes(data).ljust(16, b'\x00')
 
 
 class FncMock():
@@ -46,11 +59,20 @@ class ComMock():
     def xfer(self, command, data=None, rx_length=0, tout=200):
         """Mock xfer"""
         return self.xfer_mock.fnc(
-            command=command,
+            command=bytes(command),
             data=data,
             rx_length=rx_length,
             tout=tout)
 
+    def xfer_into(self, command, rx_length, data=None, tout=200):
+        """Mock xfer_into"""
+        return self.xfer(command, data, rx_length, tout)
+
+    def xfer_pipeline(self, transfers, tout=200, buffered=False):
+        """Mock xfer_pipeline"""
+        for command, data, rx_length in transfers:
+            yield self.xfer(command, data, rx_length, tout)
+
 
 class _TestStlink(unittest.TestCase):
     """Base class for testing Stlink class"""
@@ -75,28 +97,75 @@ class TestStlinkCtor(_TestStlink):
         """test for creating Stlink object"""
         self.assertEqual(self._ctor_call_log, [
             {
-                'command': bytes([0xf1, 0x80]),
+                'command': _cmd([0xf1, 0x80]),
                 'data': None,
                 'rx_length': 6,
                 'tout': 200},
             {
-                'command': bytes([0xf5]),
+                'command': _cmd([0xf5]),
                 'data': None,
                 'rx_length': 2,
                 'tout': 200},
             {
-                'command': bytes([0xf2, 0x21]),
+                'command': _cmd([0xf2, 0x21]),
                 'data': None,
                 'rx_length': 0,
                 'tout': 200},
             {
-                'command': bytes([0xf2, 0x30, 0xa3]),
+                'command': _cmd([0xf2, 0x30, 0xa3]),
                 'data': None,
                 'rx_length': 2,
                 'tout': 200},
         ])
 
 
+class ComMockV3(ComMock):
+    """Com Mock class with ST-Link/V3"""
+
+    @property
+    def dev_name(self):
+        """Mock device name"""
+        return 'V3'
+
+
+class TestStlinkMaximumData(unittest.TestCase):
+    """Tests for maximum transfer sizes depending on ST-Link version"""
+
+    def test_v2(self):
+        """test ST-Link/V2 8 bit transfers"""
+        usb = ComMock()
+        usb.xfer_mock.set_return_data([
+            bytes([0x28, 0xc7, 0x83, 0x04, 0x48, 0x37]),
+            bytes([0x02, 0x00]),
+            None,
+            bytes([0x80, 0x00]),
+        ])
+        stlink = swd.stlink.Stlink(usb=usb)
+        self.assertEqual(stlink.maximum_8bit_data, 64)
+
+    def test_v3(self):
+        """test ST-Link/V3 8 bit transfers"""
+        usb = ComMockV3()
+        usb.xfer_mock.set_return_data([
+            bytes([0x30, 0x00, 0x83, 0x04, 0x4f, 0x37]),
+            bytes([3, 0, 7, 0, 1, 0, 0, 0, 0x83, 0x04, 0x4f, 0x37]),
+            bytes([0x02, 0x00]),
+            None,
+            bytes([0x80, 0x00]),
+        ])
+        stlink = swd.stlink.Stlink(usb=usb)
+        self.assertEqual(stlink.get_version().major, 3)
+        self.assertEqual(stlink.maximum_8bit_data, 512)
+        usb.xfer_mock.get_call_log()
+        usb.xfer_mock.set_return_data([bytes(512)])
+        stlink.read_mem8(0x20000000, 512, check_last_error_status=False)
+        self.assertEqual(usb.xfer_mock.get_call_log(), [
+            {'command': _cmd([
+                0xf2, 0x0c, 0x00, 0x00, 0x00, 0x20, 0x00, 0x02
+            ]), 'data': None, 'rx_length': 512, 'tout': 200},
+        ])
+
+
 class TestStlinkVersion(_TestStlink):
     """Tests for Stlink.get_version()"""
 
@@ -131,7 +200,7 @@ class TestStlinkGetTargetVoltage(_TestStlink):
         ])
         target_voltage = self._stlink.get_target_voltage()
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([0xf7]), 'data': None, 'rx_length': 8, 'tout': 200},
+            {'command': _cmd([0xf7]), 'data': None, 'rx_length': 8, 'tout': 200},
         ])
         self.assertEqual(target_voltage, 3.2)
 
@@ -148,7 +217,7 @@ class TestStlinkGetCoreid(_TestStlink):
         self.assertEqual(
             self._usb.xfer_mock.get_call_log(),
             [{
-                'command': bytes([0xf2, 0x31]),
+                'command': _cmd([0xf2, 0x31]),
                 'data': None,
                 'rx_length': 12,
                 'tout': 200}])
@@ -165,7 +234,7 @@ class TestStlinkGetReg(_TestStlink):
         ])
         coreid = self._stlink.get_reg(1)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x33, 0x01,
             ]), 'data': None, 'rx_length': 8, 'tout': 200},
         ])
@@ -182,7 +251,7 @@ class TestStlinkSetReg(_TestStlink):
         ])
         self._stlink.set_reg(1, 0x12345678)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x34, 0x01, 0x78, 0x56, 0x34, 0x12,
             ]), 'data': None, 'rx_length': 2, 'tout': 200},
         ])
@@ -198,7 +267,7 @@ class TestStlinkGetMem32(_TestStlink):
         ])
         coreid = self._stlink.get_mem32(0x08000000)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x36, 0x00, 0x00, 0x00, 0x08,
             ]), 'data': None, 'rx_length': 8, 'tout': 200},
         ])
@@ -222,7 +291,7 @@ class TestStlinkSetMem32(_TestStlink):
         ])
         self._stlink.set_mem32(0x20000000, 0x12345678)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x35, 0x00, 0x00, 0x00, 0x20, 0x78, 0x56, 0x34, 0x12,
             ]), 'data': None, 'rx_length': 2, 'tout': 200},
         ])
@@ -246,7 +315,7 @@ class TestStlinkReadMem8(_TestStlink):
         ])
         ret_data = self._stlink.read_mem8(0x08000000, 1, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x0c, 0x00, 0x00, 0x00, 0x08, 0x01, 0x00, 0x00, 0x00,
             ]), 'data': None, 'rx_length': 1, 'tout': 200},
         ])
@@ -260,7 +329,7 @@ class TestStlinkReadMem8(_TestStlink):
         ])
         ret_data = self._stlink.read_mem8(0x08000000, 64, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x0c, 0x00, 0x00, 0x00, 0x08, 0x40, 0x00, 0x00, 0x00,
             ]), 'data': None, 'rx_length': 64, 'tout': 200},
         ])
@@ -287,7 +356,7 @@ class TestStlinkWriteMem8(_TestStlink):
         ])
         self._stlink.write_mem8(0x20001000, data, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x0d, 0x00, 0x10, 0x00, 0x20, 0x01, 0x00, 0x00, 0x00
             ]), 'data': data, 'rx_length': 0, 'tout': 200},
         ])
@@ -301,7 +370,7 @@ class TestStlinkWriteMem8(_TestStlink):
         ])
         self._stlink.write_mem8(0x20001000, data, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x0d, 0x00, 0x10, 0x00, 0x20, 0x40, 0x00, 0x00, 0x00
             ]), 'data': data, 'rx_length': 0, 'tout': 200},
         ])
@@ -327,7 +396,7 @@ class TestStlinkReadMem16(_TestStlink):
         ])
         ret_data = self._stlink.read_mem16(0x08000000, 4, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x47, 0x00, 0x00, 0x00, 0x08, 0x04, 0x00, 0x00, 0x00
             ]), 'data': None, 'rx_length': 4, 'tout': 200},
         ])
@@ -341,7 +410,7 @@ class TestStlinkReadMem16(_TestStlink):
         ])
         ret_data = self._stlink.read_mem16(0x08000000, 1024, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x47, 0x00, 0x00, 0x00, 0x08, 0x00, 0x04, 0x00, 0x00
             ]), 'data': None, 'rx_length': 1024, 'tout': 200},
         ])
@@ -380,7 +449,7 @@ class TestStlinkWriteMem16(_TestStlink):
         data = list(range(4))
         self._stlink.write_mem16(0x20001000, data, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x48, 0x00, 0x10, 0x00, 0x20, 0x04, 0x00, 0x00, 0x00
             ]), 'data': data, 'rx_length': 0, 'tout': 200},
         ])
@@ -390,7 +459,7 @@ class TestStlinkWriteMem16(_TestStlink):
         data = list(range(1024))
         self._stlink.write_mem16(0x20001000, data, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x48, 0x00, 0x10, 0x00, 0x20, 0x00, 0x04, 0x00, 0x00
             ]), 'data': data, 'rx_length': 0, 'tout': 200},
         ])
@@ -434,7 +503,7 @@ class TestStlinkReadMem32(_TestStlink):
         ])
         ret_data = self._stlink.read_mem32(0x08000000, 4, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x07, 0x00, 0x00, 0x00, 0x08, 0x04, 0x00, 0x00, 0x00
             ]), 'data': None, 'rx_length': 4, 'tout': 200},
         ])
@@ -448,7 +517,7 @@ class TestStlinkReadMem32(_TestStlink):
         ])
         ret_data = self._stlink.read_mem32(0x08000000, 1024, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x07, 0x00, 0x00, 0x00, 0x08, 0x00, 0x04, 0x00, 0x00
             ]), 'data': None, 'rx_length': 1024, 'tout': 200},
         ])
@@ -487,7 +556,7 @@ class TestStlinkWriteMem32(_TestStlink):
         data = list(range(4))
         self._stlink.write_mem32(0x20001000, data, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x08, 0x00, 0x10, 0x00, 0x20, 0x04, 0x00, 0x00, 0x00
             ]), 'data': data, 'rx_length': 0, 'tout': 200},
         ])
@@ -497,7 +566,7 @@ class TestStlinkWriteMem32(_TestStlink):
         data = list(range(1024))
         self._stlink.write_mem32(0x20001000, data, check_last_error_status=False)
         self.assertEqual(self._usb.xfer_mock.get_call_log(), [
-            {'command': bytes([
+            {'command': _cmd([
                 0xf2, 0x08, 0x00, 0x10, 0x00, 0x20, 0x00, 0x04, 0x00, 0x00
             ]), 'data': data, 'rx_length': 0, 'tout': 200},
         ])
@@ -528,3 +597,307 @@ class TestStlinkWriteMem32(_TestStlink):
         self.assertEqual(
             str(context.exception),
             'Size is not aligned to 4 Bytes')
+
+
+class TestStlinkComCommand(unittest.TestCase):
+    """Tests for precompiled StlinkCom commands"""
+
+    def test_pack(self):
+        """test arguments are packed into reused padded buffer"""
+        command = swd.stlink.com._Command(  # pylint: disable=protected-access
+            (0xf2, 0x36), 'L')
+        cmd = command.pack(0x12345678)
+        self.assertEqual(cmd, _cmd([0xf2, 0x36, 0x78, 0x56, 0x34, 0x12]))
+        self.assertIs(command.pack(0xe000edf0), cmd)
+        self.assertEqual(cmd, _cmd([0xf2, 0x36, 0xf0, 0xed, 0x00, 0xe0]))
+
+    def test_too_long(self):
+        """test command longer than 16 bytes"""
+        with self.assertRaises(ValueError):
+            swd.stlink.com._Command(  # pylint: disable=protected-access
+                (0xf2, 0x36), 'LLLL')
+
+
+class TestStlinkReadMemChunks(_TestStlink):
+    """Tests for Stlink.read_mem_chunks()"""
+
+    def test_sequential(self):
+        """test reading chunks one by one with check after each chunk"""
+        self._usb.xfer_mock.set_return_data([
+            bytes(4),
+            bytes([0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]),
+            bytes(1),
+            bytes([0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]),
+        ])
+        ret_data = list(self._stlink.read_mem_chunks([
+            (32, 0x08000000, 4),
+            (8, 0x08000004, 1),
+        ]))
+        self.assertEqual(ret_data, [bytes(4), bytes(1)])
+        self.assertEqual(
+            [call['command'][1] for call in self._usb.xfer_mock.get_call_log()],
+            [0x07, 0x3e, 0x0c, 0x3e])
+
+    def test_pipelined(self):
+        """test reading chunks with one check after last chunk"""
+        self._usb.pipeline_depth = 4
+        self._usb.xfer_mock.set_return_data([
+            bytes(4),
+            bytes(1),
+            bytes([0x80, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]),
+        ])
+        ret_data = list(self._stlink.read_mem_chunks([
+            (32, 0x08000000, 4),
+            (8, 0x08000004, 1),
+        ]))
+        self.assertEqual(ret_data, [bytes(4), bytes(1)])
+        self.assertEqual(
+            [call['command'][1] for call in self._usb.xfer_mock.get_call_log()],
+            [0x07, 0x0c, 0x3e])
+
+    def test_pipelined_unaligned(self):
+        """test all chunks are checked before any transfer"""
+        self._usb.pipeline_depth = 4
+        with self.assertRaises(swd.stlink.StlinkException) as context:
+            list(self._stlink.read_mem_chunks([
+                (32, 0x08000000, 4),
+                (32, 0x08000006, 4),
+            ]))
+        self.assertEqual(
+            str(context.exception), 'Address is not aligned to 4 Bytes')
+        self.assertEqual(self._usb.xfer_mock.get_call_log(), [])
+
+
+class DevMock():
+    """USB device mock, response is queued after each command"""
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._responses = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def write(self, data, timeout=200):
+        """Mock write, response contains first 2 bytes of command"""
+        with self._lock:
+            self._responses.append(bytes(data[:2]))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self._lock.notify()
+
+    def read_into(self, size, timeout=200, bulk=False):
+        """Mock read_into"""
+        return memoryview(self.read(size, timeout))
+
+    def read(self, size, timeout=200):
+        """Mock read"""
+        with self._lock:
+            if not self._lock.wait_for(lambda: self._responses, timeout / 1000):
+                raise swd.stlink.usb.StlinkUsbException("USB Error: timeout")
+            self.in_flight -= 1
+            return self._responses.pop(0)
+
+
+class TestStlinkUsbPipeline(unittest.TestCase):
+    """Tests for StlinkUsb.xfer_pipeline()"""
+
+    def setUp(self):
+        self._dev = DevMock()
+        self._usb = swd.stlink.usb.StlinkUsb.__new__(swd.stlink.usb.StlinkUsb)
+        self._usb._dev = self._dev  # pylint: disable=protected-access
+        self._usb._debug = 0  # pylint: disable=protected-access
+        self._usb.pipeline_depth = 3
+
+    def test_order(self):
+        """test responses are received in order of commands"""
+        transfers = [(bytes([0xf2, i]), None, 2) for i in range(20)]
+        ret_data = list(self._usb.xfer_pipeline(transfers))
+        self.assertEqual(ret_data, [bytes([0xf2, i]) for i in range(20)])
+        self.assertLessEqual(self._dev.max_in_flight, 3)
+        self.assertEqual(self._dev.in_flight, 0)
+
+    def test_close(self):
+        """test responses of already sent commands are dropped on close"""
+        transfers = [(bytes([0xf2, i]), None, 2) for i in range(20)]
+        pipeline = self._usb.xfer_pipeline(transfers)
+        self.assertEqual(next(pipeline), bytes([0xf2, 0]))
+        pipeline.close()
+        self.assertEqual(self._dev.in_flight, 0)
+        self.assertEqual(
+            self._usb.xfer(bytes([0xf1]), rx_length=2), bytes([0xf1, 0]))
+
+    def test_without_pipelining(self):
+        """test transfers are done one by one with depth 1"""
+        self._usb.pipeline_depth = 1
+        transfers = [(bytes([0xf2, i]), None, 2) for i in range(5)]
+        ret_data = list(self._usb.xfer_pipeline(transfers))
+        self.assertEqual(ret_data, [bytes([0xf2, i]) for i in range(5)])
+        self.assertEqual(self._dev.max_in_flight, 1)
+
+    def test_buffered(self):
+        """test responses are received into buffers"""
+        transfers = [(bytes([0xf2, i]), None, 2) for i in range(5)]
+        ret_data = [
+            bytes(data) for data in
+            self._usb.xfer_pipeline(transfers, buffered=True)]
+        self.assertEqual(ret_data, [bytes([0xf2, i]) for i in range(5)])
+
+
+class PyusbDevMock():
+    """pyusb device mock"""
+
+    def __init__(self, data):
+        self._data = data
+        self.buffers = []
+
+    def read(self, endpoint, size_or_buffer, timeout):
+        """Mock read, into array if it is given"""
+        self.buffers.append(size_or_buffer)
+        size_or_buffer[:len(self._data)] = type(size_or_buffer)(
+            size_or_buffer.typecode, self._data)
+        return len(self._data)
+
+
+class TestStlinkUsbBaseRead(unittest.TestCase):
+    """Tests for StlinkUsbBase.read_into()"""
+
+    def test_reuse(self):
+        """test buffer is reused for same size"""
+        dev = PyusbDevMock(bytes([0x80, 0x00, 0x12, 0x34]))
+        usb = swd.stlink.usb.StlinkUsbV2(dev)
+        self.assertEqual(usb.read_into(8), bytes([0x80, 0x00, 0x12, 0x34]))
+        self.assertEqual(usb.read(8), bytes([0x80, 0x00, 0x12, 0x34]))
+        self.assertIs(dev.buffers[0], dev.buffers[1])
+        usb.read_into(2)
+        self.assertIsNot(dev.buffers[0], dev.buffers[2])
+        usb.read_into(8, bulk=True)
+        self.assertIsNot(dev.buffers[0], dev.buffers[3])
+        usb._dev = None  # pylint: disable=protected-access
+
+
+class SimPyusbDevMock():
+    """pyusb device mock, commands are executed by simulator"""
+
+    def __init__(self, sim):
+        self._sim = sim
+        self._command = None
+
+    def write(self, endpoint, data, timeout):
+        """Mock write, only commands without data are supported"""
+        self._command = bytes(data)
+        return len(data)
+
+    def read(self, endpoint, buffer, timeout):
+        """Mock read into array"""
+        data = self._sim.xfer(self._command, rx_length=len(buffer))
+        buffer[:] = type(buffer)(buffer.typecode, data)
+        return len(data)
+
+
+class TestStlinkUsbBufferedRead(unittest.TestCase):
+    """Tests for bulk reads into reusable buffers over USB"""
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._sim.find_region(0x20000000).data[:16] = bytes(range(16))
+        usb = swd.stlink.usb.StlinkUsb.__new__(swd.stlink.usb.StlinkUsb)
+        usb._dev = swd.stlink.usb.StlinkUsbV2(  # pylint: disable=W0212
+            SimPyusbDevMock(self._sim))
+        usb._debug = 0  # pylint: disable=protected-access
+        usb.pipeline_depth = 1
+        self._usb = usb
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=usb))
+
+    def tearDown(self):
+        self._usb._dev._dev = None  # pylint: disable=protected-access
+
+    def test_status_size(self):
+        """test data with size of R/W state reply are not overwritten"""
+        self.assertEqual(
+            self._swd.read_mem_bytes(0x20000000, 12), bytes(range(12)))
+        self.assertEqual(
+            self._swd.read_mem_bytes(0x20000001, 12), bytes(range(1, 13)))
+        buffer = bytearray(12)
+        self._swd.read_mem_into(0x20000002, buffer)
+        self.assertEqual(buffer, bytes(range(2, 14)))
+
+
+class UsbDeviceMock():
+    """pyusb device mock for enumeration"""
+
+    def __init__(self, id_vendor, id_product, serial_number):
+        self.idVendor = id_vendor  # pylint: disable=invalid-name
+        self.idProduct = id_product  # pylint: disable=invalid-name
+        self._serial_number = serial_number
+        self.serial_reads = 0
+
+    @property
+    def serial_number(self):
+        """Mock serial number string descriptor"""
+        self.serial_reads += 1
+        return self._serial_number
+
+    def finalize(self):
+        """Mock finalize"""
+
+
+class TestStlinkUsbFind(unittest.TestCase):
+    """Tests for StlinkUsb device enumeration"""
+
+    def setUp(self):
+        self._devices = [
+            UsbDeviceMock(0x0483, 0x3748, 'AAAA0001'),
+            UsbDeviceMock(0x1234, 0x5678, 'OTHER'),
+            UsbDeviceMock(0x0483, 0x374b, 'BBBB0002'),
+            UsbDeviceMock(0x0483, 0x374f, 'CCCC0003'),
+        ]
+        self._find_calls = []
+        self._find = swd.stlink.usb._pyusb().core.find
+        swd.stlink.usb._pyusb().core.find = self._find_mock
+
+    def tearDown(self):
+        swd.stlink.usb._pyusb().core.find = self._find
+
+    def _find_mock(self, find_all=False, custom_match=None):
+        self._find_calls.append(find_all)
+        return [dev for dev in self._devices if custom_match(dev)]
+
+    def test_list_probes(self):
+        """test all probes are found by one bus scan"""
+        probes = swd.stlink.usb.StlinkUsb.list_probes()
+        self.assertEqual(self._find_calls, [True])
+        self.assertEqual(probes, [
+            ('AAAA0001', 'V2', 0x0483, 0x3748),
+            ('BBBB0002', 'V2-1', 0x0483, 0x374b),
+            ('CCCC0003', 'V3', 0x0483, 0x374f),
+        ])
+
+    def test_filter_serial_no(self):
+        """test serial number is read once for each device"""
+        devices = swd.stlink.usb.StlinkUsb._find_all_devices()
+        filtered = swd.stlink.usb.StlinkUsb._filter_devices(devices, '0002')
+        self.assertEqual(len(filtered), 1)
+        self.assertEqual(filtered[0].serial_no, 'BBBB0002')
+        self.assertTrue(filtered[0].compare_serial_no('BBBB'))
+        self.assertEqual(
+            [dev.serial_reads for dev in self._devices], [1, 0, 1, 1])
+        exception = swd.stlink.usb.MoreDevicesException(devices)
+        self.assertEqual(
+            exception.serial_numbers, ['AAAA0001', 'BBBB0002', 'CCCC0003'])
+        self.assertEqual(
+            [dev.serial_reads for dev in self._devices], [1, 0, 1, 1])
+
+
+class TestStlinkUsbLazyImport(unittest.TestCase):
+    """Tests for postponed import of pyusb"""
+
+    def test_import(self):
+        """test that import of swd and CLI does not import pyusb"""
+        root = os.path.join(os.path.dirname(__file__), '..')
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, swd, swd._app; '
+            'print(sorted(name for name in sys.modules '
+            'if name == "usb" or name.startswith("usb.")))'],
+            cwd=root)
+        self.assertEqual(output.strip(), b'[]')
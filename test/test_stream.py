@@ -0,0 +1,97 @@
+"""Unit tests for stream.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import swd
+import swd.stlink
+import swd.stlink.sim
+import swd.stlink.usb
+import swd.stream
+
+_SDRAM_ADDRESS = 0xc0000000
+_SDRAM_SIZE = 1024 * 1024 + 100
+
+
+class _FailingSim(swd.stlink.sim.StlinkSim):
+    """Simulated ST-Link which is disconnected after some transfers"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_after = None
+
+    def _transfer(self, command, data, rx_length, transactions=1):
+        if self.fail_after is not None:
+            if not self.fail_after:
+                raise swd.stlink.usb.StlinkUsbException("USB Error: timeout")
+            self.fail_after -= 1
+        return super()._transfer(command, data, rx_length, transactions)
+
+
+class TestReadToFile(unittest.TestCase):
+    """Tests for reading memory into file"""
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'dump.bin')
+        self._sim = _FailingSim()
+        sdram = swd.stlink.sim.SimRegion(_SDRAM_ADDRESS, _SDRAM_SIZE, 'SDRAM')
+        sdram.data[:] = os.urandom(_SDRAM_SIZE)
+        self._sim.add_region(sdram)
+        self._data = bytes(sdram.data)
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _file_data(self):
+        with open(self._path, 'rb') as dump:
+            return dump.read()
+
+    def test_read(self):
+        """test reading of unaligned area through ring of buffers"""
+        positions = []
+        end = swd.stream.read_to_file(
+            self._swd, _SDRAM_ADDRESS + 1, _SDRAM_SIZE - 3, self._path,
+            chunk_size=4096, buffers=2, progress=positions.append)
+        self.assertEqual(end, _SDRAM_SIZE - 3)
+        self.assertEqual(self._file_data(), self._data[1:-2])
+        self.assertEqual(positions[0], 4095)
+        self.assertEqual(positions[-1], _SDRAM_SIZE - 3)
+
+    def test_until_fault(self):
+        """test reading without size ends at first memory fault"""
+        end = swd.stream.read_to_file(
+            self._swd, _SDRAM_ADDRESS, None, self._path)
+        self.assertEqual(end, _SDRAM_SIZE)
+        self.assertEqual(self._file_data(), self._data)
+
+    def test_resume(self):
+        """test resume of reading after USB error"""
+        self._sim.fail_after = 100
+        with self.assertRaises(swd.stream.StreamError) as context:
+            swd.stream.read_to_file(
+                self._swd, _SDRAM_ADDRESS, _SDRAM_SIZE, self._path)
+        offset = context.exception.offset
+        self.assertIsInstance(
+            context.exception.__cause__, swd.stlink.usb.StlinkUsbException)
+        self.assertGreater(offset, 0)
+        self.assertEqual(self._file_data(), self._data[:offset])
+        self._sim.fail_after = None
+        end = swd.stream.read_to_file(
+            self._swd, _SDRAM_ADDRESS, _SDRAM_SIZE, self._path, offset)
+        self.assertEqual(end, _SDRAM_SIZE)
+        self.assertEqual(self._file_data(), self._data)
+
+    def test_write_error(self):
+        """test error of writer thread stops reading"""
+        with open(self._path, 'wb'):
+            pass
+        with open(self._path, 'rb') as read_only:
+            with self.assertRaises(swd.stream.StreamError) as context:
+                swd.stream.read_to_file(
+                    self._swd, _SDRAM_ADDRESS, _SDRAM_SIZE, read_only)
+        self.assertEqual(context.exception.offset, 0)
+        self.assertIsInstance(context.exception.__cause__, OSError)
@@ -0,0 +1,141 @@
+"""Unit tests for stub.py
+"""
+
+import os
+import zlib
+import unittest
+import swd
+import swd.stlink
+import swd.stlink.sim
+import swd.stub
+import swd._app
+from test.test_app import SimApplication
+
+
+def run_stub(sim):
+    """Emulate stub copied at PC of simulated target
+
+    Return:
+        True if code at PC is known stub
+    """
+    pc = sim.registers[15]
+    code = swd.stub._COPY_CODE
+    if sim.read_memory(pc, len(code))[0] == code:
+        _copy_forward(sim, *sim.registers[:3])
+    elif sim.read_memory(pc, len(swd.stub._CRC32_CODE))[0] == \
+            swd.stub._CRC32_CODE:
+        _crc32(sim, pc)
+    else:
+        return False
+    sim.stub_runs = getattr(sim, 'stub_runs', 0) + 1
+    sim.halted = True
+    return True
+
+
+def _copy_forward(sim, destination, source, size):
+    """Copy forward like target, overlapping source is repeated"""
+    step = destination - source
+    assert step >= 4
+    for offset in range(0, size, step):
+        chunk = min(step, size - offset)
+        data, _ = sim.read_memory(source + offset, chunk)
+        sim.write_memory(destination + offset, data)
+
+
+def _crc32(sim, pc):
+    """Compute CRC-32 like target"""
+    address, size, crc, table = sim.registers[:4]
+    assert table == pc + swd.stub._CRC32_TABLE_OFFSET
+    data, _ = sim.read_memory(address, size)
+    sim.registers[0] = zlib.crc32(data, crc ^ 0xffffffff) ^ 0xffffffff
+
+
+class TestCrc32(unittest.TestCase):
+    """Tests for CRC-32 computed by target"""
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._sim.on_run = run_stub
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+        self._flash = self._sim.find_region(self._sim.FLASH_ADDRESS)
+
+    def test_crc32(self):
+        """test CRC-32 of FLASH, core is halted"""
+        data = os.urandom(4096)
+        self._flash.data[:4096] = data
+        self.assertEqual(
+            swd.stub.crc32(self._swd, 0x08000000, 4096), zlib.crc32(data))
+        self.assertEqual(
+            swd.stub.crc32(self._swd, 0x08000800, 2048, zlib.crc32(data[:2048])),
+            zlib.crc32(data))
+        self.assertTrue(self._sim.halted)
+        self.assertEqual(self._sim.stub_runs, 2)
+
+
+class _RunningSim(swd.stlink.sim.StlinkSim):
+    """Simulated target, which ignores halt request"""
+
+    def _write_debug_register(self, address, value):
+        if address != 0xe000edf0:
+            super()._write_debug_register(address, value)
+
+
+class TestFill(unittest.TestCase):
+    """Tests for memory fill executed by target"""
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._sim.on_run = run_stub
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+        self._sram = self._sim.find_region(self._sim.SRAM_ADDRESS)
+
+    def _expected(self, pattern, size):
+        return (pattern * (size // len(pattern) + 1))[:size]
+
+    def test_fill_code_in_area(self):
+        """test fill of SRAM with code at end of area"""
+        self.assertTrue(swd.stub.fill(
+            self._swd, 0x20000003, b'\x12\x34\x56', 10000))
+        self.assertEqual(
+            self._sram.data[3:10003], self._expected(b'\x12\x34\x56', 10000))
+        self.assertEqual(self._sram.data[10003], 0)
+        self.assertEqual(self._sim.stub_runs, 1)
+        self.assertTrue(self._sim.halted)
+
+    def test_fill_code_in_sram(self):
+        """test fill with code at given address"""
+        self.assertTrue(swd.stub.fill(
+            self._swd, 0x20000100, [0xaa, 0x55], 4097, sram=0x20002000))
+        self.assertEqual(
+            self._sram.data[0x100:0x1101], self._expected(b'\xaa\x55', 4097))
+        self.assertEqual(self._sram.data[0x1101], 0)
+
+    def test_fill_small(self):
+        """test small area filled by host"""
+        self.assertFalse(swd.stub.fill(self._swd, 0x20000000, [7], 100))
+        self.assertEqual(self._sram.data[:101], b'\x07' * 100 + b'\x00')
+        self.assertFalse(hasattr(self._sim, 'stub_runs'))
+
+    def test_fill_not_halted(self):
+        """test fallback when core can not be halted"""
+        sim = _RunningSim()
+        dev = swd.Swd(driver=swd.stlink.Stlink(usb=sim))
+        self.assertFalse(swd.stub.fill(dev, 0x20000000, [7], 4096))
+        self.assertEqual(
+            sim.find_region(sim.SRAM_ADDRESS).data[:4096], b'\x07' * 4096)
+
+    def test_fill_not_executable(self):
+        """test fallback when code in filled area does not run"""
+        self._sim.on_run = lambda sim: None
+        self.assertFalse(swd.stub.fill(
+            self._swd, 0x20000000, [7], 4096, timeout=0.01))
+        self.assertEqual(self._sram.data[:4097], b'\x07' * 4096 + b'\x00')
+        self.assertTrue(self._sim.halted)
+
+    def test_fill_action(self):
+        """test fill action of application"""
+        args = swd._app._configure_argparse(
+            ['-q', 'fill:0x20000000:8K:0:0xff'])
+        self.assertEqual(SimApplication(args, self._sim).start(), 0)
+        self.assertEqual(self._sram.data[:8192], b'\x00\xff' * 4096)
+        self.assertEqual(self._sim.stub_runs, 1)
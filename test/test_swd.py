@@ -3,6 +3,7 @@
 
 import unittest
 import swd
+import swd.stlink
 
 
 class FncMock():
@@ -47,6 +48,7 @@ class DrvMock():
         self.write_mem16_mock = FncMock()
         self.read_mem32_mock = FncMock([])
         self.write_mem32_mock = FncMock()
+        self.check_last_rw_state_mock = FncMock()
 
     @property
     def maximum_8bit_data(self):
@@ -60,41 +62,54 @@ class DrvMock():
     def maximum_32bit_data(self):
         return self._STLINK_MAXIMUM_TRANSFER_SIZE
 
-    def read_mem8(self, address, size):
+    def read_mem8(self, address, size, **kwargs):
         """Mock read_mem8"""
         return self.read_mem8_mock.fnc(
             address=address,
-            size=size)
+            size=size,
+            **kwargs)
 
-    def write_mem8(self, address, data):
+    def write_mem8(self, address, data, **kwargs):
         """Mock write_mem8"""
         return self.write_mem8_mock.fnc(
             address=address,
-            data=data)
+            data=data,
+            **kwargs)
 
-    def read_mem16(self, address, size):
+    def read_mem16(self, address, size, **kwargs):
         """Mock read_mem16"""
         return self.read_mem16_mock.fnc(
             address=address,
-            size=size)
+            size=size,
+            **kwargs)
 
-    def write_mem16(self, address, data):
+    def write_mem16(self, address, data, **kwargs):
         """Mock write_mem16"""
         return self.write_mem16_mock.fnc(
             address=address,
-            data=data)
+            data=data,
+            **kwargs)
 
-    def read_mem32(self, address, size):
+    def read_mem32(self, address, size, **kwargs):
         """Mock read_mem32"""
         return self.read_mem32_mock.fnc(
             address=address,
-            size=size)
+            size=size,
+            **kwargs)
 
-    def write_mem32(self, address, data):
+    def write_mem32(self, address, data, **kwargs):
         """Mock write_mem32"""
         return self.write_mem32_mock.fnc(
             address=address,
-            data=data)
+            data=data,
+            **kwargs)
+
+
+    def check_last_rw_state(self):
+        """Mock check_last_rw_state, raise returned exception"""
+        err = self.check_last_rw_state_mock.fnc()
+        if err:
+            raise err
 
 
 class _TestSwd(unittest.TestCase):
@@ -448,17 +463,17 @@ class TestReadMemUnalignedAddress(_TestSwd):
         """Test reading memory"""
         data = list(range(67))
         self._drv.read_mem8_mock.set_return_data([
-            data[:63],
+            data[:3],
         ])
         self._drv.read_mem32_mock.set_return_data([
-            data[63:],
+            data[3:],
         ])
         ret_data = list(self._swd.read_mem(0x12000009, 67))
         self.assertEqual(self._drv.read_mem8_mock.get_call_log(), [
-            {'address': 0x12000009, 'size': 63},
+            {'address': 0x12000009, 'size': 3},
         ])
         self.assertEqual(self._drv.read_mem32_mock.get_call_log(), [
-            {'address': 0x12000048, 'size': 4},
+            {'address': 0x1200000c, 'size': 64},
         ])
         self.assertEqual(ret_data, data)
 
@@ -466,13 +481,13 @@ class TestReadMemUnalignedAddress(_TestSwd):
         """Test reading memory"""
         data = list(range(126))
         self._drv.read_mem8_mock.set_return_data([
-            data[:63],
-            data[63:],
+            data[:64],
+            data[64:],
         ])
         ret_data = list(self._swd.read_mem(0xe300000d, 126))
         self.assertEqual(self._drv.read_mem8_mock.get_call_log(), [
-            {'address': 0xe300000d, 'size': 63},
-            {'address': 0xe300004c, 'size': 63},
+            {'address': 0xe300000d, 'size': 64},
+            {'address': 0xe300004d, 'size': 62},
         ])
         self.assertEqual(ret_data, data)
 
@@ -480,17 +495,17 @@ class TestReadMemUnalignedAddress(_TestSwd):
         """Test reading memory"""
         data = list(range(1023))
         self._drv.read_mem8_mock.set_return_data([
-            data[:63],
+            data[:3],
         ])
         self._drv.read_mem32_mock.set_return_data([
-            data[63:],
+            data[3:],
         ])
         ret_data = list(self._swd.read_mem(0x14000011, 1023))
         self.assertEqual(self._drv.read_mem8_mock.get_call_log(), [
-            {'address': 0x14000011, 'size': 63},
+            {'address': 0x14000011, 'size': 3},
         ])
         self.assertEqual(self._drv.read_mem32_mock.get_call_log(), [
-            {'address': 0x14000050, 'size': 960},
+            {'address': 0x14000014, 'size': 1020},
         ])
         self.assertEqual(ret_data, data)
 
@@ -533,6 +548,73 @@ class TestReadMemUnalignedAddress(_TestSwd):
         self.assertEqual(ret_data, data)
 
 
+class TestPlanMem(_TestSwd):
+    """Tests for Swd.plan_mem"""
+
+    def test_driver_limits(self):
+        """Test plan uses driver limits"""
+        self.assertEqual(list(self._swd.plan_mem(0x20000002, 1030)), [
+            (8, 0x20000002, 6),
+            (32, 0x20000008, 1024),
+        ])
+        self.assertEqual(list(self._swd.plan_mem(0x20000002, 130, (8,))), [
+            (8, 0x20000002, 64),
+            (8, 0x20000042, 64),
+            (8, 0x20000082, 2),
+        ])
+
+
+class TestReadMemInto(_TestSwd):
+    """Tests for Swd.read_mem_into and Swd.read_mem_bytes"""
+
+    def test_1150bytes(self):
+        """Test reading memory into buffer"""
+        data = bytes(i & 0xff for i in range(1150))
+        self._drv.read_mem8_mock.set_return_data([
+            data[:63],
+            data[1087:],
+        ])
+        self._drv.read_mem32_mock.set_return_data([
+            data[63:1087],
+        ])
+        buffer = bytearray(1150)
+        self._swd.read_mem_into(0x16000019, buffer)
+        self.assertEqual(self._drv.read_mem8_mock.get_call_log(), [
+            {'address': 0x16000019, 'size': 63},
+            {'address': 0x16000458, 'size': 63},
+        ])
+        self.assertEqual(self._drv.read_mem32_mock.get_call_log(), [
+            {'address': 0x16000058, 'size': 1024},
+        ])
+        self.assertEqual(buffer, data)
+
+    def test_memoryview(self):
+        """Test reading memory into part of buffer"""
+        data = bytes(range(8))
+        self._drv.read_mem32_mock.set_return_data([
+            data,
+        ])
+        buffer = bytearray(16)
+        self._swd.read_mem_into(0x20000000, memoryview(buffer)[4:12])
+        self.assertEqual(self._drv.read_mem32_mock.get_call_log(), [
+            {'address': 0x20000000, 'size': 8},
+        ])
+        self.assertEqual(buffer, bytes(4) + data + bytes(4))
+
+    def test_bytes(self):
+        """Test reading memory into new buffer"""
+        data = bytes(range(65))
+        self._drv.read_mem8_mock.set_return_data([
+            data[64:],
+        ])
+        self._drv.read_mem32_mock.set_return_data([
+            data[:64],
+        ])
+        ret_data = self._swd.read_mem_bytes(0xf700001c, 65)
+        self.assertIsInstance(ret_data, bytearray)
+        self.assertEqual(ret_data, data)
+
+
 class TestWriteMem(_TestSwd):
     """Tests for Swd.write_mem class"""
 
@@ -659,8 +741,7 @@ class TestWriteMemUnalignedAddress(_TestSwd):
         data = list(range(64))
         self._swd.write_mem(0xb1000005, data)
         self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
-            {'address': 0xb1000005, 'data': data[:63]},
-            {'address': 0xb1000044, 'data': data[63:]},
+            {'address': 0xb1000005, 'data': data},
         ])
 
     def test_67bytes(self):
@@ -668,10 +749,10 @@ class TestWriteMemUnalignedAddress(_TestSwd):
         data = list(range(67))
         self._swd.write_mem(0x42000009, data)
         self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
-            {'address': 0x42000009, 'data': data[:63]},
+            {'address': 0x42000009, 'data': data[:3]},
         ])
         self.assertEqual(self._drv.write_mem32_mock.get_call_log(), [
-            {'address': 0x42000048, 'data': data[63:]},
+            {'address': 0x4200000c, 'data': data[3:]},
         ])
 
     def test_126bytes(self):
@@ -679,8 +760,8 @@ class TestWriteMemUnalignedAddress(_TestSwd):
         data = list(range(126))
         self._swd.write_mem(0xb300000d, data)
         self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
-            {'address': 0xb300000d, 'data': data[:63]},
-            {'address': 0xb300004c, 'data': data[63:]},
+            {'address': 0xb300000d, 'data': data[:64]},
+            {'address': 0xb300004d, 'data': data[64:]},
         ])
 
     def test_1024bytes(self):
@@ -688,10 +769,10 @@ class TestWriteMemUnalignedAddress(_TestSwd):
         data = list(range(1023))
         self._swd.write_mem(0x44000011, data)
         self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
-            {'address': 0x44000011, 'data': data[:63]},
+            {'address': 0x44000011, 'data': data[:3]},
         ])
         self.assertEqual(self._drv.write_mem32_mock.get_call_log(), [
-            {'address': 0x44000050, 'data': data[63:]},
+            {'address': 0x44000014, 'data': data[3:]},
         ])
 
     def test_1087bytes(self):
@@ -718,6 +799,164 @@ class TestWriteMemUnalignedAddress(_TestSwd):
         ])
 
 
+class TestWriteMemBuffer(_TestSwd):
+    """Tests for Swd.write_mem class with bytes-like data"""
+
+    def test_1028bytes(self):
+        """Test writing memory"""
+        data = bytes(i & 0xff for i in range(1028))
+        self._swd.write_mem(0xd300000c, data)
+        call_log = self._drv.write_mem32_mock.get_call_log()
+        self.assertEqual(call_log, [
+            {'address': 0xd300000c, 'data': data[:1024]},
+            {'address': 0xd300040c, 'data': data[1024:]},
+        ])
+        self.assertIsInstance(call_log[0]['data'], memoryview)
+
+    def test_1150bytes_unaligned(self):
+        """Test writing memory"""
+        data = bytearray(i & 0xff for i in range(1150))
+        self._swd.write_mem(0x46000019, data)
+        self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
+            {'address': 0x46000019, 'data': data[:63]},
+            {'address': 0x46000458, 'data': data[1087:]},
+        ])
+        self.assertEqual(self._drv.write_mem32_mock.get_call_log(), [
+            {'address': 0x46000058, 'data': data[63:1087]},
+        ])
+
+    def test_1025bytes_memoryview(self):
+        """Test writing memory"""
+        data = bytes(i & 0xff for i in range(1025))
+        self._swd.write_mem(0xc4000010, memoryview(data))
+        self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
+            {'address': 0xc4000410, 'data': data[1024:]},
+        ])
+        self.assertEqual(self._drv.write_mem32_mock.get_call_log(), [
+            {'address': 0xc4000010, 'data': data[:1024]},
+        ])
+
+    def test_write_mem16(self):
+        """Test writing memory with 16 bit access"""
+        data = bytes(i & 0xff for i in range(2050))
+        self._swd.write_mem16(0x20000000, data)
+        self.assertEqual(self._drv.write_mem16_mock.get_call_log(), [
+            {'address': 0x20000000, 'data': data[:1024]},
+            {'address': 0x20000400, 'data': data[1024:2048]},
+            {'address': 0x20000800, 'data': data[2048:]},
+        ])
+
+
+class TestDeferredCheck(_TestSwd):
+    """Tests for Swd.deferred_check"""
+
+    def test_read(self):
+        """Test reading memory with one final check"""
+        data = bytes(i & 0xff for i in range(2048))
+        self._drv.read_mem32_mock.set_return_data([
+            data[:1024],
+            data[1024:],
+        ])
+        with self._swd.deferred_check():
+            ret_data = self._swd.read_mem_bytes(0x20000000, 2048)
+            self.assertEqual(
+                self._drv.check_last_rw_state_mock.get_call_log(), [])
+        self.assertEqual(self._drv.read_mem32_mock.get_call_log(), [
+            {'address': 0x20000000, 'size': 1024,
+             'check_last_error_status': False},
+            {'address': 0x20000400, 'size': 1024,
+             'check_last_error_status': False},
+        ])
+        self.assertEqual(
+            self._drv.check_last_rw_state_mock.get_call_log(), [{}])
+        self.assertEqual(ret_data, data)
+
+    def test_nested(self):
+        """Test nested context check state only once"""
+        data = bytes(8)
+        with self._swd.deferred_check():
+            with self._swd.deferred_check():
+                self._swd.write_mem(0x20000000, data)
+            self._swd.write_mem(0x20000008, data)
+        self.assertEqual(
+            self._drv.check_last_rw_state_mock.get_call_log(), [{}])
+        self.assertEqual(len(self._drv.write_mem32_mock.get_call_log()), 2)
+
+    def test_without_transfers(self):
+        """Test no check without any transfer"""
+        with self._swd.deferred_check():
+            pass
+        self.assertEqual(
+            self._drv.check_last_rw_state_mock.get_call_log(), [])
+
+    def test_fault_address(self):
+        """Test reporting faulting chunk by fault address"""
+        self._drv.check_last_rw_state_mock.set_return_data([
+            swd.stlink.StlinkRwException(
+                "AP fault at address: 0x20000404", 0x11, 0x20000404),
+        ])
+        with self.assertRaises(swd.stlink.StlinkRwException) as context:
+            with self._swd.deferred_check():
+                self._swd.write_mem(0x20000000, bytes(2048))
+        self.assertEqual(
+            str(context.exception),
+            "AP fault at address: 0x20000404 (write of 1024 Bytes "
+            "at address: 0x20000400 with 32 bit access)")
+        self.assertEqual(context.exception.fault_address, 0x20000404)
+
+    def test_bisect(self):
+        """Test locating faulting read chunk by repeated reads"""
+        fault = swd.stlink.StlinkRwException(
+            "AP fault at address: 0x00000000", 0x11, 0)
+        # final check, first half passed, then second quarter failed
+        self._drv.check_last_rw_state_mock.set_return_data([
+            fault, None, fault])
+        self._drv.read_mem32_mock.set_return_data([], bytes(1024))
+        with self.assertRaises(swd.stlink.StlinkRwException) as context:
+            with self._swd.deferred_check():
+                self._swd.read_mem_bytes(0x20000000, 4096)
+        self.assertEqual(
+            str(context.exception),
+            "AP fault at address: 0x00000000 (read of 1024 Bytes "
+            "at address: 0x20000800 with 32 bit access)")
+        self.assertEqual(self._drv.read_mem32_mock.get_call_log()[4:], [
+            {'address': 0x20000000, 'size': 1024,
+             'check_last_error_status': False},
+            {'address': 0x20000400, 'size': 1024,
+             'check_last_error_status': False},
+            {'address': 0x20000800, 'size': 1024,
+             'check_last_error_status': False},
+        ])
+
+    def test_bisect_with_check_argument(self):
+        """Test bisect of reads called with check_last_error_status"""
+        fault = swd.stlink.StlinkRwException(
+            "AP fault at address: 0x00000000", 0x11, 0)
+        self._drv.check_last_rw_state_mock.set_return_data([
+            fault, None, fault])
+        self._drv.read_mem32_mock.set_return_data([], bytes(1024))
+        with self.assertRaises(swd.stlink.StlinkRwException) as context:
+            with self._swd.deferred_check():
+                self._swd.read_mem_bytes(
+                    0x20000000, 4096, check_last_error_status=True)
+        self.assertIn("at address: 0x20000800", str(context.exception))
+
+    def test_bisect_not_reproduced(self):
+        """Test fault which is not reproduced by repeated reads"""
+        fault = swd.stlink.StlinkRwException(
+            "AP fault at address: 0x00000000", 0x11, 0)
+        # final check, then all repeated reads passed
+        self._drv.check_last_rw_state_mock.set_return_data([
+            fault, None, None, None])
+        self._drv.read_mem32_mock.set_return_data([], bytes(1024))
+        with self.assertRaises(swd.stlink.StlinkRwException) as context:
+            with self._swd.deferred_check():
+                self._swd.read_mem_bytes(0x20000000, 4096)
+        self.assertIs(context.exception, fault)
+        self.assertEqual(
+            len(self._drv.check_last_rw_state_mock.get_call_log()), 4)
+
+
 class TestFillMem(_TestSwd):
     """Tests for Swd.fill_mem class"""
     _PATTERN = [0x42, ]
@@ -869,10 +1108,10 @@ class TestFillMemUnalignedAddress(_TestSwd):
         data = (self._PATTERN * (size // len(self._PATTERN) + 1))[:size]
         self._swd.fill_mem(0x72000009, self._PATTERN, size)
         self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
-            {'address': 0x72000009, 'data': data[:63]},
+            {'address': 0x72000009, 'data': data[:3]},
         ])
         self.assertEqual(self._drv.write_mem32_mock.get_call_log(), [
-            {'address': 0x72000048, 'data': data[63:]},
+            {'address': 0x7200000c, 'data': data[3:]},
         ])
 
     def test_126bytes(self):
@@ -881,8 +1120,8 @@ class TestFillMemUnalignedAddress(_TestSwd):
         data = (self._PATTERN * (size // len(self._PATTERN) + 1))[:size]
         self._swd.fill_mem(0x8300000d, self._PATTERN, size)
         self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
-            {'address': 0x8300000d, 'data': data[:63]},
-            {'address': 0x8300004c, 'data': data[63:]},
+            {'address': 0x8300000d, 'data': data[:64]},
+            {'address': 0x8300004d, 'data': data[64:]},
         ])
 
     def test_1024bytes(self):
@@ -891,10 +1130,10 @@ class TestFillMemUnalignedAddress(_TestSwd):
         data = (self._PATTERN * (size // len(self._PATTERN) + 1))[:size]
         self._swd.fill_mem(0x74000011, self._PATTERN, size)
         self.assertEqual(self._drv.write_mem8_mock.get_call_log(), [
-            {'address': 0x74000011, 'data': data[:63]},
+            {'address': 0x74000011, 'data': data[:3]},
         ])
         self.assertEqual(self._drv.write_mem32_mock.get_call_log(), [
-            {'address': 0x74000050, 'data': data[63:]},
+            {'address': 0x74000014, 'data': data[3:]},
         ])
 
     def test_1087bytes(self):
@@ -0,0 +1,94 @@
+"""Unit tests for tracer.py
+"""
+
+import io
+import json
+import unittest
+import swd
+import swd.stlink
+import swd.stlink.com
+import swd.stlink.sim
+import swd.tracer
+
+
+class _TestTracer(unittest.TestCase):
+    """Base class for tracing of simulated ST-Link"""
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+        self._tracer = swd.tracer.start()
+
+    def tearDown(self):
+        swd.tracer.stop()
+
+    def _events(self, category):
+        return [
+            event for event in self._tracer.events
+            if event['cat'] == category]
+
+
+class TestTracer(_TestTracer):
+    """Tests for tracing of calls and transfers"""
+
+    def test_read(self):
+        """test spans of read and its USB transfers"""
+        self._swd.read_mem_bytes(0x20000000, 8)
+        swd_events = self._events('swd')
+        self.assertEqual(
+            [event['name'] for event in swd_events],
+            ['Swd.read_mem_into', 'Swd.read_mem_bytes'])
+        self.assertEqual(
+            swd_events[1]['args'], {'address': '0x20000000', 'size': 8})
+        usb_events = self._events('usb')
+        self.assertEqual(usb_events[0]['name'], 'DEBUG.READ_MEM_32BIT')
+        self.assertEqual(usb_events[0]['args']['address'], '0x20000000')
+        self.assertEqual(usb_events[0]['args']['size'], 8)
+        self.assertEqual(
+            usb_events[1]['name'], 'DEBUG.APIV2.GET_LAST_RW_STATE_EX')
+        self.assertEqual(usb_events[1]['args']['status'], 'JTAG_OK')
+        outer = swd_events[1]
+        for event in usb_events:
+            self.assertEqual(event['ph'], 'X')
+            self.assertGreaterEqual(event['ts'], outer['ts'])
+            self.assertLessEqual(
+                event['ts'] + event['dur'], outer['ts'] + outer['dur'])
+
+    def test_write_chunks(self):
+        """test spans of written chunks"""
+        self._swd.write_mem(0x20000001, bytes(131))
+        chunks = self._events('chunk')
+        self.assertEqual(
+            [event['args']['address'] for event in chunks],
+            ['0x20000001', '0x20000004'])
+
+    def test_error(self):
+        """test error status in span"""
+        self._sim.inject_fault(
+            swd.stlink.com.StlinkCom.STATUS.SWD_AP_FAULT,
+            address=0x20000000)
+        with self.assertRaises(swd.stlink.StlinkRwException):
+            self._swd.read_mem_bytes(0x20000000, 8)
+        event = self._events('swd')[-1]
+        self.assertEqual(
+            event['args']['status'],
+            swd.stlink.com.StlinkCom.STATUS.SWD_AP_FAULT)
+        self.assertIn('AP fault', event['args']['error'])
+        self.assertEqual(
+            self._events('usb')[-1]['args']['status'], 'SWD_AP_FAULT')
+
+    def test_save(self):
+        """test Chrome trace event JSON"""
+        swd.CortexM(self._swd).is_halted()
+        output = io.StringIO()
+        self._tracer.save(output)
+        trace = json.loads(output.getvalue())
+        names = [event['name'] for event in trace['traceEvents']]
+        self.assertIn('CortexM.is_halted', names)
+        self.assertIn('Swd.get_mem32', names)
+
+    def test_stop(self):
+        """test that nothing is traced after stop"""
+        self.assertIs(swd.tracer.stop(), self._tracer)
+        self._swd.read_mem_bytes(0x20000000, 8)
+        self.assertEqual(self._tracer.events, [])
@@ -0,0 +1,167 @@
+"""Unit tests for verify.py
+"""
+
+import os
+import shutil
+import tempfile
+import zlib
+import unittest
+import swd
+import swd.stlink
+import swd.stlink.sim
+import swd.image
+import swd.verify
+import swd._app
+from test.test_app import SimApplication
+from test.test_stub import run_stub
+
+_RCC_AHB1ENR = 0x40021048
+
+
+def _run_crc_unit(sim):
+    """Emulate stub which feeds CRC unit of STM32G4"""
+    if run_stub(sim):
+        return
+    pc = sim.registers[15]
+    code = swd.verify._CRC_UNIT_CODE
+    assert sim.read_memory(pc, len(code))[0] == code
+    assert sim.get32(_RCC_AHB1ENR) & 0x1000
+    assert sim.get32(swd.verify._CRC_CR) == swd.verify._CRC_CR_ZLIB
+    address, size, _, data_register = sim.registers[:4]
+    assert data_register == swd.verify._CRC_DR and not address % 4
+    init = swd.verify._reverse_bits(sim.get32(swd.verify._CRC_INIT))
+    data, _ = sim.read_memory(address, size)
+    sim.registers[0] = zlib.crc32(data, init ^ 0xffffffff) ^ 0xffffffff
+    sim.unit_runs += 1
+    sim.halted = True
+
+
+class _G4Sim(swd.stlink.sim.StlinkSim):
+    """Simulated STM32G4 with RCC and CRC registers"""
+
+    def __init__(self):
+        super().__init__()
+        for address, size in (
+                (0x40021000, 0x100), (0x40023000, 0x400),
+                (0x1fff7000, 0x1000)):
+            self.add_region(swd.stlink.sim.SimRegion(address, size))
+        self.debug_registers[0xe0042000] = 0x10006468
+        self.write_memory(0x1fff75e0, (128).to_bytes(2, 'little'))
+        self.unit_runs = 0
+        self.on_run = _run_crc_unit
+
+    def get32(self, address):
+        """Value of 32 bit register"""
+        return int.from_bytes(self.read_memory(address, 4)[0], 'little')
+
+
+class TestVerify(unittest.TestCase):
+    """Tests for verification by CRC-32 computed by target"""
+
+    def setUp(self):
+        self._sim = _G4Sim()
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+        self._data = os.urandom(4099)
+        self._sim.find_region(0x08000000).data[:4099] = self._data
+
+    def test_stub(self):
+        """test verification by stub"""
+        self.assertTrue(
+            swd.verify.verify(self._swd, 0x08000000, self._data))
+        self.assertFalse(
+            swd.verify.verify(self._swd, 0x08000000, self._data[:-1] + b'x'))
+        self.assertEqual(self._sim.stub_runs, 2)
+
+    def test_crc_unit(self):
+        """test CRC unit with unaligned head and tail"""
+        crc = swd.verify.crc32(
+            self._swd, 0x08000001, 4097, zlib.crc32(self._data[:1]),
+            hardware=True)
+        self.assertEqual(crc, zlib.crc32(self._data[:4098]))
+        self.assertEqual(self._sim.unit_runs, 1)
+
+    def test_crc_unit_not_supported(self):
+        """test family without reversible CRC unit"""
+        self._sim.debug_registers[0xe0042000] = 0x10006413
+        self._sim.write_memory(0x1fff7a20, bytes(4))
+        with self.assertRaises(swd.verify.VerifyError):
+            swd.verify.crc32(self._swd, 0x08000000, 16, hardware=True)
+
+    def test_verify_image(self):
+        """test list of different segments"""
+        segments = [
+            swd.image.Segment(0x08000000, self._data[:100]),
+            swd.image.Segment(0x08000200, b'\x00' * 4)]
+        self.assertEqual(
+            swd.verify.verify_image(self._swd, segments), segments[1:])
+
+
+class TestVerifySram(unittest.TestCase):
+    """Tests for verification of SRAM, where stub is placed"""
+
+    def setUp(self):
+        self._sim = swd.stlink.sim.StlinkSim()
+        self._sim.on_run = run_stub
+        self._swd = swd.Swd(driver=swd.stlink.Stlink(usb=self._sim))
+        self._sram = self._sim.find_region(0x20000000)
+        self._data = os.urandom(1001)
+        self._sram.data[:1001] = self._data
+
+    def test_stub_after_memory(self):
+        """test stub is placed after verified memory"""
+        self.assertTrue(swd.verify.verify(self._swd, 0x20000000, self._data))
+        self.assertEqual(self._sram.data[:1001], self._data)
+        self.assertEqual(self._sim.stub_runs, 1)
+        self.assertEqual(self._sim.registers[15], 0x200003ec)
+
+    def test_segments(self):
+        """test stub does not overlap any segment"""
+        segments = [
+            swd.image.Segment(0x20000000, self._data[:100]),
+            swd.image.Segment(0x20000064, self._data[100:])]
+        self.assertEqual(swd.verify.verify_image(self._swd, segments), [])
+        self.assertEqual(self._sram.data[:1001], self._data)
+        self.assertEqual(self._sim.registers[15], 0x200003ec)
+
+    def test_whole_sram(self):
+        """test memory is read when there is no space for stub"""
+        data = bytes(self._sram.data)
+        self.assertTrue(swd.verify.verify(self._swd, 0x20000000, data))
+        self.assertFalse(
+            swd.verify.verify(self._swd, 0x20000000, data[:-1] + b'x'))
+        self.assertFalse(hasattr(self._sim, 'stub_runs'))
+
+    def test_stub_address(self):
+        """test selection of stub address"""
+        self.assertEqual(
+            swd.verify.stub_address([(0x08000000, 0x10000)]), 0x20000000)
+        self.assertEqual(
+            swd.verify.stub_address([
+                (0x20000000, 0x100), (0x20000170, 0x10)]), 0x20000180)
+        self.assertIsNone(
+            swd.verify.stub_address([(0x20000000, 0x20000000)]))
+
+
+class TestVerifyAction(unittest.TestCase):
+    """Tests for verify action of application"""
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._sim = _G4Sim()
+        self._path = os.path.join(self._dir, 'image.bin')
+        with open(self._path, 'wb') as image:
+            image.write(b'\x01' * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _run(self, actions):
+        args = swd._app._configure_argparse(['-q'] + actions)
+        return SimApplication(args, self._sim).start()
+
+    def test_verify(self):
+        """test same and different memory"""
+        self._sim.find_region(0x08000000).data[:1000] = b'\x01' * 1000
+        self.assertEqual(self._run([f'verify:0x08000000:{self._path}']), 0)
+        self._sim.find_region(0x08000000).data[999] = 0
+        self.assertEqual(self._run([f'verify:0x08000000:{self._path}']), 1)